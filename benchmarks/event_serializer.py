@@ -0,0 +1,84 @@
+"""
+Бенчмарк форматов сообщений брокера: размер и время кодирования/декодирования
+
+Сообщения задачи save_account_history с BalanceUpdatedEvent кодируются форматтером
+брокера (как при kiq) и декодируются обратно вместе с разбором события из аргументов,
+как в воркере.
+json - формат taskiq по умолчанию, msgpack - infra/serializers.
+
+Использование:
+    APP__ENV=TEST PYTHONPATH=src python benchmarks/event_serializer.py --messages 50000
+"""
+
+import argparse
+import time
+import uuid
+from decimal import Decimal
+
+from pydantic import TypeAdapter
+from taskiq import InMemoryBroker
+from taskiq.message import TaskiqMessage
+
+from domain.accounts.events import BalanceUpdatedEvent
+from infra.serializers import SERIALIZERS
+
+
+def make_messages(count: int) -> list[TaskiqMessage]:
+    user_id = str(uuid.uuid4())
+    return [
+        TaskiqMessage(
+            task_id=uuid.uuid4().hex,
+            task_name="infra.tasks.accounts:save_account_history",
+            labels={},
+            args=[
+                BalanceUpdatedEvent(
+                    user_id=user_id,
+                    account_id=str(uuid.uuid4()),
+                    new_balance=Decimal(i * 1000) / 100,
+                    delta=Decimal("-1250.75"),
+                    is_monthly_closing=i % 10 == 0,
+                )
+            ],
+            kwargs={},
+        )
+        for i in range(count)
+    ]
+
+
+def measure(name: str, messages: list[TaskiqMessage]) -> tuple[float, float, float]:
+    """Средний размер сообщения (байт) и микросекунды на кодирование и декодирование"""
+
+    _, formatter = SERIALIZERS[name](InMemoryBroker())
+    event = TypeAdapter(BalanceUpdatedEvent)
+
+    started = time.perf_counter()
+    encoded = [formatter.dumps(message).message for message in messages]
+    encode = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for message in encoded:
+        event.validate_python(formatter.loads(message).args[0])
+    decode = time.perf_counter() - started
+
+    size = sum(map(len, encoded)) / len(encoded)
+    return size, encode / len(messages) * 1e6, decode / len(messages) * 1e6
+
+
+def main(formats: list[str], count: int) -> None:
+    messages = make_messages(count)
+
+    print(f"{'format':>8} | {'bytes':>6} | {'encode, us':>10} | {'decode, us':>10}")
+    for name in formats:
+        size, encode, decode = measure(name, messages)
+        print(f"{name:>8} | {size:>6.0f} | {encode:>10.2f} | {decode:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--formats", nargs="+", choices=list(SERIALIZERS), default=list(SERIALIZERS)
+    )
+    parser.add_argument("--messages", type=int, default=20_000)
+    args = parser.parse_args()
+
+    main(args.formats, args.messages)
@@ -0,0 +1,106 @@
+"""
+Бенчмарк аналитики истории счёта на больших рядах
+
+- compute: расчёт аналитики по готовому ряду
+- load: загрузка ряда из часовых агрегатов (get_history_series) и расчёт аналитики
+
+Использование:
+    PYTHONPATH=src python benchmarks/history_analytics.py --sizes 10000 100000 1000000
+    PYTHONPATH=src python benchmarks/history_analytics.py --load --sizes 10000 100000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+
+import numpy as np
+
+from domain.histories.analytics import HistorySeries, compute_analytics
+from domain.histories.values import HistoryPeriod
+from history_chart import create_account, fill_history
+from infra.database import db_helper
+from infra.models import Base, UserModel
+from infra.repositories.histories import SQLAlchemyHistoryRepository
+
+
+def make_series(size: int) -> HistorySeries:
+    rng = np.random.default_rng(42)
+    deltas = rng.normal(loc=10, scale=100, size=size)
+    balances = np.maximum(10_000 + np.cumsum(deltas), 0)
+    return HistorySeries(
+        timestamps=np.arange(size, dtype=np.float64) * 60,
+        balances=balances,
+        deltas=deltas,
+    )
+
+
+def report(points: int, timings: list[float]) -> None:
+    print(f"{points:>10} | {statistics.median(timings):>8.2f} | {max(timings):>8.2f}")
+
+
+def main(sizes: list[int], window: int, repeats: int) -> None:
+    print(f"{'points':>10} | {'p50, ms':>8} | {'max, ms':>8}")
+
+    for size in sizes:
+        series = make_series(size)
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            compute_analytics(series, window=window)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        report(size, timings)
+
+
+async def main_load(sizes: list[int], window: int, repeats: int) -> None:
+    """Записи истории по две на час: ряд часовых агрегатов длиной около size"""
+
+    async with db_helper.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    user_id = str(uuid.uuid4())
+    async with db_helper.session_factory() as session:
+        session.add(UserModel(id=user_id, name="benchmark"))
+        await session.commit()
+
+    print(f"{'points':>10} | {'p50, ms':>8} | {'max, ms':>8}")
+    for size in sizes:
+        account_id = await create_account(user_id)
+        span = timedelta(hours=size)
+        await fill_history(account_id, size * 2, span=span)
+        start_date = datetime.now(timezone.utc) - span
+
+        timings, points = [], 0
+        async with db_helper.session_factory() as session:
+            repo = SQLAlchemyHistoryRepository(session)
+            for _ in range(repeats):
+                started = time.perf_counter()
+                series = await repo.get_history_series(
+                    account_id=account_id,
+                    period=HistoryPeriod.HOURS,
+                    start_date=start_date,
+                )
+                compute_analytics(series, window=window)
+                timings.append((time.perf_counter() - started) * 1000)
+                points = len(series)
+
+        report(points, timings)
+
+    await db_helper.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 1_000_000])
+    parser.add_argument("--window", type=int, default=60)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--load", action="store_true")
+    args = parser.parse_args()
+
+    if args.load:
+        asyncio.run(main_load(args.sizes, args.window, args.repeats))
+    else:
+        main(args.sizes, args.window, args.repeats)
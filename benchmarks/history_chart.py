@@ -0,0 +1,135 @@
+"""
+Бенчмарк задержки графика истории счёта при росте таблицы accounts_history
+
+Таблица наполняется записями "чужих" счетов, а график одного счёта строится
+по агрегатам периода и по сырой таблице (через индекс счёта) для сравнения.
+
+Использование:
+    PYTHONPATH=src python benchmarks/history_chart.py --sizes 100000 1000000 10000000
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+
+from sqlalchemy import insert
+
+from domain.histories.values import HistoryInterval
+from domain.histories.service import INTERVALS, PERIOD
+from infra.database import db_helper
+from infra.models import Base, UserModel, AccountModel, HistoryModel
+from infra.repositories.histories import SQLAlchemyHistoryRepository
+
+BATCH_SIZE = 10_000
+
+
+async def create_account(user_id: str) -> str:
+    account_id = str(uuid.uuid4())
+    async with db_helper.session_factory() as session:
+        await session.execute(
+            insert(AccountModel).values(
+                id=account_id,
+                user_id=user_id,
+                name=account_id[:8],
+                type="Card",
+                balance=0,
+                currency="RUB",
+            )
+        )
+        await session.commit()
+    return account_id
+
+
+async def fill_history(account_id: str, rows: int, span: timedelta) -> None:
+    """Наполняет историю счёта и пересчитывает его агрегаты"""
+
+    now = datetime.now(timezone.utc)
+    async with db_helper.session_factory() as session:
+        for start in range(0, rows, BATCH_SIZE):
+            await session.execute(
+                insert(HistoryModel),
+                [
+                    {
+                        "id": str(uuid.uuid4()),
+                        "account_id": account_id,
+                        "balance": random.uniform(0, 100_000),
+                        "delta": random.uniform(-1000, 1000),
+                        "is_monthly_closing": False,
+                        "created_at": now - span * random.random(),
+                    }
+                    for _ in range(min(BATCH_SIZE, rows - start))
+                ],
+            )
+        await session.commit()
+        await SQLAlchemyHistoryRepository(session).rebuild_rollups(account_id)
+
+
+async def measure(account_id: str, interval: HistoryInterval, repeats: int) -> dict:
+    timings: dict[str, list[float]] = {"rollups": [], "raw": []}
+
+    async with db_helper.session_factory() as session:
+        repo = SQLAlchemyHistoryRepository(session)
+        methods = {
+            "rollups": repo.get_history_from_rollups,
+            "raw": repo.get_history_linked_to_period,
+        }
+
+        for name, method in methods.items():
+            for _ in range(repeats):
+                started = time.perf_counter()
+                await method(
+                    account_id=account_id,
+                    period=PERIOD[interval],
+                    start_date=INTERVALS[interval],
+                )
+                timings[name].append((time.perf_counter() - started) * 1000)
+
+    return {
+        name: (statistics.median(values), statistics.quantiles(values, n=20)[-1])
+        for name, values in timings.items()
+        if values
+    }
+
+
+async def main(sizes: list[int], accounts: int, target_rows: int, repeats: int):
+    async with db_helper.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    user_id = str(uuid.uuid4())
+    async with db_helper.session_factory() as session:
+        session.add(UserModel(id=user_id, name="benchmark"))
+        await session.commit()
+
+    target = await create_account(user_id)
+    await fill_history(target, target_rows, span=timedelta(days=30))
+
+    total = target_rows
+    interval = HistoryInterval.MONTH1
+    print(f"{'rows':>12} | {'source':>8} | {'p50, ms':>8} | {'p95, ms':>8}")
+
+    for size in sorted(sizes):
+        per_account = max((size - total) // accounts, 0)
+        for _ in range(accounts if per_account else 0):
+            account_id = await create_account(user_id)
+            await fill_history(account_id, per_account, span=timedelta(days=365))
+            total += per_account
+
+        for source, (p50, p95) in (await measure(target, interval, repeats)).items():
+            print(f"{total:>12} | {source:>8} | {p50:>8.2f} | {p95:>8.2f}")
+
+    await db_helper.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--accounts", type=int, default=10)
+    parser.add_argument("--target-rows", type=int, default=5_000)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.sizes, args.accounts, args.target_rows, args.repeats))
@@ -0,0 +1,111 @@
+"""
+Бенчмарк пропускной способности записи истории воркером в зависимости от размера пачки
+
+Задачи save_account_history отправляются в InMemoryBroker разом (как при закрытии
+месяца), все выполняются конкурентно и пишутся пачками по batch_size.
+batch_size=1 - запись по строке и commit на событие, как до пакетной записи.
+
+Использование (APP__ENV=TEST - база SQLite из настроек тестов, либо Postgres в DEV):
+    APP__ENV=TEST PYTHONPATH=src python benchmarks/history_writer.py --batch-sizes 1 10 100 500
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+from decimal import Decimal
+
+from sqlalchemy import func, insert, select
+
+from domain.accounts.events import BalanceUpdatedEvent
+from infra import broker
+from infra.batching import BatchWriter
+from infra.database import db_helper
+from infra.models import Base, UserModel, AccountModel, HistoryModel
+from infra.tasks import accounts as account_tasks
+
+
+async def create_accounts(count: int) -> tuple[str, list[str]]:
+    user_id = str(uuid.uuid4())
+    account_ids = [str(uuid.uuid4()) for _ in range(count)]
+    async with db_helper.session_factory() as session:
+        session.add(UserModel(id=user_id, name="benchmark", accounts_count=count))
+        await session.execute(
+            insert(AccountModel),
+            [
+                {
+                    "id": account_id,
+                    "user_id": user_id,
+                    "name": account_id[:8],
+                    "type": "Card",
+                    "balance": 0,
+                    "currency": "RUB",
+                }
+                for account_id in account_ids
+            ],
+        )
+        await session.commit()
+    return user_id, account_ids
+
+
+async def count_rows() -> int:
+    async with db_helper.session_factory() as session:
+        return await session.scalar(select(func.count()).select_from(HistoryModel))
+
+
+async def measure(
+    user_id: str, account_ids: list[str], events: int, batch_size: int
+) -> tuple[float, int]:
+    """
+    Записанных строк в секунду (от отправки первой задачи до завершения последней)
+    и число событий, которые не записались (ошибка задачи)
+    """
+
+    account_tasks.history_writer = BatchWriter(
+        account_tasks.write_history_batch, max_size=batch_size, max_delay=0.05
+    )
+
+    before = await count_rows()
+    started = time.perf_counter()
+    for i in range(events):
+        await account_tasks.save_account_history.kiq(
+            BalanceUpdatedEvent(
+                user_id=user_id,
+                account_id=account_ids[i % len(account_ids)],
+                new_balance=Decimal(i),
+                delta=Decimal(1),
+                is_monthly_closing=False,
+            )
+        )
+    await broker.wait_all()
+    elapsed = time.perf_counter() - started
+
+    written = await count_rows() - before
+    return written / elapsed, events - written
+
+
+async def main(batch_sizes: list[int], events: int, accounts: int) -> None:
+    async with db_helper.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    # Redis в бенчмарке не участвует: кэш ответов истории отключён
+    account_tasks.get_history_cache = lambda _: None
+    user_id, account_ids = await create_accounts(accounts)
+
+    print(f"{'batch':>6} | {'rows/sec':>10} | {'errors':>6}")
+    for batch_size in batch_sizes:
+        rate, errors = await measure(user_id, account_ids, events, batch_size)
+        print(f"{batch_size:>6} | {rate:>10.0f} | {errors:>6}")
+
+    await db_helper.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--events", type=int, default=2_000)
+    parser.add_argument("--accounts", type=int, default=20)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.batch_sizes, args.events, args.accounts))
@@ -0,0 +1,35 @@
+"""add history account created_at index
+
+Revision ID: 5c2e8b7d91fa
+Revises: a1f3c9d27b40
+Create Date: 2026-10-18 11:40:12.904117
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5c2e8b7d91fa"
+down_revision: Union[str, Sequence[str], None] = "a1f3c9d27b40"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_accounts_history_acc_id_created_at",
+        "accounts_history",
+        ["account_id", sa.text("created_at DESC")],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_accounts_history_acc_id_created_at", table_name="accounts_history"
+    )
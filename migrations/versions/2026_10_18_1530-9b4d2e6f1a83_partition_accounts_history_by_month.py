@@ -0,0 +1,124 @@
+"""partition accounts_history by month
+
+Revision ID: 9b4d2e6f1a83
+Revises: 5c2e8b7d91fa
+Create Date: 2026-10-18 15:30:44.218305
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9b4d2e6f1a83"
+down_revision: Union[str, Sequence[str], None] = "5c2e8b7d91fa"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Секции создаются с месяца первой записи и на столько месяцев вперёд
+PREMAKE_MONTHS = 3
+COLUMNS = "id, account_id, balance, delta, is_monthly_closing, created_at"
+
+
+def _history_table(name: str, primary_key: list[str], **kwargs) -> None:
+    op.create_table(
+        name,
+        sa.Column("account_id", sa.String(), nullable=False),
+        sa.Column("balance", sa.Float(), nullable=False),
+        sa.Column("delta", sa.Float(), nullable=False, server_default="0"),
+        sa.Column(
+            "is_monthly_closing", sa.Boolean(), nullable=False, server_default="False"
+        ),
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.CheckConstraint("balance >= 0", name="history_balance_gt_0"),
+        sa.ForeignKeyConstraint(
+            ["account_id"],
+            ["accounts.id"],
+            name="fk_savings_acc_id",
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint(*primary_key, name="accounts_history_pkey"),
+        **kwargs,
+    )
+
+
+def _rename_old_table() -> None:
+    op.drop_index(
+        "ix_accounts_history_acc_id_created_at", table_name="accounts_history"
+    )
+    op.rename_table("accounts_history", "accounts_history_old")
+    op.execute(
+        "ALTER TABLE accounts_history_old "
+        "RENAME CONSTRAINT accounts_history_pkey TO accounts_history_old_pkey"
+    )
+
+
+def _finish(columns: str) -> None:
+    op.execute(
+        f"INSERT INTO accounts_history ({columns}) "
+        f"SELECT {columns} FROM accounts_history_old"
+    )
+    op.drop_table("accounts_history_old")
+    op.create_index(
+        "ix_accounts_history_acc_id_created_at",
+        "accounts_history",
+        ["account_id", sa.text("created_at DESC")],
+        unique=False,
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _rename_old_table()
+    _history_table(
+        "accounts_history",
+        primary_key=["id", "created_at"],
+        postgresql_partition_by="RANGE (created_at)",
+    )
+    op.execute(
+        "CREATE TABLE accounts_history_default PARTITION OF accounts_history DEFAULT"
+    )
+    # Месячные секции на всю имеющуюся историю и PREMAKE_MONTHS месяцев вперёд
+    op.execute(f"""
+        DO $$
+        DECLARE
+            month timestamp;
+        BEGIN
+            FOR month IN
+                SELECT generate_series(
+                    date_trunc(
+                        'month',
+                        (SELECT coalesce(min(created_at), now()) FROM accounts_history_old)
+                        AT TIME ZONE 'UTC'
+                    ),
+                    date_trunc('month', now() AT TIME ZONE 'UTC')
+                    + interval '{PREMAKE_MONTHS} months',
+                    interval '1 month'
+                )
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE accounts_history_p%s PARTITION OF accounts_history '
+                    'FOR VALUES FROM (%L) TO (%L)',
+                    to_char(month, 'YYYY_MM'),
+                    month AT TIME ZONE 'UTC',
+                    (month + interval '1 month') AT TIME ZONE 'UTC'
+                );
+            END LOOP;
+        END $$
+        """)
+    _finish(COLUMNS)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _rename_old_table()
+    _history_table("accounts_history", primary_key=["id"])
+    _finish(COLUMNS)
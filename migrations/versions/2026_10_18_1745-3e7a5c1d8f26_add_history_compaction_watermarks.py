@@ -0,0 +1,46 @@
+"""add history compaction watermarks
+
+Revision ID: 3e7a5c1d8f26
+Revises: 9b4d2e6f1a83
+Create Date: 2026-10-18 17:45:09.553871
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3e7a5c1d8f26"
+down_revision: Union[str, Sequence[str], None] = "9b4d2e6f1a83"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "accounts_history_compaction",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("account_id", sa.String(), nullable=False),
+        sa.Column("period", sa.String(length=16), nullable=False),
+        sa.Column("compacted_until", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["account_id"],
+            ["accounts.id"],
+            name="fk_accounts_history_compaction_acc_id",
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "account_id",
+            "period",
+            name="uc_accounts_history_compaction_acc_id_period",
+        ),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("accounts_history_compaction")
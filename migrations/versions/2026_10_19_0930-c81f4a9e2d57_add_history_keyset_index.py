@@ -0,0 +1,44 @@
+"""add history keyset index
+
+Revision ID: c81f4a9e2d57
+Revises: 3e7a5c1d8f26
+Create Date: 2026-10-19 09:30:21.604127
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c81f4a9e2d57"
+down_revision: Union[str, Sequence[str], None] = "3e7a5c1d8f26"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_accounts_history_acc_id_created_at_id",
+        "accounts_history",
+        ["account_id", sa.text("created_at DESC"), sa.text("id DESC")],
+        unique=False,
+    )
+    op.drop_index(
+        "ix_accounts_history_acc_id_created_at", table_name="accounts_history"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(
+        "ix_accounts_history_acc_id_created_at",
+        "accounts_history",
+        ["account_id", sa.text("created_at DESC")],
+        unique=False,
+    )
+    op.drop_index(
+        "ix_accounts_history_acc_id_created_at_id", table_name="accounts_history"
+    )
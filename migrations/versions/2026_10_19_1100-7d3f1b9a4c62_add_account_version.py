@@ -0,0 +1,31 @@
+"""add account version
+
+Revision ID: 7d3f1b9a4c62
+Revises: c81f4a9e2d57
+Create Date: 2026-10-19 11:00:37.915204
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7d3f1b9a4c62"
+down_revision: Union[str, Sequence[str], None] = "c81f4a9e2d57"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "accounts",
+        sa.Column("version", sa.Integer(), server_default="1", nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("accounts", "version")
@@ -0,0 +1,39 @@
+"""add user accounts count
+
+Revision ID: e2a8c5f31b07
+Revises: 7d3f1b9a4c62
+Create Date: 2026-10-19 12:30:08.441952
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e2a8c5f31b07"
+down_revision: Union[str, Sequence[str], None] = "7d3f1b9a4c62"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "users",
+        sa.Column("accounts_count", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.execute(
+        "UPDATE users SET accounts_count = "
+        "(SELECT count(*) FROM accounts WHERE accounts.user_id = users.id)"
+    )
+    op.create_check_constraint(
+        "user_accounts_count_gt_0", "users", "accounts_count >= 0"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint("user_accounts_count_gt_0", "users", type_="check")
+    op.drop_column("users", "accounts_count")
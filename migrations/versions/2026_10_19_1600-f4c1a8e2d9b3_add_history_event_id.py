@@ -0,0 +1,33 @@
+"""add history event id
+
+Revision ID: f4c1a8e2d9b3
+Revises: b5d7e3a1c946
+Create Date: 2026-10-19 16:00:42.118306
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f4c1a8e2d9b3"
+down_revision: Union[str, Sequence[str], None] = "b5d7e3a1c946"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("accounts_history", sa.Column("event_id", sa.String(), nullable=True))
+    # Уникальность на секционированной таблице - только вместе с ключом секций
+    op.create_unique_constraint(
+        "uq_accounts_history_event", "accounts_history", ["event_id", "created_at"]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint("uq_accounts_history_event", "accounts_history", type_="unique")
+    op.drop_column("accounts_history", "event_id")
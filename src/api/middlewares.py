@@ -0,0 +1,44 @@
+import logging
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from infra.identity import request_scope
+
+logger = logging.getLogger(__name__)
+
+QUERIES_HEADER = b"x-db-queries"
+
+
+class RequestScopeMiddleware:
+    """
+    Открывает область запроса (карта идентичности и счётчик SQL-запросов)
+    и отдаёт число запросов к БД в заголовке X-DB-Queries
+
+    Заголовок отправляется в начале ответа: запросы потокового ответа (выгрузки)
+    в него не входят
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        with request_scope() as request:
+
+            async def send_with_queries(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (QUERIES_HEADER, str(request.queries).encode()),
+                    ]
+                    logger.debug(
+                        "%s %s: %s запросов к БД",
+                        scope["method"],
+                        scope["path"],
+                        request.queries,
+                    )
+                await send(message)
+
+            await self.app(scope, receive, send_with_queries)
@@ -1,4 +1,6 @@
-from pydantic import BaseModel, ConfigDict
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict, Field
 from pydantic.alias_generators import to_camel
 
 
@@ -35,3 +37,15 @@ class ValidationExceptionSchema(BaseResponseSchema):
 class PaginationSchema(BaseApiModel):
     page: int
     limit: int
+
+
+class CursorPaginationSchema(BaseApiModel):
+    cursor: Optional[str] = Field(
+        default=None, description="nextCursor из предыдущего ответа"
+    )
+    limit: int = Field(default=20, ge=1, le=100)
+
+
+class CursorMetadata(BaseApiModel):
+    next_cursor: Optional[str]
+    limit: int
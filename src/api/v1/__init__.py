@@ -6,5 +6,6 @@ router = APIRouter(prefix="/v1")
 
 router.include_router(router=accounts.router)
 router.include_router(router=histories.router)
+router.include_router(router=histories.user_router)
 router.include_router(router=goals.router)
 # router.include_router(router=net_worth.router)
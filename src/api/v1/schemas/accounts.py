@@ -1,9 +1,10 @@
 from datetime import datetime
 
-from pydantic import Field
+from pydantic import Field, field_validator
 
 from api.schemas import BaseApiModel
 from domain.accounts.entity import AccountType, AccountCurrency
+from domain.users.entity import User
 
 
 class CreateAccountSchema(BaseApiModel):
@@ -18,6 +19,34 @@ class UpdateAccountSchema(BaseApiModel):
     is_monthly_closing: bool = False
 
 
+class AccountBalanceSchema(BaseApiModel):
+    account_id: str
+    actual_balance: float
+
+
+class UpdateAccountsBalancesSchema(BaseApiModel):
+    balances: list[AccountBalanceSchema] = Field(
+        min_length=1, max_length=User.MAX_ACCOUNTS
+    )
+    is_monthly_closing: bool = False
+
+    @field_validator("balances")
+    @classmethod
+    def unique_accounts(
+        cls, balances: list[AccountBalanceSchema]
+    ) -> list[AccountBalanceSchema]:
+        if len({item.account_id for item in balances}) != len(balances):
+            raise ValueError("Счета в запросе не должны повторяться")
+        return balances
+
+
+class AccountBalanceResultSchema(BaseApiModel):
+    account_id: str
+    previous_balance: float
+    balance: float
+    updated: bool
+
+
 class AccountDetailSchema(BaseApiModel):
     id: str
     name: str
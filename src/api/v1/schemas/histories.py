@@ -1,13 +1,52 @@
 from datetime import datetime
+from typing import Optional
 
-from api.schemas import BaseApiModel
-from domain.histories.values import HistoryInterval
+from pydantic import Field
+
+from api.schemas import BaseApiModel, CursorPaginationSchema
+from domain.histories.values import HistoryInterval, HistoryExportFormat
 
 
 class GetHistorySchema(BaseApiModel):
     interval: HistoryInterval
 
 
+class ExportHistorySchema(BaseApiModel):
+    format: HistoryExportFormat = HistoryExportFormat.NDJSON
+    since: Optional[datetime] = Field(
+        default=None,
+        description="Выгрузить записи строго после этой даты (дата последней полученной записи)",
+    )
+    after_id: Optional[str] = Field(
+        default=None,
+        description="id последней полученной записи: вместе с since продолжает "
+        "выгрузку без пропуска записей с той же датой",
+    )
+
+
+class ImportHistorySchema(BaseApiModel):
+    format: HistoryExportFormat = HistoryExportFormat.NDJSON
+
+
+class HistoryImportSchema(BaseApiModel):
+    imported: int
+    balance: float
+
+
+class ListHistorySchema(CursorPaginationSchema):
+    is_monthly_closing: Optional[bool] = None
+    date_from: Optional[datetime] = Field(default=None, description="Включительно")
+    date_to: Optional[datetime] = Field(default=None, description="Не включительно")
+
+
+class HistoryRecordSchema(BaseApiModel):
+    id: str
+    balance: float
+    delta: float
+    is_monthly_closing: bool
+    created_at: datetime
+
+
 class HistoryDetailSchema(BaseApiModel):
     # id: str
     balance: float
@@ -15,6 +54,11 @@ class HistoryDetailSchema(BaseApiModel):
     created_at: datetime
 
 
+class AccountHistorySchema(BaseApiModel):
+    account_id: str
+    history: list[HistoryDetailSchema]
+
+
 class HistoryMetadata(BaseApiModel):
     start_date: datetime
     period: str
@@ -23,3 +67,27 @@ class HistoryMetadata(BaseApiModel):
 class HistoryProfitSchema(BaseApiModel):
     percent_profit: float
     amount_profit: float
+    first_balance: float
+    last_balance: float
+    min_balance: float
+    max_balance: float
+    incomes: float
+    expenses: float
+
+
+class BucketReturnSchema(BaseApiModel):
+    date: datetime
+    return_: float = Field(alias="return")
+
+
+class HistoryAnalyticsSchema(BaseApiModel):
+    points: int
+    total_return: float
+    max_drawdown: float
+    volatility: float
+    rolling_window: int
+    rolling_volatility: list[float]
+    cagr: Optional[float]
+    best_bucket: Optional[BucketReturnSchema]
+    worst_bucket: Optional[BucketReturnSchema]
+    deposit_adjusted_return: float
@@ -11,11 +11,14 @@ from api.v1.schemas.accounts import (
     CreateAccountSchema,
     AccountDetailSchema,
     UpdateAccountSchema,
+    UpdateAccountsBalancesSchema,
+    AccountBalanceResultSchema,
 )
 from domain.accounts.commands import (
     CreateAccountCommand,
     GetAccountCommand,
     UpdateAccountBalanceCommand,
+    UpdateAccountsBalancesCommand,
 )
 from domain.accounts.dto import AccountDTO
 from domain.accounts.entity import Account
@@ -121,6 +124,54 @@ async def get_account_by_id(
     )
 
 
+@router.put(
+    "/balances",
+    response_model=BaseResponseDetailSchema[list[AccountBalanceResultSchema], dict],
+    responses={
+        status.HTTP_404_NOT_FOUND: {
+            "model": BaseExceptionSchema,
+            "description": "Хотя бы один из счетов не найден",
+        },
+        status.HTTP_409_CONFLICT: {
+            "model": BaseExceptionSchema,
+            "description": "Балансы счетов изменены параллельно",
+        },
+    },
+)
+async def update_accounts_balances(
+    account_service: AccountServiceDep,
+    schema: UpdateAccountsBalancesSchema,
+    user_id: str,
+):
+    """
+    Обновление балансов нескольких счетов за один запрос (закрытие месяца)
+
+    Все балансы обновляются атомарно: если хотя бы одного счёта нет, не меняется ни один
+    """
+
+    changes = await account_service.update_balances(
+        command=UpdateAccountsBalancesCommand(
+            user_id=user_id,
+            balances={item.account_id: item.actual_balance for item in schema.balances},
+            is_monthly_closing=schema.is_monthly_closing,
+        )
+    )
+
+    return BaseResponseDetailSchema(
+        message="Балансы счетов обновлены",
+        detail=[
+            AccountBalanceResultSchema(
+                account_id=change.account_id,
+                previous_balance=change.old_balance,
+                balance=change.new_balance,
+                updated=change.is_changed,
+            )
+            for change in changes
+        ],
+        metadata={},
+    )
+
+
 @router.put(
     "/{account_id}/balance",
     response_model=BaseResponseSchema,
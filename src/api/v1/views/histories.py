@@ -1,19 +1,40 @@
-from typing import Annotated
+from typing import Annotated, Optional
 
-from fastapi import APIRouter, Depends, status
+import orjson
+from fastapi import APIRouter, Depends, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 
-from api.schemas import BaseResponseDetailSchema, BaseExceptionSchema
+from api.schemas import (
+    BaseResponseSchema,
+    BaseResponseDetailSchema,
+    BaseExceptionSchema,
+    CursorMetadata,
+)
 from api.v1.schemas.histories import (
     HistoryDetailSchema,
     GetHistorySchema,
     HistoryMetadata,
     HistoryProfitSchema,
+    HistoryAnalyticsSchema,
+    ListHistorySchema,
+    HistoryRecordSchema,
+    AccountHistorySchema,
+    ExportHistorySchema,
+    ImportHistorySchema,
+    HistoryImportSchema,
+)
+from domain.histories.commands import (
+    GetAccountHistoryCommand,
+    ExportAccountHistoryCommand,
+    ImportAccountHistoryCommand,
+    ListAccountHistoryCommand,
+    GetAccountsHistoryCommand,
 )
-from domain.histories.commands import GetAccountHistoryCommand
 from domain.histories.dto import HistoryDTO
 from domain.histories.service import HistoryServiceDep
 from domain.users.dependencies import get_user
-from .accounts import get_account
+from domain.users.entity import User
+from .accounts import get_account, AccountServiceDep
 
 router = APIRouter(
     prefix="/users/{user_id}/accounts/{account_id}/history",
@@ -27,11 +48,75 @@ router = APIRouter(
     },
 )
 
+AccountHistoryResponse = BaseResponseDetailSchema[
+    list[HistoryDetailSchema], HistoryMetadata
+]
+HistoryProfitResponse = BaseResponseDetailSchema[HistoryProfitSchema, HistoryMetadata]
 
-@router.get(
+
+def dump_response(response: BaseResponseSchema) -> bytes:
+    """Ответ в JSON так же, как его отдаёт FastAPI (camelCase)"""
+
+    return orjson.dumps(response.model_dump(mode="json", by_alias=True))
+
+
+user_router = APIRouter(
+    prefix="/users/{user_id}/history",
+    tags=["История счетов⌚"],
+    dependencies=[Depends(get_user)],
+    responses={
+        status.HTTP_404_NOT_FOUND: {
+            "model": BaseExceptionSchema,
+            "description": "Не найден пользователь",
+        }
+    },
+)
+
+
+@user_router.get(
     "",
-    response_model=BaseResponseDetailSchema[list[HistoryDetailSchema], HistoryMetadata],
+    response_model=BaseResponseDetailSchema[
+        list[AccountHistorySchema], HistoryMetadata
+    ],
 )
+async def get_accounts_history(
+    history_service: HistoryServiceDep,
+    schema: Annotated[GetHistorySchema, Depends()],
+    user_id: str,
+    account_ids: Annotated[
+        Optional[list[str]], Query(max_length=User.MAX_ACCOUNTS)
+    ] = None,
+):
+    """
+    История нескольких счетов пользователя одним запросом (для дашборда)
+
+    Без `account_ids` возвращаются все счета пользователя. Группировка по периодам
+    та же, что у истории одного счёта. Счета без записей за интервал и чужие счета
+    в ответ не попадают
+    """
+
+    histories = await history_service.get_accounts_history(
+        command=GetAccountsHistoryCommand(
+            user_id=user_id,
+            interval=schema.interval,
+            account_ids=account_ids,
+        )
+    )
+
+    return BaseResponseDetailSchema(
+        detail=[
+            AccountHistorySchema(
+                account_id=account_id,
+                history=[HistoryDTO.from_entity_to_dict(row) for row in history],
+            )
+            for account_id, history in histories.items()
+        ],
+        message="История счетов успешно получена",
+        metadata=HistoryMetadata(**history_service.metadata),
+    )
+
+
+@router.get("", response_model=AccountHistoryResponse)
 async def get_account_history(
     history_service: HistoryServiceDep,
     schema: Annotated[GetHistorySchema, Depends()],
@@ -60,34 +145,133 @@ async def get_account_history(
     - **All**: период "years"
     """
 
-    history = await history_service.get_account_history(
-        command=GetAccountHistoryCommand(
-            account_id=account_id,
-            user_id=user_id,
-            interval=schema.interval,
+    command = GetAccountHistoryCommand(
+        account_id=account_id,
+        user_id=user_id,
+        interval=schema.interval,
+    )
+
+    async def build() -> bytes:
+        history = await history_service.get_account_history(command=command)
+        return dump_response(
+            AccountHistoryResponse(
+                detail=[HistoryDTO.from_entity_to_dict(row) for row in history],
+                message="История счёта успешно получена",
+                metadata=HistoryMetadata(**history_service.metadata),
+            )
         )
+
+    return Response(
+        content=await history_service.get_cached(
+            account_id=account_id, key=f"history:{schema.interval.value}", build=build
+        ),
+        media_type="application/json",
     )
 
+
+@router.get(
+    "/records",
+    response_model=BaseResponseDetailSchema[list[HistoryRecordSchema], CursorMetadata],
+    responses={
+        status.HTTP_400_BAD_REQUEST: {
+            "model": BaseExceptionSchema,
+            "description": "Некорректный курсор",
+        }
+    },
+)
+async def list_account_history(
+    history_service: HistoryServiceDep,
+    schema: Annotated[ListHistorySchema, Depends()],
+    account_id: str,
+    user_id: str,
+):
+    """
+    Сырая история счёта без группировки, от новых записей к старым
+
+    Постраничная выдача по курсору: для следующей страницы передайте `cursor`
+    из `metadata.nextCursor`. Если `nextCursor` пустой - страница последняя.
+    Фильтры: `isMonthlyClosing`, `dateFrom` (включительно), `dateTo` (не включительно)
+    """
+
+    histories, next_cursor = await history_service.list_account_history(
+        command=ListAccountHistoryCommand(
+            user_id=user_id,
+            account_id=account_id,
+            limit=schema.limit,
+            cursor=schema.cursor,
+            is_monthly_closing=schema.is_monthly_closing,
+            date_from=schema.date_from,
+            date_to=schema.date_to,
+        )
+    )
     return BaseResponseDetailSchema(
-        detail=[HistoryDTO.from_entity_to_dict(row) for row in history],
-        message="История счёта успешно получена",
-        metadata=HistoryMetadata(**history_service.metadata),
+        detail=[HistoryDTO.from_entity_to_dict(row) for row in histories],
+        message="Записи истории счёта получены",
+        metadata=CursorMetadata(next_cursor=next_cursor, limit=schema.limit),
+    )
+
+
+@router.get("/profit", response_model=HistoryProfitResponse)
+async def get_profit_by_time_interval(
+    history_service: HistoryServiceDep,
+    schema: Annotated[GetHistorySchema, Depends()],
+    account_id: str,
+    user_id: str,
+):
+    """
+    Считает процентный доход счёта за определенный интервал времени
+
+    Дополнительно возвращает первый, последний, минимальный и максимальный баланс
+    за интервал, а также сумму пополнений (incomes) и списаний (expenses)
+    """
+
+    command = GetAccountHistoryCommand(
+        interval=schema.interval,
+        account_id=account_id,
+        user_id=user_id,
+    )
+
+    async def build() -> bytes:
+        profit = await history_service.get_history_profit(command=command)
+        return dump_response(
+            HistoryProfitResponse(
+                message="Получен доход счёта",
+                detail=HistoryProfitSchema(**profit),
+                metadata=HistoryMetadata(**history_service.metadata),
+            )
+        )
+
+    return Response(
+        content=await history_service.get_cached(
+            account_id=account_id, key=f"profit:{schema.interval.value}", build=build
+        ),
+        media_type="application/json",
     )
 
 
 @router.get(
-    "/profit",
-    response_model=BaseResponseDetailSchema[HistoryProfitSchema, HistoryMetadata],
+    "/analytics",
+    response_model=BaseResponseDetailSchema[HistoryAnalyticsSchema, HistoryMetadata],
 )
-async def get_profit_by_time_interval(
+async def get_history_analytics(
     history_service: HistoryServiceDep,
     schema: Annotated[GetHistorySchema, Depends()],
     account_id: str,
     user_id: str,
 ):
-    """Считает процентный доход счёта за определенный интервал времени"""
+    """
+    Аналитика счёта за интервал по периодам группировки (как в графике истории)
+
+    - totalReturn: доходность за интервал
+    - maxDrawdown: максимальная просадка от пика (доля)
+    - volatility: стандартное отклонение доходности периодов
+    - rollingVolatility: скользящая волатильность по окну rollingWindow периодов
+    - cagr: среднегодовой темп роста
+    - bestBucket / worstBucket: период с лучшей и худшей доходностью
+    - depositAdjustedReturn: изменение баланса к начальному балансу плюс всем пополнениям
+    """
 
-    profit = await history_service.get_history_profit(
+    analytics = await history_service.get_history_analytics(
         command=GetAccountHistoryCommand(
             interval=schema.interval,
             account_id=account_id,
@@ -95,7 +279,91 @@ async def get_profit_by_time_interval(
         )
     )
     return BaseResponseDetailSchema(
-        message="Получен доход счёта",
-        detail=HistoryProfitSchema(**profit),
+        message="Получена аналитика счёта",
+        detail=HistoryAnalyticsSchema(**analytics),
         metadata=HistoryMetadata(**history_service.metadata),
     )
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={
+        status.HTTP_200_OK: {
+            "content": {"application/x-ndjson": {}, "text/csv": {}},
+            "description": "Поток записей истории счёта",
+        }
+    },
+)
+async def export_account_history(
+    history_service: HistoryServiceDep,
+    schema: Annotated[ExportHistorySchema, Depends()],
+    account_id: str,
+    user_id: str,
+):
+    """
+    Потоковая выгрузка всей истории счёта без группировки
+
+    Записи отдаются по возрастанию даты в формате NDJSON или CSV.
+    Для продолжения прерванной выгрузки передайте в `since` дату, а в `afterId` - id
+    последней полученной записи
+    """
+
+    return StreamingResponse(
+        content=history_service.export_history(
+            command=ExportAccountHistoryCommand(
+                account_id=account_id,
+                user_id=user_id,
+                format=schema.format,
+                since=schema.since,
+                after_id=schema.after_id,
+            )
+        ),
+        media_type=schema.format.media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename=history-{account_id}.{schema.format.value}"
+        },
+    )
+
+
+@router.post(
+    "/import",
+    response_model=BaseResponseDetailSchema[HistoryImportSchema, dict],
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        status.HTTP_400_BAD_REQUEST: {
+            "model": BaseExceptionSchema,
+            "description": "Пустой файл ИЛИ некорректная запись истории",
+        }
+    },
+)
+async def import_account_history(
+    history_service: HistoryServiceDep,
+    account_service: AccountServiceDep,
+    schema: Annotated[ImportHistorySchema, Depends()],
+    request: Request,
+    account_id: str,
+    user_id: str,
+):
+    """
+    Импорт истории счёта из NDJSON или CSV (формат выгрузки `/export`)
+
+    Обязательные поля записи: `balance`, `createdAt`. Изменение баланса пересчитывается
+    по соседним записям, а текущий баланс счёта выставляется по последней записи
+    """
+
+    result = await history_service.import_history(
+        command=ImportAccountHistoryCommand(
+            account_id=account_id,
+            user_id=user_id,
+            format=schema.format,
+            data=await request.body(),
+        )
+    )
+    # Баланс счёта выставлен импортом в обход сервиса счетов
+    await account_service.invalidate_cache(account_id=account_id, user_id=user_id)
+    return BaseResponseDetailSchema(
+        message="История счёта успешно импортирована",
+        detail=HistoryImportSchema(**result),
+        metadata={},
+    )
@@ -0,0 +1,89 @@
+"""
+Импорт истории счёта из файла NDJSON или CSV (формат выгрузки /export)
+
+Использование: python -m cli.histories --user-id ID --account-id ID [--format csv] FILE
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from pathlib import Path
+
+from core.logger import setup_logger
+from domain.accounts.exceptions import AccountNotFoundException
+from domain.accounts.values import AccountId
+from domain.histories.commands import ImportAccountHistoryCommand
+from domain.histories.service import HistoryService
+from domain.histories.values import HistoryExportFormat
+from domain.users.values import UserId
+from infra.cache.accounts import get_account_cache
+from infra.cache.histories import RedisHistoryCache
+from infra.cache.redis import get_redis_client
+from infra.database import db_helper
+from infra.repositories.accounts import SQLAlchemyAccountRepository
+from infra.repositories.histories import SQLAlchemyHistoryRepository
+
+logger = logging.getLogger(__name__)
+
+
+async def import_history(
+    user_id: str, account_id: str, fmt: HistoryExportFormat, path: Path
+) -> None:
+    started = time.perf_counter()
+
+    try:
+        async with db_helper.session_factory() as session:
+            if not await SQLAlchemyAccountRepository(session).get_by_id(
+                user_id=user_id, account_id=account_id
+            ):
+                raise AccountNotFoundException
+
+            result = await HistoryService(
+                history_repo=SQLAlchemyHistoryRepository(session),
+                history_cache=RedisHistoryCache(get_redis_client()),
+            ).import_history(
+                command=ImportAccountHistoryCommand(
+                    user_id=user_id,
+                    account_id=account_id,
+                    format=fmt,
+                    data=path.read_bytes(),
+                )
+            )
+            # Баланс счёта выставлен импортом - кэш счёта больше не актуален.
+            # Ключи публикуются в канал инвалидации: L1 воркеров API тоже сбрасывается
+            account_cache = get_account_cache(get_redis_client())
+            await account_cache.delete(AccountId(account_id))
+            await account_cache.delete_user_accounts(UserId(user_id))
+    finally:
+        await db_helper.dispose()
+        await get_redis_client().aclose()
+
+    logger.info(
+        "Импортировано %s записей за %.2f сек, баланс счёта: %s",
+        result["imported"],
+        time.perf_counter() - started,
+        result["balance"],
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Импорт истории счёта")
+    parser.add_argument("--user-id", required=True, help="id пользователя")
+    parser.add_argument("--account-id", required=True, help="id счёта")
+    parser.add_argument(
+        "--format",
+        type=HistoryExportFormat,
+        choices=list(HistoryExportFormat),
+        default=HistoryExportFormat.NDJSON,
+        help="формат файла (по умолчанию - ndjson)",
+    )
+    parser.add_argument("file", type=Path, help="путь к файлу истории")
+    args = parser.parse_args()
+
+    setup_logger()
+    asyncio.run(import_history(args.user_id, args.account_id, args.format, args.file))
+
+
+if __name__ == "__main__":
+    main()
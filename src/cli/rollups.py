@@ -0,0 +1,71 @@
+"""
+Пересчёт агрегатов истории счетов по уже сохраненным записям
+
+Использование: python -m cli.rollups [--account-id ID ...]
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+from sqlalchemy import select
+
+from core.logger import setup_logger
+from domain.accounts.values import AccountId
+from infra.database import db_helper
+from infra.models import AccountModel
+from infra.repositories.histories import SQLAlchemyHistoryRepository
+
+logger = logging.getLogger(__name__)
+
+
+async def backfill_rollups(account_ids: list[str]) -> None:
+    async with db_helper.session_factory() as session:
+        if not account_ids:
+            account_ids = list(
+                await session.scalars(select(AccountModel.id).order_by(AccountModel.id))
+            )
+
+    total = 0
+    started = time.perf_counter()
+
+    for account_id in account_ids:
+        # Отдельная сессия и транзакция на каждый счёт
+        async with db_helper.session_factory() as session:
+            count = await SQLAlchemyHistoryRepository(session).rebuild_rollups(
+                account_id
+            )
+        total += count
+        logger.info(
+            "Агрегаты счёта #%s пересчитаны (%s записей)",
+            AccountId(account_id).short,
+            count,
+        )
+
+    logger.info(
+        "Пересчитано %s счетов, %s записей за %.2f сек",
+        len(account_ids),
+        total,
+        time.perf_counter() - started,
+    )
+    await db_helper.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Пересчёт агрегатов истории счетов")
+    parser.add_argument(
+        "--account-id",
+        dest="account_ids",
+        action="append",
+        default=[],
+        help="id счёта (по умолчанию - все счета)",
+    )
+    args = parser.parse_args()
+
+    setup_logger()
+    asyncio.run(backfill_rollups(args.account_ids))
+
+
+if __name__ == "__main__":
+    main()
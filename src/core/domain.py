@@ -6,6 +6,8 @@ from datetime import datetime, timezone
 @dataclass(frozen=True)
 class DomainEvent:
     occurred_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    # Повторная доставка несёт тот же id: по нему обработчики отбрасывают дубли
+    event_id: str = field(default_factory=lambda: str(uuid.uuid4()))
 
 
 @dataclass(frozen=True)
@@ -1,6 +1,6 @@
 from datetime import timedelta
 from pathlib import Path
-from typing import Literal
+from typing import Literal, Optional
 
 from dotenv import load_dotenv
 from pydantic import BaseModel
@@ -43,6 +43,43 @@ class SQLAlchemyConfig(BaseModel):
     echo: bool = False
 
 
+class PartitionsConfig(BaseModel):
+    """Месячные секции accounts_history (только Postgres)"""
+
+    cron: str = "0 3 * * *"
+    premake_months: int = 3
+    retention_months: Optional[int] = None  # None - старые секции не отсоединяются
+
+
+class CompactionTierConfig(BaseModel):
+    older_than: timedelta
+    period: Literal["hours", "days", "weeks"]
+
+
+class CompactionConfig(BaseModel):
+    """
+    Прореживание старой истории счетов
+
+    Записи старше `older_than` сворачиваются до одной на период.
+    По умолчанию: 7 дней без изменений, до 90 дней - по часу, дальше - по дню
+    """
+
+    cron: str = "30 3 * * *"
+    batch_size: int = 100  # счетов в пачке
+    tiers: list[CompactionTierConfig] = [
+        CompactionTierConfig(older_than=timedelta(days=7), period="hours"),
+        CompactionTierConfig(older_than=timedelta(days=90), period="days"),
+    ]
+
+
+class OutboxConfig(BaseModel):
+    """Ретранслятор исходящих событий: размер пачки, период опроса (сек), число попыток"""
+
+    batch_size: int = 100
+    poll_interval: float = 1.0
+    max_attempts: int = 10
+
+
 class DBConfig(BaseModel):
     user: str
     password: str
@@ -51,6 +88,7 @@ class DBConfig(BaseModel):
     name: str
 
     sqla: SQLAlchemyConfig = SQLAlchemyConfig()
+    partitions: PartitionsConfig = PartitionsConfig()
 
     @property
     def POSTGRES_DSN(self) -> str:
@@ -61,6 +99,40 @@ class DBConfig(BaseModel):
         return f"sqlite+aiosqlite:///{settings.files.test_db.as_posix()}"
 
 
+class HistoryWriterConfig(BaseModel):
+    """
+    Запись истории по событиям счетов
+
+    - mode: broker - воркером через outbox и брокер, in_process - в транзакции
+      изменения счёта (один узел, история доступна сразу). В режиме in_process
+      брокер работает в памяти процесса, а ретранслятор outbox не запускается
+    - воркер пишет пачку одной вставкой, когда набралось max_batch событий
+      или прошло max_delay_ms с первого
+    """
+
+    mode: Literal["broker", "in_process"] = "broker"
+    max_batch: int = 100
+    max_delay_ms: int = 50
+
+
+class TaskTrackerConfig(BaseModel):
+    """
+    Отслеживание результатов задач брокера в процессе API
+
+    - capacity: сколько задач отслеживается одновременно (сверх - не отслеживаются)
+    - batch_size: сколько задач опрашивается за один проход
+    - timeout / drain_timeout: ожидание результата задачи и остановки, сек
+    - track_results: False - результаты не опрашиваются вовсе
+    """
+
+    capacity: int = 10_000
+    batch_size: int = 100
+    poll_interval: float = 1.0
+    timeout: float = 300.0
+    drain_timeout: float = 10.0
+    track_results: bool = True
+
+
 class BrokerConfig(BaseModel):
     user: str
     password: str
@@ -75,12 +147,31 @@ class BrokerConfig(BaseModel):
         )
 
     result_backend_ex_time: int = timedelta(minutes=2).total_seconds()
+    tracker: TaskTrackerConfig = TaskTrackerConfig()
+    # Неподтверждённых сообщений на воркер: не меньше пачки истории
+    qos: int = 200
+    # Формат сообщений: json - формат taskiq по умолчанию, msgpack - infra/serializers.
+    # msgpack включается сначала на воркерах (они читают и JSON), затем в API
+    serializer: Literal["json", "msgpack"] = "json"
+    # Задачи «выполнить и забыть», исчерпавшие повторы (infra/delivery)
+    dead_letter_queue: str = "taskiq.dead_letter"
+    # Без RabbitMQ (один узел): задачи выполняются процессом, который их отправил
+    in_memory: bool = False
 
 
 class CacheConfig(BaseModel):
     port: int
     host: str
 
+    history_ttl: int = int(timedelta(hours=1).total_seconds())
+    account_ttl: int = int(timedelta(minutes=5).total_seconds())
+    # Локальный (L1) кэш счетов в памяти воркера перед Redis
+    account_local_capacity: int = 10_000
+    account_local_ttl: float = 5.0
+    # Защита от одновременных промахов: аренда блокировки загрузки и коэффициент XFetch
+    lock_lease: float = 5.0
+    xfetch_beta: float = 1.0
+
     @property
     def REDIS_DSN(self, db_index: int = 0) -> str:
         return f"redis://{self.host}:{self.port}/{db_index}"
@@ -95,6 +186,9 @@ class Settings(BaseSettings):
     app: AppConfig = AppConfig()
     files: FilesConfig = FilesConfig()
     logs: LogsConfig = LogsConfig()
+    compaction: CompactionConfig = CompactionConfig()
+    outbox: OutboxConfig = OutboxConfig()
+    history_writer: HistoryWriterConfig = HistoryWriterConfig()
 
     model_config = SettingsConfigDict(
         env_nested_delimiter="__",
@@ -0,0 +1,18 @@
+from typing import Protocol, Self
+
+
+class UnitOfWorkProtocol(Protocol):
+    """
+    Единица работы: изменения и их события фиксируются одной транзакцией
+
+    Выход без commit (или с ошибкой) откатывает всё, что сделано внутри
+    """
+
+    async def __aenter__(self) -> Self:
+        pass
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        pass
+
+    async def commit(self) -> None:
+        pass
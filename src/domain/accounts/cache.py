@@ -1,8 +1,9 @@
 from datetime import timedelta
-from typing import Protocol, Optional
+from typing import Protocol, Optional, Awaitable, Callable
 
 from domain.accounts.entity import Account
 from domain.accounts.values import AccountId
+from domain.users.values import UserId
 
 
 class AccountCacheProtocol(Protocol):
@@ -15,6 +16,37 @@ class AccountCacheProtocol(Protocol):
     ) -> None:
         pass
 
+    async def delete(self, account_id: AccountId) -> None:
+        pass
+
+    async def get_or_load(
+        self,
+        account_id: AccountId,
+        user_id: UserId,
+        load: Callable[[], Awaitable[Optional[Account]]],
+    ) -> Optional[Account]:
+        """Счёт из кэша, а при промахе - из load (одна загрузка на одновременные промахи)"""
+        pass
+
+    async def get_user_accounts(self, user_id: UserId) -> Optional[list[Account]]:
+        pass
+
+    async def set_user_accounts(
+        self,
+        user_id: UserId,
+        accounts: list[Account],
+        ttl: Optional[timedelta | int] = None,
+    ) -> None:
+        pass
+
+    async def delete_user_accounts(self, user_id: UserId) -> None:
+        pass
+
+    async def get_or_load_user_accounts(
+        self, user_id: UserId, load: Callable[[], Awaitable[list[Account]]]
+    ) -> list[Account]:
+        pass
+
     @staticmethod
     def account_key(account_id: AccountId) -> str:
         pass
@@ -30,3 +30,12 @@ class UpdateAccountBalanceCommand:
     account_id: str
     new_balance: float
     is_monthly_closing: bool = False
+
+
+@dataclass(frozen=True, kw_only=True)
+class UpdateAccountsBalancesCommand:
+    """Команда для обновления балансов нескольких счетов (закрытие месяца)"""
+
+    user_id: str
+    balances: dict[str, float]
+    is_monthly_closing: bool = False
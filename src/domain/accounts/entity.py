@@ -45,6 +45,27 @@ class Account(TimestampDomainMixin, EventDomainMixin):
         )
         return account
 
+    def balance_updated(self, old_balance: Money, is_monthly_closing: bool) -> bool:
+        """
+        Фиксирует уже сохранённое изменение баланса (с old_balance на текущий)
+
+        Изменение вычисляется по значениям, которые вернула БД, а не по прочитанному заранее
+        """
+
+        if self.balance == old_balance:
+            return False
+
+        self._events.append(
+            BalanceUpdatedEvent(
+                user_id=self.user_id.as_generic_type(),
+                account_id=self.id.as_generic_type(),
+                new_balance=self.balance.as_generic_type(),
+                delta=self.balance.as_generic_type() - old_balance.as_generic_type(),
+                is_monthly_closing=is_monthly_closing,
+            )
+        )
+        return True
+
     def update_balance(self, new_balance: Money, is_monthly_closing: bool) -> bool:
         """Обновление баланса счета"""
 
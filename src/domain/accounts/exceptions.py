@@ -21,6 +21,15 @@ class TooManyAccountsForUserException(AppException):
         return f"Превышен лимит активных счетов"
 
 
+class AccountBalanceConflictException(AppException):
+    status_code: int = status.HTTP_409_CONFLICT
+    suggestion: str = "Повторите запрос позже"
+
+    @property
+    def message(self) -> str:
+        return f"Баланс счёта одновременно изменяется другим запросом"
+
+
 class AccountAlreadyCreatedException(AppException):
     status_code: int = status.HTTP_409_CONFLICT
     suggestion: str = "Попробуйте другое название для создания нового счёта"
@@ -1,3 +1,4 @@
+from decimal import Decimal
 from typing import Protocol, Optional, Any
 
 from core.domain import DomainEvent
@@ -9,6 +10,10 @@ class AccountRepositoryProtocol(Protocol):
     async def save(self, entity: Account) -> str:
         pass
 
+    async def create(self, entity: Account, max_accounts: int) -> bool:
+        """Сохраняет счёт, если у пользователя меньше max_accounts счетов"""
+        pass
+
     async def get_by_id(self, user_id: str, account_id: str) -> Optional[Account]:
         pass
 
@@ -29,8 +34,27 @@ class AccountRepositoryProtocol(Protocol):
     ) -> Optional[Account]:
         pass
 
+    async def update_balance(
+        self, user_id: str, account_id: str, new_balance: Decimal
+    ) -> Optional[tuple[Account, Decimal]]:
+        """Счёт после обновления баланса и прежний баланс (None - счёта нет)"""
+        pass
+
+    async def update_balances(
+        self, user_id: str, balances: dict[str, Decimal]
+    ) -> Optional[list[tuple[Account, Decimal]]]:
+        """
+        Балансы нескольких счетов одним запросом в одной транзакции
+
+        None - хотя бы одного счёта у пользователя нет (ничего не изменено)
+        """
+        pass
+
 
 class AccountEventPublisherProtocol(Protocol):
 
     async def publish(self, event: DomainEvent) -> None:
         pass
+
+    async def publish_many(self, events: list[DomainEvent]) -> None:
+        pass
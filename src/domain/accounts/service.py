@@ -1,16 +1,21 @@
 import logging
+from typing import Optional
 
+from core.uow import UnitOfWorkProtocol
 from domain.users.entity import User
 from domain.users.values import UserId
 from domain.values import Money, Title
+from infra.cache.accounts import AccountCacheDep
 from infra.publishers.accounts import AccountEventPublisherDep
 from infra.repositories.accounts import AccountRepositoryDep
+from infra.uow import UnitOfWorkDep
 from .commands import (
     CreateAccountCommand,
     GetAccountCommand,
     UpdateAccountBalanceCommand,
+    UpdateAccountsBalancesCommand,
 )
-from .dto import AccountDTO
+from .cache import AccountCacheProtocol
 from .entity import Account
 from .exceptions import (
     AccountNotFoundException,
@@ -18,7 +23,7 @@ from .exceptions import (
     AccountAlreadyCreatedException,
 )
 from .protocols import AccountRepositoryProtocol, AccountEventPublisherProtocol
-from .values import AccountId
+from .values import AccountId, BalanceChange
 
 logger = logging.getLogger(__name__)
 
@@ -29,9 +34,13 @@ class AccountCRUDService:
         self,
         account_repo: AccountRepositoryProtocol,
         account_publisher: AccountEventPublisherProtocol,
+        unit_of_work: UnitOfWorkProtocol,
+        account_cache: Optional[AccountCacheProtocol] = None,
     ):
         self._repository = account_repo
         self._publisher = account_publisher
+        self._uow = unit_of_work
+        self._cache = account_cache
 
     async def create_account(self, command: CreateAccountCommand) -> Account:
         """
@@ -39,25 +48,10 @@ class AccountCRUDService:
 
         - Если счёт для текущего пользователя уже существует - ошибка
         - Если превышен лимит активных счётов пользователя - ошибка
-        """
-
-        # Проверка на существование счёта с таким названием
-        check = await self._repository.is_name_taken(
-            user_id=command.user_id, name=command.name
-        )
-        if check:
-            logger.warning(
-                f"Ошибка создания нового счёта для пользователя #{command.user_id[:8]}"
-            )
-            raise AccountAlreadyCreatedException
 
-        # Проверка на лимит активных счетов пользователя
-        count = await self._repository.count_by_user_id(command.user_id)
-        if count >= User.MAX_ACCOUNTS:
-            logger.warning(
-                f"Пользователь #%s превысил лимит активных счётов", command.user_id[:8]
-            )
-            raise TooManyAccountsForUserException
+        Обе проверки выполняет сама вставка (одним запросом), без предварительных чтений.
+        Счёт и его события фиксируются одной транзакцией
+        """
 
         new_account = Account.create(
             user_id=UserId(command.user_id),
@@ -66,25 +60,55 @@ class AccountCRUDService:
             account_type=command.account_type,
             currency=command.currency,
         )
-        acc_id = await self._repository.save(new_account)
 
-        await self._publish(account=new_account)
+        async with self._uow:
+            try:
+                created = await self._repository.create(
+                    new_account, max_accounts=User.MAX_ACCOUNTS
+                )
+            except AccountAlreadyCreatedException:
+                logger.warning(
+                    f"Ошибка создания нового счёта для пользователя #{command.user_id[:8]}"
+                )
+                raise
+
+            if not created:
+                logger.warning(
+                    f"Пользователь #%s превысил лимит активных счётов",
+                    command.user_id[:8],
+                )
+                raise TooManyAccountsForUserException
+
+            await self._publish(account=new_account)
+            await self._uow.commit()
+
+        acc_id = new_account.id.as_generic_type()
+        await self._evict_account(new_account)
 
         logger.info("Новый счёт #%s создан", AccountId(acc_id).short)
         return new_account
 
     async def find_account_by_id(self, command: GetAccountCommand) -> Account:
         """
-        Поиск счёта по уникальному id
+        Поиск счёта по уникальному id (сначала в кэше)
         Если счёта нет - ошибка
         """
 
-        if not (
-            account := await self._repository.get_by_id(
+        def load():
+            return self._repository.get_by_id(
                 account_id=command.account_id,
                 user_id=command.user_id,
             )
-        ):
+
+        if self._cache:
+            account = await self._cache.get_or_load(
+                AccountId(command.account_id), UserId(command.user_id), load
+            )
+        else:
+            account = await load()
+
+        # Счёт из кэша мог принадлежать другому пользователю
+        if not account or account.user_id.as_generic_type() != command.user_id:
             logger.warning("Счёт #%s не найден", AccountId(command.account_id).short)
             raise AccountNotFoundException
 
@@ -92,9 +116,18 @@ class AccountCRUDService:
         return account
 
     async def find_accounts_by_user_id(self, user_id: str) -> list[Account]:
-        """Поиск всех счетов пользователя по его уникальному id"""
+        """Поиск всех счетов пользователя по его уникальному id (сначала в кэше)"""
+
+        def load():
+            return self._repository.get_by_user_id(user_id)
+
+        if self._cache:
+            accounts = await self._cache.get_or_load_user_accounts(
+                UserId(user_id), load
+            )
+        else:
+            accounts = await load()
 
-        accounts = await self._repository.get_by_user_id(user_id)
         logger.info(f"Счёта пользователя #{UserId(user_id).short} получены")
         return accounts
 
@@ -106,9 +139,32 @@ class AccountCRUDService:
             account_id=account.id.as_generic_type(),
             user_id=account.user_id.as_generic_type(),
         )
+        await self.invalidate_cache(
+            account_id=account.id.as_generic_type(),
+            user_id=account.user_id.as_generic_type(),
+        )
         logger.info("Счёт #%s был удален", account.id.short)
         return
 
+    async def invalidate_cache(self, account_id: str, user_id: str) -> None:
+        """Сбрасывает кэш счёта и списка счетов пользователя"""
+
+        if self._cache:
+            await self._cache.delete(AccountId(account_id))
+            await self._cache.delete_user_accounts(UserId(user_id))
+
+    async def _evict_account(self, account: Account) -> None:
+        """
+        Сбрасывает кэш счёта после изменения и список счетов пользователя
+
+        Счёт не записывается в кэш: запись после фиксации может обогнать
+        более позднее изменение из другого запроса и вернуть в кэш старый баланс
+        """
+
+        if self._cache:
+            await self._cache.delete(account.id)
+            await self._cache.delete_user_accounts(account.user_id)
+
     async def _publish(self, account: Account):
         """Публикует события"""
 
@@ -132,38 +188,114 @@ class AccountService(AccountCRUDService):
         self,
         account_repo: AccountRepositoryProtocol,
         account_publisher: AccountEventPublisherProtocol,
+        unit_of_work: UnitOfWorkProtocol,
+        account_cache: Optional[AccountCacheProtocol] = None,
     ):
-        super().__init__(account_repo, account_publisher)
+        super().__init__(account_repo, account_publisher, unit_of_work, account_cache)
 
     async def update_balance(self, command: UpdateAccountBalanceCommand) -> None:
-        """Обновление баланса счета"""
+        """
+        Обновление баланса счета
 
-        account = await self.find_account_by_id(
-            command=GetAccountCommand(
-                account_id=command.account_id, user_id=command.user_id
+        Баланс пишется одним запросом, который возвращает и прежний баланс:
+        изменение считается по нему, а не по счёту, прочитанному заранее (или из кэша).
+        Баланс и событие его изменения фиксируются одной транзакцией
+        """
+
+        async with self._uow:
+            if not (
+                result := await self._repository.update_balance(
+                    user_id=command.user_id,
+                    account_id=command.account_id,
+                    new_balance=Money(command.new_balance).as_generic_type(),
+                )
+            ):
+                logger.warning(
+                    "Счёт #%s не найден", AccountId(command.account_id).short
+                )
+                raise AccountNotFoundException
+
+            account, old_balance = result
+            is_updated = account.balance_updated(
+                old_balance=Money(old_balance),
+                is_monthly_closing=command.is_monthly_closing,
             )
-        )
+            await self._publish(account=account)
+            await self._uow.commit()
 
-        is_updated = account.update_balance(
-            new_balance=Money(command.new_balance),
-            is_monthly_closing=command.is_monthly_closing,
-        )
+        await self._evict_account(account)
         if not is_updated:
             logger.info("Баланс счёта #%s не изменен", account.id.short)
             return
 
-        await self._repository.update(
-            account_id=command.account_id,
-            user_id=command.user_id,
-            upd_data=AccountDTO.from_entity_to_dict(
-                account, excludes=["id", "user_id"]
-            ),
-        )
         logger.info("Баланс счета #%s обновлен", account.id.short)
-        await self._publish(account=account)
+
+    async def update_balances(
+        self, command: UpdateAccountsBalancesCommand
+    ) -> list[BalanceChange]:
+        """
+        Обновление балансов нескольких счетов пользователя (закрытие месяца)
+
+        Все балансы пишутся одним запросом в одной транзакции: если хотя бы одного
+        счёта нет - не меняется ни один. События изменений пишутся в той же транзакции
+        """
+
+        async with self._uow:
+            results = await self._repository.update_balances(
+                user_id=command.user_id,
+                balances={
+                    account_id: Money(balance).as_generic_type()
+                    for account_id, balance in command.balances.items()
+                },
+            )
+            if results is None:
+                logger.warning(
+                    "Счета пользователя #%s не найдены", UserId(command.user_id).short
+                )
+                raise AccountNotFoundException
+
+            changes, events = [], []
+            for account, old_balance in results:
+                account.balance_updated(
+                    old_balance=Money(old_balance),
+                    is_monthly_closing=command.is_monthly_closing,
+                )
+                events.extend(account.events)
+                account.events.clear()
+                changes.append(
+                    BalanceChange(
+                        account_id=account.id.as_generic_type(),
+                        old_balance=Money(old_balance).as_generic_type(),
+                        new_balance=account.balance.as_generic_type(),
+                    )
+                )
+
+            if events:
+                await self._publisher.publish_many(events)
+            await self._uow.commit()
+
+        if self._cache:
+            for account, _ in results:
+                await self._cache.delete(account.id)
+            await self._cache.delete_user_accounts(UserId(command.user_id))
+        logger.info(
+            "Балансы счетов пользователя #%s обновлены: изменено %s из %s",
+            UserId(command.user_id).short,
+            len(events),
+            len(changes),
+        )
+        return changes
 
 
 def get_account_service(
-    acc_repo: AccountRepositoryDep, acc_publisher: AccountEventPublisherDep
+    acc_repo: AccountRepositoryDep,
+    acc_publisher: AccountEventPublisherDep,
+    acc_cache: AccountCacheDep,
+    unit_of_work: UnitOfWorkDep,
 ) -> AccountService:
-    return AccountService(account_repo=acc_repo, account_publisher=acc_publisher)
+    return AccountService(
+        account_repo=acc_repo,
+        account_publisher=acc_publisher,
+        unit_of_work=unit_of_work,
+        account_cache=acc_cache,
+    )
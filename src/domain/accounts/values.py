@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from decimal import Decimal
 from enum import Enum
 
 from core.domain import DomainIdValueObject
@@ -22,3 +23,16 @@ class AccountCurrency(str, Enum):
 @dataclass(frozen=True)
 class AccountId(DomainIdValueObject):
     pass
+
+
+@dataclass(frozen=True, kw_only=True)
+class BalanceChange:
+    """Результат обновления баланса счёта"""
+
+    account_id: str
+    old_balance: Decimal
+    new_balance: Decimal
+
+    @property
+    def is_changed(self) -> bool:
+        return self.old_balance != self.new_balance
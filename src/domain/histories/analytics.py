@@ -0,0 +1,133 @@
+"""
+Аналитика истории счёта на массивах NumPy
+
+Ряд загружается из агрегатов периода одним запросом, все метрики считаются
+векторно - без Python-объектов на каждую запись
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, UTC
+from typing import Any, Optional
+
+import numpy as np
+
+from .values import HistoryPeriod
+
+SECONDS_IN_YEAR = 365.25 * 24 * 60 * 60
+
+# Скользящая волатильность прореживается до этого числа точек (включая последнюю)
+MAX_ROLLING_POINTS = 500
+
+# Окно скользящей волатильности (в периодах) для каждого периода группировки
+ROLLING_WINDOWS: dict[HistoryPeriod, int] = {
+    HistoryPeriod.MINUTES: 60,
+    HistoryPeriod.HOURS: 24,
+    HistoryPeriod.DAYS: 7,
+    HistoryPeriod.WEEKS: 4,
+    HistoryPeriod.MONTHS: 3,
+    HistoryPeriod.YEARS: 2,
+}
+
+
+@dataclass(frozen=True, kw_only=True)
+class HistorySeries:
+    """
+    Ряд истории счёта по периодам (по возрастанию даты)
+
+    - timestamps: начало периода в секундах unix-времени
+    - balances: баланс на конец периода
+    - deltas: сумма изменений баланса за период
+    """
+
+    timestamps: np.ndarray
+    balances: np.ndarray
+    deltas: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.balances)
+
+
+def period_returns(balances: np.ndarray) -> np.ndarray:
+    """Доходность каждого периода к предыдущему (0, если предыдущий баланс нулевой)"""
+
+    previous = balances[:-1]
+    returns = np.zeros_like(previous)
+    np.divide(balances[1:] - previous, previous, out=returns, where=previous > 0)
+    return returns
+
+
+def max_drawdown(balances: np.ndarray) -> float:
+    """Максимальная просадка от пика (доля, неотрицательная)"""
+
+    peaks = np.maximum.accumulate(balances)
+    drawdowns = np.zeros_like(balances)
+    np.divide(peaks - balances, peaks, out=drawdowns, where=peaks > 0)
+    return float(drawdowns.max())
+
+
+def rolling_volatility(returns: np.ndarray, window: int) -> np.ndarray:
+    """Скользящее стандартное отклонение доходности через кумулятивные суммы, O(n)"""
+
+    if window < 2 or len(returns) < window:
+        return np.empty(0)
+
+    sums = np.concatenate(([0.0], np.cumsum(returns)))
+    squares = np.concatenate(([0.0], np.cumsum(returns**2)))
+    window_sums = sums[window:] - sums[:-window]
+    window_squares = squares[window:] - squares[:-window]
+
+    variance = (window_squares - window_sums**2 / window) / (window - 1)
+    return np.sqrt(np.clip(variance, 0, None))
+
+
+def cagr(series: HistorySeries) -> Optional[float]:
+    """Среднегодовой темп роста (None - если его нельзя посчитать)"""
+
+    first, last = series.balances[0], series.balances[-1]
+    years = (series.timestamps[-1] - series.timestamps[0]) / SECONDS_IN_YEAR
+    if first <= 0 or last < 0 or years <= 0:
+        return None
+    return float((last / first) ** (1 / years) - 1)
+
+
+def deposit_adjusted_return(series: HistorySeries) -> float:
+    """
+    Доход к вложенным средствам: изменение баланса относительно
+    начального баланса плюс всех пополнений (положительных delta) после первого периода
+    """
+
+    first, last = series.balances[0], series.balances[-1]
+    invested = first + series.deltas[1:][series.deltas[1:] > 0].sum()
+    return float((last - first) / invested) if invested > 0 else 0.0
+
+
+def _bucket(series: HistorySeries, returns: np.ndarray, index: int) -> dict[str, Any]:
+    return {
+        "date": datetime.fromtimestamp(series.timestamps[index + 1], UTC),
+        "return": float(returns[index]),
+    }
+
+
+def compute_analytics(series: HistorySeries, window: int) -> dict[str, Any]:
+    returns = period_returns(series.balances)
+    first, last = series.balances[0], series.balances[-1]
+
+    rolling = rolling_volatility(returns, window)
+    step = -(-len(rolling) // MAX_ROLLING_POINTS) or 1
+
+    return {
+        "points": len(series),
+        "total_return": float((last - first) / first) if first > 0 else 0.0,
+        "max_drawdown": max_drawdown(series.balances),
+        "volatility": float(returns.std(ddof=1)) if len(returns) > 1 else 0.0,
+        "rolling_window": window,
+        "rolling_volatility": rolling[::-step][::-1].tolist(),
+        "cagr": cagr(series),
+        "best_bucket": (
+            _bucket(series, returns, int(returns.argmax())) if len(returns) else None
+        ),
+        "worst_bucket": (
+            _bucket(series, returns, int(returns.argmin())) if len(returns) else None
+        ),
+        "deposit_adjusted_return": deposit_adjusted_return(series),
+    }
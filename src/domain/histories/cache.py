@@ -0,0 +1,34 @@
+from typing import Protocol, Optional, Awaitable, Callable
+
+
+class HistoryCacheProtocol(Protocol):
+    """
+    Кэш готовых ответов по истории счёта
+
+    Записи ключуются версией счёта: после новой записи истории версия растёт,
+    и старые ответы больше никогда не читаются (истекают по TTL)
+    """
+
+    async def get_version(self, account_id: str) -> int:
+        pass
+
+    async def bump_version(self, account_id: str) -> int:
+        pass
+
+    async def get(self, account_id: str, version: int, key: str) -> Optional[bytes]:
+        pass
+
+    async def set(
+        self, account_id: str, version: int, key: str, payload: bytes
+    ) -> None:
+        pass
+
+    async def get_or_build(
+        self,
+        account_id: str,
+        version: int,
+        key: str,
+        build: Callable[[], Awaitable[bytes]],
+    ) -> bytes:
+        """Ответ из кэша, а при промахе - из build (одна сборка на одновременные промахи)"""
+        pass
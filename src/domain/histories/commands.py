@@ -1,6 +1,12 @@
 from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
 
-from domain.histories.values import HistoryInterval
+from domain.histories.values import (
+    HistoryInterval,
+    HistoryExportFormat,
+    CompactionTier,
+)
 
 
 @dataclass(frozen=True)
@@ -10,6 +16,9 @@ class SaveHistoryCommand:
     balance: float
     delta: float
     is_monthly_closing: bool
+    # Событие-источник: повтор с тем же id не создаёт новую запись
+    event_id: Optional[str] = None
+    occurred_at: Optional[datetime] = None
 
 
 @dataclass(frozen=True)
@@ -17,3 +26,45 @@ class GetAccountHistoryCommand:
     user_id: str
     account_id: str
     interval: HistoryInterval
+
+
+@dataclass(frozen=True)
+class GetAccountsHistoryCommand:
+    user_id: str
+    interval: HistoryInterval
+    account_ids: Optional[list[str]] = None
+
+
+@dataclass(frozen=True)
+class ExportAccountHistoryCommand:
+    user_id: str
+    account_id: str
+    format: HistoryExportFormat
+    since: Optional[datetime] = None
+    after_id: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class ImportAccountHistoryCommand:
+    user_id: str
+    account_id: str
+    format: HistoryExportFormat
+    data: bytes
+
+
+@dataclass(frozen=True)
+class CompactHistoryCommand:
+    tiers: list[CompactionTier]
+    batch_size: int = 100
+    now: Optional[datetime] = None
+
+
+@dataclass(frozen=True)
+class ListAccountHistoryCommand:
+    user_id: str
+    account_id: str
+    limit: int = 20
+    cursor: Optional[str] = None
+    is_monthly_closing: Optional[bool] = None
+    date_from: Optional[datetime] = None
+    date_to: Optional[datetime] = None
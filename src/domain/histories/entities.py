@@ -1,4 +1,6 @@
 from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Optional
 
 from core.domain import CreatedAtDomainMixin
 from domain.accounts.values import AccountId
@@ -15,3 +17,17 @@ class History(CreatedAtDomainMixin):
     balance: Money
     delta: float = field(default=0)
     is_monthly_closing: bool
+    # id события, по которому создана запись (None - импорт, ручная запись)
+    event_id: Optional[str] = None
+
+
+@dataclass(frozen=True, kw_only=True)
+class HistorySummary:
+    """Сводка по истории счёта за интервал"""
+
+    first_balance: Money
+    last_balance: Money
+    min_balance: Money
+    max_balance: Money
+    incomes: Decimal
+    expenses: Decimal
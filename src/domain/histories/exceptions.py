@@ -10,3 +10,35 @@ class HistoryNotExistsException(AppException):
     @property
     def message(self) -> str:
         return f"История счёта отсутствует"
+
+
+class InvalidHistoryImportException(AppException):
+    status_code: int = status.HTTP_400_BAD_REQUEST
+    suggestion: str = (
+        "Каждая запись должна содержать balance >= 0 и createdAt в формате ISO 8601"
+    )
+
+    def __init__(self, row: int):
+        self.row = row
+
+    @property
+    def message(self) -> str:
+        return f"Некорректная запись истории в строке {self.row}"
+
+
+class EmptyHistoryImportException(AppException):
+    status_code: int = status.HTTP_400_BAD_REQUEST
+    suggestion: str = "Передайте хотя бы одну запись истории"
+
+    @property
+    def message(self) -> str:
+        return f"Нет записей для импорта"
+
+
+class InvalidHistoryCursorException(AppException):
+    status_code: int = status.HTTP_400_BAD_REQUEST
+    suggestion: str = "Передайте nextCursor из ответа на предыдущий запрос"
+
+    @property
+    def message(self) -> str:
+        return f"Некорректный курсор постраничной выдачи"
@@ -0,0 +1,54 @@
+import csv
+import io
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, Any
+
+import orjson
+
+from .values import HistoryExportFormat
+
+# Поля записи истории при выгрузке (в том же виде, что и в API)
+EXPORT_FIELDS = ("id", "balance", "delta", "isMonthlyClosing", "createdAt")
+
+HistoryRow = tuple[str, float, float, bool, datetime]
+
+
+def _ensure_utc(dt: datetime) -> datetime:
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+
+def encode_rows(
+    rows: Iterable[HistoryRow], fmt: HistoryExportFormat, header: bool = False
+) -> bytes:
+    """Кодирует пачку записей истории в NDJSON или CSV"""
+
+    if fmt == HistoryExportFormat.NDJSON:
+        return b"".join(
+            orjson.dumps(
+                dict(zip(EXPORT_FIELDS, row)),
+                option=orjson.OPT_NAIVE_UTC | orjson.OPT_APPEND_NEWLINE,
+            )
+            for row in rows
+        )
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(EXPORT_FIELDS)
+    writer.writerows(
+        (history_id, balance, delta, is_closing, _ensure_utc(created_at).isoformat())
+        for history_id, balance, delta, is_closing, created_at in rows
+    )
+    return buffer.getvalue().encode()
+
+
+def decode_rows(data: bytes, fmt: HistoryExportFormat) -> Iterator[dict[str, Any]]:
+    """Разбирает записи истории из NDJSON или CSV (в формате выгрузки)"""
+
+    if fmt == HistoryExportFormat.NDJSON:
+        for line in data.splitlines():
+            if line.strip():
+                yield orjson.loads(line)
+        return
+
+    yield from csv.DictReader(io.StringIO(data.decode("utf-8-sig")))
@@ -1,7 +1,11 @@
 from datetime import datetime
-from typing import Protocol, Optional, Any
+from typing import Protocol, Optional, Any, AsyncIterator
 
-from domain.histories.entities import History
+from domain.histories.analytics import HistorySeries
+from domain.histories.entities import History, HistorySummary
+from domain.histories.formats import HistoryRow
+from domain.histories.values import HistoryPeriod, HistoryCursor
+from domain.values import Money
 
 
 class HistoryRepositoryProtocol(Protocol):
@@ -9,12 +13,26 @@ class HistoryRepositoryProtocol(Protocol):
     async def save(self, history: History) -> str:
         pass
 
+    async def save_many(self, histories: list[History]) -> list[str]:
+        pass
+
     async def get_by_id(self, history_id: str) -> Optional[History]:
         pass
 
     async def get_last_history(self, account_id: str) -> Optional[History]:
         pass
 
+    async def get_history_page(
+        self,
+        account_id: str,
+        limit: int,
+        cursor: Optional[HistoryCursor] = None,
+        is_monthly_closing: Optional[bool] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+    ) -> list[History]:
+        pass
+
     async def get_history_linked_to_period(
         self,
         account_id: str,
@@ -25,6 +43,59 @@ class HistoryRepositoryProtocol(Protocol):
     ) -> list[History]:
         pass
 
+    async def get_history_summary(
+        self, account_id: str, start_date: datetime
+    ) -> Optional[HistorySummary]:
+        pass
+
+    async def get_history_from_rollups(
+        self,
+        account_id: str,
+        period: str,
+        start_date: datetime,
+        limit: Optional[int] = None,
+        asc: bool = True,
+    ) -> list[History]:
+        pass
+
+    async def get_accounts_history_from_rollups(
+        self,
+        user_id: str,
+        period: str,
+        start_date: datetime,
+        account_ids: Optional[list[str]] = None,
+    ) -> dict[str, list[History]]:
+        pass
+
+    async def get_history_series(
+        self, account_id: str, period: str, start_date: datetime
+    ) -> Optional[HistorySeries]:
+        pass
+
+    async def rebuild_rollups(self, account_id: str) -> int:
+        pass
+
+    def stream_history(
+        self,
+        account_id: str,
+        since: Optional[datetime] = None,
+        after_id: Optional[str] = None,
+    ) -> AsyncIterator[list[HistoryRow]]:
+        pass
+
+    async def import_histories(
+        self, account_id: str, histories: list[History]
+    ) -> Money:
+        pass
+
+    async def get_account_ids(self, after: Optional[str], limit: int) -> list[str]:
+        pass
+
+    async def compact_history(
+        self, account_id: str, period: HistoryPeriod, before: datetime
+    ) -> int:
+        pass
+
     async def update(
         self, history_id: str, upd_data: dict[str, Any]
     ) -> Optional[History]:
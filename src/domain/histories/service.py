@@ -1,21 +1,43 @@
 import logging
 from datetime import datetime, UTC
-from typing import Optional, Annotated, Any
+from typing import Optional, Annotated, Any, AsyncIterator, Callable, Awaitable
 
 from dateutil.relativedelta import relativedelta
 from fastapi import Depends
 
 from domain.accounts.values import AccountId
+from domain.exceptions import InvalidBalanceException
 from domain.values import Money
+from infra.cache.histories import HistoryCacheDep
 from infra.repositories.histories import HistoryRepositoryDep
+from .analytics import compute_analytics, ROLLING_WINDOWS
+from .cache import HistoryCacheProtocol
 from .commands import (
     SaveHistoryCommand,
     GetAccountHistoryCommand,
+    ExportAccountHistoryCommand,
+    ImportAccountHistoryCommand,
+    CompactHistoryCommand,
+    ListAccountHistoryCommand,
+    GetAccountsHistoryCommand,
 )
 from .entities import History
-from .exceptions import HistoryNotExistsException
+from .exceptions import (
+    HistoryNotExistsException,
+    InvalidHistoryImportException,
+    EmptyHistoryImportException,
+    InvalidHistoryCursorException,
+)
+from .formats import encode_rows, decode_rows
 from .protocols import HistoryRepositoryProtocol
-from .values import HistoryInterval, HistoryPeriod, HistoryId
+from .values import (
+    HistoryInterval,
+    HistoryPeriod,
+    HistoryId,
+    HistoryExportFormat,
+    CompactionTier,
+    HistoryCursor,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -41,24 +63,79 @@ PERIOD: dict[HistoryInterval, HistoryPeriod] = {
 
 class HistoryService:
 
-    def __init__(self, history_repo: HistoryRepositoryProtocol):
+    def __init__(
+        self,
+        history_repo: HistoryRepositoryProtocol,
+        history_cache: Optional[HistoryCacheProtocol] = None,
+    ):
         self._repository = history_repo
+        self._cache = history_cache
         self.metadata: Optional[dict] = None
 
+    async def get_cached(
+        self, account_id: str, key: str, build: Callable[[], Awaitable[bytes]]
+    ) -> bytes:
+        """
+        Готовый ответ по истории счёта из кэша или собранный build()
+
+        Версия счёта читается до сборки ответа: если за это время появится новая
+        запись, ответ ляжет под старой версией и не будет прочитан
+        """
+
+        if not self._cache:
+            return await build()
+
+        version = await self._cache.get_version(account_id)
+        return await self._cache.get_or_build(account_id, version, key, build)
+
+    async def invalidate_cache(self, account_id: str) -> None:
+        """Сбрасывает кэш ответов по истории счёта (новая версия)"""
+
+        if self._cache:
+            await self._cache.bump_version(account_id)
+
     async def save_account_history(self, command: SaveHistoryCommand) -> str:
         """Сохраняем историю счёта"""
 
-        new_history = History(
+        history_id = await self._repository.save(self._new_history(command))
+        await self.invalidate_cache(command.account_id)
+        logger.info(f"Создана новая история #{HistoryId(history_id).short}")
+
+        return history_id
+
+    async def save_accounts_history(
+        self, commands: list[SaveHistoryCommand]
+    ) -> list[str]:
+        """Сохраняем историю нескольких счетов одной вставкой"""
+
+        history_ids = await self._repository.save_many(
+            [self._new_history(command) for command in commands]
+        )
+        for account_id in {command.account_id for command in commands}:
+            await self.invalidate_cache(account_id)
+
+        logger.info("Создано %s записей истории", len(history_ids))
+        return history_ids
+
+    @staticmethod
+    def _new_history(command: SaveHistoryCommand) -> History:
+        """
+        Запись истории по команде
+
+        Запись события датируется самим событием: повтор доставки даёт ту же
+        пару (event_id, created_at) и отбрасывается репозиторием
+        """
+
+        history = History(
             account_id=AccountId(command.account_id),
             balance=Money(command.balance),
             delta=command.delta,
             is_monthly_closing=command.is_monthly_closing,
+            event_id=command.event_id,
         )
-
-        history_id = await self._repository.save(new_history)
-        logger.info(f"Создана новая история #{HistoryId(history_id).short}")
-
-        return history_id
+        if command.occurred_at:
+            history.created_at = command.occurred_at
+        return history
 
     async def get_account_history(
         self, command: GetAccountHistoryCommand
@@ -67,49 +144,253 @@ class HistoryService:
 
         period, start_date = self.set_metadata(command)
 
-        history = await self._repository.get_history_linked_to_period(
+        history = await self._repository.get_history_from_rollups(
             account_id=command.account_id,
             period=period,
             start_date=start_date,
         )
         return history
 
+    async def get_accounts_history(
+        self, command: GetAccountsHistoryCommand
+    ) -> dict[str, list[History]]:
+        """История нескольких (или всех) счетов пользователя для дашборда"""
+
+        period, start_date = self.set_metadata(command)
+
+        return await self._repository.get_accounts_history_from_rollups(
+            user_id=command.user_id,
+            period=period,
+            start_date=start_date,
+            account_ids=command.account_ids,
+        )
+
+    async def list_account_history(
+        self, command: ListAccountHistoryCommand
+    ) -> tuple[list[History], Optional[str]]:
+        """
+        Страница сырой истории счёта (от новых записей к старым)
+
+        Возвращает записи и курсор следующей страницы (None - страница последняя)
+        """
+
+        try:
+            cursor = HistoryCursor.decode(command.cursor) if command.cursor else None
+        except ValueError:
+            raise InvalidHistoryCursorException
+
+        # Лишняя запись показывает, есть ли следующая страница
+        histories = await self._repository.get_history_page(
+            account_id=command.account_id,
+            limit=command.limit + 1,
+            cursor=cursor,
+            is_monthly_closing=command.is_monthly_closing,
+            date_from=command.date_from,
+            date_to=command.date_to,
+        )
+        if len(histories) <= command.limit:
+            return histories, None
+
+        histories = histories[: command.limit]
+        last = histories[-1]
+        return (
+            histories,
+            HistoryCursor(
+                created_at=last.created_at, id=last.id.as_generic_type()
+            ).encode(),
+        )
+
     async def get_history_profit(
         self, command: GetAccountHistoryCommand
     ) -> dict[str, Any]:
         """Получение дохода по истории"""
 
+        _, start_date = self.set_metadata(command)
+
+        summary = await self._repository.get_history_summary(
+            account_id=command.account_id, start_date=start_date
+        )
+        if not summary:
+            raise HistoryNotExistsException
+
+        first = summary.first_balance.as_generic_type()
+        last = summary.last_balance.as_generic_type()
+
+        amount = last - first
+        percent_profit = amount / (first if first else 1)
+
+        return {
+            "percent_profit": percent_profit,
+            "amount_profit": amount,
+            "first_balance": first,
+            "last_balance": last,
+            "min_balance": summary.min_balance.as_generic_type(),
+            "max_balance": summary.max_balance.as_generic_type(),
+            "incomes": summary.incomes,
+            "expenses": summary.expenses,
+        }
+
+    async def get_history_analytics(
+        self, command: GetAccountHistoryCommand
+    ) -> dict[str, Any]:
+        """Аналитика истории счёта за интервал по периодам группировки"""
+
         period, start_date = self.set_metadata(command)
 
-        first_history, *_ = await self._repository.get_history_linked_to_period(
-            account_id=command.account_id,
-            start_date=start_date,
-            period=period,
-            limit=1,
-            asc=True,
+        series = await self._repository.get_history_series(
+            account_id=command.account_id, period=period, start_date=start_date
         )
-        if not first_history:
+        if not series:
             raise HistoryNotExistsException
 
-        last_history, *_ = await self._repository.get_history_linked_to_period(
+        return compute_analytics(series, window=ROLLING_WINDOWS[HistoryPeriod(period)])
+
+    async def export_history(
+        self, command: ExportAccountHistoryCommand
+    ) -> AsyncIterator[bytes]:
+        """Потоковая выгрузка всей истории счёта (или начиная с since)"""
+
+        if command.format == HistoryExportFormat.CSV:
+            yield encode_rows([], command.format, header=True)
+
+        count = 0
+        async for rows in self._repository.stream_history(
             account_id=command.account_id,
-            start_date=start_date,
-            period=period,
-            limit=1,
-            asc=False,
+            since=command.since,
+            after_id=command.after_id,
+        ):
+            count += len(rows)
+            yield encode_rows(rows, command.format)
+
+        logger.info(
+            "История счёта #%s выгружена (%s записей)",
+            AccountId(command.account_id).short,
+            count,
         )
-        if not last_history:
-            raise HistoryNotExistsException
 
-        divider = (
-            first_history.balance.as_generic_type() if first_history.balance != 0 else 1
+    async def import_history(self, command: ImportAccountHistoryCommand) -> dict:
+        """
+        Импорт истории счёта (например, из другого приложения)
+
+        - Все записи проверяются по правилам Money, при ошибке ничего не сохраняется
+        - Изменение баланса считается от предыдущей по времени записи истории,
+          в том числе уже сохранённой; следующая за загруженными записями
+          сохранённая запись пересчитывается
+        - Текущий баланс счёта пересчитывается по последней записи истории
+
+        Возвращает количество импортированных записей и новый баланс счёта
+        """
+
+        histories = self._parse_import(command)
+        balance = await self._repository.import_histories(
+            account_id=command.account_id, histories=histories
+        )
+        await self.invalidate_cache(command.account_id)
+        logger.info(
+            "В историю счёта #%s импортировано %s записей",
+            AccountId(command.account_id).short,
+            len(histories),
         )
-        percent_profit = (
-            amount := last_history.balance.as_generic_type()
-            - first_history.balance.as_generic_type()
-        ) / divider
+        return {"imported": len(histories), "balance": balance.as_generic_type()}
+
+    @staticmethod
+    def _parse_import(command: ImportAccountHistoryCommand) -> list[History]:
+        points: list[tuple[datetime, Money, bool]] = []
+        try:
+            for row in decode_rows(command.data, command.format):
+                created_at = datetime.fromisoformat(row["createdAt"])
+                is_closing = row.get("isMonthlyClosing") or False
+                points.append(
+                    (
+                        created_at.replace(tzinfo=created_at.tzinfo or UTC),
+                        Money(row["balance"]),
+                        (
+                            is_closing
+                            if isinstance(is_closing, bool)
+                            else is_closing.lower() in ("true", "1")
+                        ),
+                    )
+                )
+        except (
+            KeyError,
+            ValueError,
+            TypeError,
+            AttributeError,
+            ArithmeticError,
+            InvalidBalanceException,
+        ):
+            # Ошибка всегда в первой ещё не разобранной записи
+            raise InvalidHistoryImportException(row=len(points) + 1)
+
+        if not points:
+            raise EmptyHistoryImportException
+
+        points.sort(key=lambda point: point[0])
+
+        histories = []
+        previous: Optional[Money] = None
+        for created_at, balance, is_closing in points:
+            histories.append(
+                History(
+                    account_id=AccountId(command.account_id),
+                    balance=balance,
+                    delta=(
+                        float(balance.as_generic_type() - previous.as_generic_type())
+                        if previous is not None
+                        else 0
+                    ),
+                    is_monthly_closing=is_closing,
+                    created_at=created_at,
+                )
+            )
+            previous = balance
+        return histories
+
+    async def compact_history(self, command: CompactHistoryCommand) -> int:
+        """
+        Прореживание старой истории всех счетов по уровням хранения
+
+        Счета обрабатываются пачками, записи счёта - страницами в коротких транзакциях.
+        Повторный запуск продолжает с водяных знаков и не трогает уже свёрнутые записи
+
+        Возвращает количество удалённых записей
+        """
+
+        now = command.now or datetime.now(UTC)
+        removed = 0
+        after = None
+
+        while account_ids := await self._repository.get_account_ids(
+            after=after, limit=command.batch_size
+        ):
+            for account_id in account_ids:
+                removed += await self._compact_account_history(
+                    account_id, command.tiers, now
+                )
+            after = account_ids[-1]
+
+        logger.info("Прореживание истории завершено: удалено %s записей", removed)
+        return removed
+
+    async def _compact_account_history(
+        self, account_id: str, tiers: list[CompactionTier], now: datetime
+    ) -> int:
+        removed = 0
+        for tier in tiers:
+            removed += await self._repository.compact_history(
+                account_id=account_id,
+                period=tier.period,
+                before=tier.boundary(now),
+            )
 
-        return {"percent_profit": percent_profit, "amount_profit": amount}
+        if removed:
+            await self.invalidate_cache(account_id)
+            logger.info(
+                "История счёта #%s прорежена: удалено %s записей",
+                AccountId(account_id).short,
+                removed,
+            )
+        return removed
 
     def set_metadata(self, command) -> tuple[str, datetime]:
         start_date: datetime = INTERVALS[command.interval]
@@ -121,8 +402,10 @@ class HistoryService:
         return period, start_date
 
 
-def get_history_service(histories_repo: HistoryRepositoryDep) -> HistoryService:
-    return HistoryService(histories_repo)
+def get_history_service(
+    histories_repo: HistoryRepositoryDep, history_cache: HistoryCacheDep
+) -> HistoryService:
+    return HistoryService(histories_repo, history_cache)
 
 
 HistoryServiceDep = Annotated[HistoryService, Depends(get_history_service)]
@@ -1,6 +1,11 @@
+import base64
+import binascii
 from dataclasses import dataclass
+from datetime import datetime, timedelta
 from enum import Enum
 
+import orjson
+
 from core.domain import DomainIdValueObject
 
 
@@ -27,3 +32,77 @@ class HistoryPeriod(str, Enum):
     WEEKS = "weeks"
     MONTHS = "months"
     YEARS = "years"
+
+    def truncate(self, dt: datetime) -> datetime:
+        """Начало периода, в который попадает дата (аналог date_trunc)"""
+
+        match self:
+            case HistoryPeriod.MINUTES:
+                return dt.replace(second=0, microsecond=0)
+            case HistoryPeriod.HOURS:
+                return dt.replace(minute=0, second=0, microsecond=0)
+            case HistoryPeriod.DAYS:
+                return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+            case HistoryPeriod.WEEKS:
+                day = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+                return day - timedelta(days=day.weekday())
+            case HistoryPeriod.MONTHS:
+                return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            case HistoryPeriod.YEARS:
+                return dt.replace(
+                    month=1, day=1, hour=0, minute=0, second=0, microsecond=0
+                )
+
+
+class HistoryExportFormat(str, Enum):
+    """Формат выгрузки истории"""
+
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+    @property
+    def media_type(self) -> str:
+        return {
+            HistoryExportFormat.NDJSON: "application/x-ndjson",
+            HistoryExportFormat.CSV: "text/csv",
+        }[self]
+
+
+@dataclass(frozen=True)
+class CompactionTier:
+    """Записи старше older_than сворачиваются до одной на период"""
+
+    older_than: timedelta
+    period: HistoryPeriod
+
+    def boundary(self, now: datetime) -> datetime:
+        """Начало периода, с которого записи ещё не прореживаются"""
+
+        return self.period.truncate(now - self.older_than)
+
+
+@dataclass(frozen=True)
+class HistoryCursor:
+    """
+    Позиция в списке записей истории (created_at, id последней полученной записи)
+
+    Клиенту отдаётся непрозрачной строкой base64
+    """
+
+    created_at: datetime
+    id: str
+
+    def encode(self) -> str:
+        raw = orjson.dumps([self.created_at.isoformat(), self.id])
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, cursor: str) -> "HistoryCursor":
+        """ValueError - если курсор повреждён"""
+
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            created_at, id_ = orjson.loads(raw)
+            return cls(created_at=datetime.fromisoformat(created_at), id=str(id_))
+        except (binascii.Error, orjson.JSONDecodeError, TypeError, ValueError):
+            raise ValueError("Некорректный курсор")
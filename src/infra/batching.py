@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWriter[T, R]:
+    """
+    Накопитель записей для пакетной записи
+
+    submit ждёт, пока запись будет записана в составе пачки. Пачка пишется одним
+    вызовом write, когда набралось max_size записей или прошло max_delay секунд
+    с первой записи. Если пачка не записалась, она делится пополам, пока ошибка
+    не останется только у «плохих» записей - остальные записываются
+    """
+
+    def __init__(
+        self,
+        write: Callable[[list[T]], Awaitable[list[R]]],
+        max_size: int,
+        max_delay: float,
+    ):
+        self._write_batch = write
+        self._max_size = max_size
+        self._max_delay = max_delay
+        self._buffer: list[tuple[T, asyncio.Future[R]]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._writes: set[asyncio.Task] = set()
+
+    async def submit(self, item: T) -> R:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._buffer.append((item, future))
+
+        if len(self._buffer) >= self._max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._max_delay, self._flush)
+
+        # Отмена ожидающего не отменяет запись пачки
+        return await asyncio.shield(future)
+
+    async def flush(self) -> None:
+        """Записывает накопленное сразу и дожидается всех начатых записей"""
+
+        self._flush()
+        await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def _flush(self) -> None:
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._buffer = self._buffer, []
+        if batch:
+            task = asyncio.create_task(self._write(batch))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    async def _write(self, batch: list[tuple[T, asyncio.Future[R]]]) -> None:
+        try:
+            results = await self._write_batch([item for item, _ in batch])
+        except Exception as exc:
+            if len(batch) == 1:
+                logger.error("Ошибка записи: %s", exc)
+                self._fail(batch, exc)
+                return
+
+            logger.warning(
+                "Ошибка записи пачки из %s записей, делим пополам: %s", len(batch), exc
+            )
+            middle = len(batch) // 2
+            await self._write(batch[:middle])
+            await self._write(batch[middle:])
+            return
+
+        if len(results) != len(batch):
+            # Пачка уже записана и повторять её нельзя: ожидающие получают ошибку,
+            # а не ждут результата вечно
+            self._fail(
+                batch,
+                RuntimeError(f"{len(results)} результатов на пачку из {len(batch)}"),
+            )
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    @staticmethod
+    def _fail(batch: list[tuple[T, asyncio.Future[R]]], exc: Exception) -> None:
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(exc)
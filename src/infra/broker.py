@@ -6,30 +6,48 @@ from taskiq_aio_pika import AioPikaBroker
 from taskiq_redis import RedisAsyncResultBackend
 
 from core.settings import settings
+from infra.delivery import FireAndForgetMiddleware, get_dead_letter_queue
+from infra.serializers import with_serialization
 
 logger = logging.getLogger(__name__)
 
 
 def setup_broker() -> AsyncBroker:
-    if settings.app.env == "TEST":
-        return InMemoryBroker()
-
-    return (
-        AioPikaBroker(url=settings.broker.AMQP_DSN)
-        .with_result_backend(
-            RedisAsyncResultBackend(
-                redis_url=settings.cache.REDIS_DSN, result_ex_time=100
-            )
+    # История пишется в процессе API (один узел) - RabbitMQ не нужен
+    if (
+        settings.app.env == "TEST"
+        or settings.broker.in_memory
+        or settings.history_writer.mode == "in_process"
+    ):
+        broker = with_serialization(InMemoryBroker(), settings.broker.serializer)
+        return broker.with_middlewares(
+            FireAndForgetMiddleware(get_dead_letter_queue(broker))
         )
-        .with_middlewares(
-            SmartRetryMiddleware(
-                default_retry_count=5,
-                default_delay=10,
-                use_jitter=True,
-                use_delay_exponent=True,
-                max_delay_exponent=120,
-            )
+
+    broker = with_serialization(
+        AioPikaBroker(
+            url=settings.broker.AMQP_DSN,
+            qos=settings.broker.qos,
+            dead_letter_queue_name=settings.broker.dead_letter_queue,
+        ),
+        settings.broker.serializer,
+    )
+    return broker.with_result_backend(
+        RedisAsyncResultBackend(
+            redis_url=settings.cache.REDIS_DSN,
+            result_ex_time=100,
+            serializer=broker.serializer,
         )
+    ).with_middlewares(
+        SmartRetryMiddleware(
+            default_retry_count=5,
+            default_delay=10,
+            use_jitter=True,
+            use_delay_exponent=True,
+            max_delay_exponent=120,
+        ),
+        # После повторов: видит, запланирован ли повтор
+        FireAndForgetMiddleware(get_dead_letter_queue(broker)),
     )
 
 
@@ -1,79 +1,509 @@
-import json
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
 from datetime import timedelta, datetime
-from typing import Optional, Annotated, Any
+from typing import Optional, Annotated, Any, Awaitable, Callable
 
+import orjson
 from fastapi import Depends
 from redis.asyncio import Redis
+from redis.exceptions import RedisError
 
+from core.settings import settings
 from domain.accounts.cache import AccountCacheProtocol
+from domain.accounts.dto import AccountDTO
 from domain.accounts.entity import Account
-from domain.accounts.values import AccountId
+from domain.accounts.values import AccountId, AccountType, AccountCurrency
+from domain.users.values import UserId
 from infra.cache.redis import RedisDep
+from infra.cache.stampede import (
+    CacheEntry,
+    SingleFlight,
+    load_with_lease,
+    read_entry,
+    timed,
+    write_entry,
+)
+from infra.cache.stats import CacheStats, account_cache_stats, local_account_cache_stats
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "accounts:invalidate"
+
+AccountLoader = Callable[[], Awaitable[Optional[Account]]]
+AccountsLoader = Callable[[], Awaitable[list[Account]]]
+
+# Загрузки счетов из БД, общие для всех запросов воркера
+account_flight = SingleFlight()
+
+
+def serialize(account: Account) -> dict[str, Any]:
+    data = AccountDTO.from_entity_to_dict(account)
+    data["balance"] = str(data["balance"])
+    return data
+
+
+def _detach(account: Account) -> Account:
+    """Копия счёта без общего списка событий: сервис изменяет полученную сущность"""
+
+    detached = object.__new__(Account)
+    detached.__dict__.update(account.__dict__)
+    detached._events = []
+    return detached
+
+
+def deserialize(data: dict[str, Any]) -> Account:
+    return AccountDTO.from_dict_to_entity(
+        {
+            **data,
+            "type": AccountType(data["type"]),
+            "currency": AccountCurrency(data["currency"]),
+            "created_at": datetime.fromisoformat(data["created_at"]),
+            "updated_at": datetime.fromisoformat(data["updated_at"]),
+        }
+    )
 
 
 class InMemoryAccountCache:
+    """
+    Локальный (L1) кэш счетов в памяти воркера: LRU с ограничением размера и TTL
+
+    Хранит сущности без сериализации и отдаёт их копии. TTL ограничивает устаревание
+    записи, если инвалидация от другого воркера потерялась
+    """
 
-    def __init__(self):
-        self._cache: dict[AccountId, Account] = {}
+    def __init__(
+        self,
+        capacity: int = settings.cache.account_local_capacity,
+        ttl: float = settings.cache.account_local_ttl,
+        stats: CacheStats = None,
+    ):
+        self._entries: OrderedDict[str, tuple[float, Account | list[Account]]] = (
+            OrderedDict()
+        )
+        self._capacity = capacity
+        self._ttl = ttl
+        self.stats = stats or CacheStats()
+        self._flight = SingleFlight()
+        # Метка воркера, чтобы не обрабатывать собственные инвалидации
+        self.origin = uuid.uuid4().hex
 
     async def get(self, account_id: AccountId) -> Optional[Account]:
-        return self._cache.get(account_id, None)
+        account = self._get(self.account_key(account_id))
+        return _detach(account) if account else None
 
     async def set(
         self, account: Account, ttl: Optional[timedelta | int] = None
     ) -> None:
-        self._cache[account.id] = account
-        return
+        self._set(self.account_key(account.id), _detach(account))
+
+    async def delete(self, account_id: AccountId) -> None:
+        self.evict(self.account_key(account_id))
+
+    async def get_or_load(
+        self, account_id: AccountId, user_id: UserId, load: AccountLoader
+    ) -> Optional[Account]:
+        if account := await self.get(account_id):
+            return account
+
+        async def fetch() -> Optional[Account]:
+            if account := await load():
+                await self.set(account)
+            return account
+
+        account = await self._flight.do(
+            f"{self.account_key(account_id)}:{user_id.as_generic_type()}", fetch
+        )
+        return _detach(account) if account else None
+
+    async def get_user_accounts(self, user_id: UserId) -> Optional[list[Account]]:
+        accounts = self._get(self.user_accounts_key(user_id))
+        return (
+            [_detach(account) for account in accounts] if accounts is not None else None
+        )
+
+    async def set_user_accounts(
+        self,
+        user_id: UserId,
+        accounts: list[Account],
+        ttl: Optional[timedelta | int] = None,
+    ) -> None:
+        self._set(
+            self.user_accounts_key(user_id), [_detach(account) for account in accounts]
+        )
+
+    async def delete_user_accounts(self, user_id: UserId) -> None:
+        self.evict(self.user_accounts_key(user_id))
+
+    async def get_or_load_user_accounts(
+        self, user_id: UserId, load: AccountsLoader
+    ) -> list[Account]:
+        if (accounts := await self.get_user_accounts(user_id)) is not None:
+            return accounts
+
+        async def fetch() -> list[Account]:
+            accounts = await load()
+            await self.set_user_accounts(user_id, accounts)
+            return accounts
+
+        accounts = await self._flight.do(self.user_accounts_key(user_id), fetch)
+        return [_detach(account) for account in accounts]
+
+    def evict(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get(self, key: str) -> Optional[Account | list[Account]]:
+        entry = self._entries.get(key)
+        if entry and entry[0] < time.monotonic():
+            del self._entries[key]
+            entry = None
+
+        self.stats.record(hit=entry is not None)
+        if entry is None:
+            return None
+
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _set(self, key: str, value: Account | list[Account]) -> None:
+        self._entries[key] = (time.monotonic() + self._ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._capacity:
+            self._entries.popitem(last=False)
 
     @staticmethod
     def account_key(account_id: AccountId) -> str:
-        return f"account:{account_id.short}"
+        return f"account:{account_id.as_generic_type()}"
+
+    @staticmethod
+    def user_accounts_key(user_id: UserId) -> str:
+        return f"accounts:user:{user_id.as_generic_type()}"
 
 
 class RedisAccountCache:
+    """
+    Кэш счетов в Redis
+
+    Одновременные промахи по ключу загружают счёт из БД один раз на все воркеры,
+    а запись, близкая к истечению, обновляется заранее (XFetch).
+    Недоступность Redis не ломает запросы: чтение считается промахом, запись пропускается
+    """
 
-    def __init__(self, redis: Redis, default_ttl: int = 300):
+    def __init__(
+        self,
+        redis: Redis,
+        default_ttl: int = settings.cache.account_ttl,
+        stats: CacheStats = account_cache_stats,
+        flight: SingleFlight = account_flight,
+    ):
         self._redis = redis
         self._default_ttl = default_ttl
+        self.stats = stats
+        self._flight = flight
 
     async def get(self, account_id: AccountId) -> Optional[Account]:
-        account = await self._redis.get(self.account_key(account_id))
-        if not account:
-            return None
-        data = json.loads(account)
-        return self.deserialize(data)
+        entry = await self._get(self.account_key(account_id))
+        return deserialize(orjson.loads(entry.value)) if entry else None
+
+    async def get_or_load(
+        self, account_id: AccountId, user_id: UserId, load: AccountLoader
+    ) -> Optional[Account]:
+        key = self.account_key(account_id)
+        entry = await self._get(key)
+        if entry and not entry.should_refresh():
+            return deserialize(orjson.loads(entry.value))
+
+        async def fetch() -> Optional[Account]:
+            account, delta = await timed(load)
+            if account:
+                await self._set(key, orjson.dumps(serialize(account)), None, delta)
+            return account
+
+        # Владелец счёта входит в ключ загрузки: запрос чужого счёта не должен
+        # отдать "не найден" ожидающему владельцу
+        flight_key = f"{key}:{user_id.as_generic_type()}"
+        account = await self._flight.do(
+            flight_key,
+            lambda: load_with_lease(
+                self._redis,
+                flight_key,
+                fetch,
+                wait_for=lambda: self.get(account_id),
+                stale=deserialize(orjson.loads(entry.value)) if entry else None,
+            ),
+        )
+        return _detach(account) if account else None
 
     async def set(
         self, account: Account, ttl: Optional[timedelta | int] = None
     ) -> None:
-        await self._redis.set(
-            name=self.account_key(account.id),
-            value=json.dumps(account.to_dict(all_str=True)),
-            ex=ttl or self._default_ttl,
+        await self._set(
+            self.account_key(account.id), orjson.dumps(serialize(account)), ttl
+        )
+
+    async def delete(self, account_id: AccountId) -> None:
+        await self._delete(self.account_key(account_id))
+
+    async def get_user_accounts(self, user_id: UserId) -> Optional[list[Account]]:
+        entry = await self._get(self.user_accounts_key(user_id))
+        return self._deserialize_list(entry.value) if entry else None
+
+    async def get_or_load_user_accounts(
+        self, user_id: UserId, load: AccountsLoader
+    ) -> list[Account]:
+        key = self.user_accounts_key(user_id)
+        entry = await self._get(key)
+        if entry and not entry.should_refresh():
+            return self._deserialize_list(entry.value)
+
+        async def fetch() -> list[Account]:
+            accounts, delta = await timed(load)
+            await self._set(
+                key,
+                orjson.dumps([serialize(account) for account in accounts]),
+                None,
+                delta,
+            )
+            return accounts
+
+        accounts = await self._flight.do(
+            key,
+            lambda: load_with_lease(
+                self._redis,
+                key,
+                fetch,
+                wait_for=lambda: self.get_user_accounts(user_id),
+                stale=self._deserialize_list(entry.value) if entry else None,
+            ),
         )
+        return [_detach(account) for account in accounts]
+
+    async def set_user_accounts(
+        self,
+        user_id: UserId,
+        accounts: list[Account],
+        ttl: Optional[timedelta | int] = None,
+    ) -> None:
+        await self._set(
+            self.user_accounts_key(user_id),
+            orjson.dumps([serialize(account) for account in accounts]),
+            ttl,
+        )
+
+    async def delete_user_accounts(self, user_id: UserId) -> None:
+        await self._delete(self.user_accounts_key(user_id))
+
+    @staticmethod
+    def _deserialize_list(payload: bytes) -> list[Account]:
+        return [deserialize(data) for data in orjson.loads(payload)]
+
+    async def _get(self, key: str) -> Optional[CacheEntry[bytes]]:
+        try:
+            entry = await read_entry(self._redis, key)
+        except RedisError as exc:
+            logger.warning("Redis недоступен, кэш счетов не прочитан: %s", exc)
+            entry = None
+
+        self.stats.record(hit=entry is not None)
+        return entry
+
+    async def _set(
+        self,
+        key: str,
+        payload: bytes,
+        ttl: Optional[timedelta | int],
+        delta: float = 0.0,
+    ) -> None:
+        if isinstance(ttl, timedelta):
+            ttl = int(ttl.total_seconds())
+        try:
+            await write_entry(
+                self._redis, key, payload, ttl or self._default_ttl, delta
+            )
+        except RedisError as exc:
+            logger.warning("Redis недоступен, кэш счетов не записан: %s", exc)
+
+    async def _delete(self, key: str) -> None:
+        try:
+            await self._redis.delete(key)
+        except RedisError as exc:
+            logger.warning("Redis недоступен, кэш счетов не сброшен: %s", exc)
 
     @staticmethod
     def account_key(account_id: AccountId) -> str:
-        return f"account:{account_id.short}"
+        return f"account:{account_id.as_generic_type()}"
 
     @staticmethod
-    def deserialize(data: dict[str, Any]) -> Account:
-        from domain.users.values import UserId
-        from domain.values import Title
-
-        return Account(
-            id=AccountId(data.get("id")),
-            user_id=UserId(data.get("id")),
-            name=Title(data.get("name")),
-            type=data.get("type"),
-            currency=data.get("currency"),
-            balance=data.get("balance"),
-            created_at=datetime.fromisoformat(data.get("created_at")),
-        )
+    def user_accounts_key(user_id: UserId) -> str:
+        return f"accounts:user:{user_id.as_generic_type()}"
+
+
+class TieredAccountCache:
+    """
+    Двухуровневый кэш счетов: локальный LRU воркера (L1) перед Redis (L2)
+
+    Изменения пишутся в оба уровня, а ключи публикуются в канал инвалидации,
+    чтобы остальные воркеры вытеснили их из своего L1
+    """
+
+    def __init__(
+        self, local: InMemoryAccountCache, remote: RedisAccountCache, redis: Redis
+    ):
+        self._local = local
+        self._remote = remote
+        self._redis = redis
+
+    async def get(self, account_id: AccountId) -> Optional[Account]:
+        if account := await self._local.get(account_id):
+            return account
+
+        if account := await self._remote.get(account_id):
+            await self._local.set(account)
+        return account
+
+    async def get_or_load(
+        self, account_id: AccountId, user_id: UserId, load: AccountLoader
+    ) -> Optional[Account]:
+        if account := await self._local.get(account_id):
+            return account
+
+        if account := await self._remote.get_or_load(account_id, user_id, load):
+            await self._local.set(account)
+        return account
+
+    async def set(
+        self, account: Account, ttl: Optional[timedelta | int] = None
+    ) -> None:
+        await self._remote.set(account, ttl)
+        await self._local.set(account)
+        await self._publish(self.account_key(account.id))
+
+    async def delete(self, account_id: AccountId) -> None:
+        await self._remote.delete(account_id)
+        await self._local.delete(account_id)
+        await self._publish(self.account_key(account_id))
+
+    async def get_user_accounts(self, user_id: UserId) -> Optional[list[Account]]:
+        if (accounts := await self._local.get_user_accounts(user_id)) is not None:
+            return accounts
+
+        if (accounts := await self._remote.get_user_accounts(user_id)) is not None:
+            await self._local.set_user_accounts(user_id, accounts)
+        return accounts
+
+    async def get_or_load_user_accounts(
+        self, user_id: UserId, load: AccountsLoader
+    ) -> list[Account]:
+        if (accounts := await self._local.get_user_accounts(user_id)) is not None:
+            return accounts
+
+        accounts = await self._remote.get_or_load_user_accounts(user_id, load)
+        await self._local.set_user_accounts(user_id, accounts)
+        return accounts
+
+    async def set_user_accounts(
+        self,
+        user_id: UserId,
+        accounts: list[Account],
+        ttl: Optional[timedelta | int] = None,
+    ) -> None:
+        await self._remote.set_user_accounts(user_id, accounts, ttl)
+        await self._local.set_user_accounts(user_id, accounts)
+
+    async def delete_user_accounts(self, user_id: UserId) -> None:
+        await self._remote.delete_user_accounts(user_id)
+        await self._local.delete_user_accounts(user_id)
+        await self._publish(self.user_accounts_key(user_id))
+
+    async def _publish(self, key: str) -> None:
+        try:
+            await self._redis.publish(
+                INVALIDATION_CHANNEL,
+                orjson.dumps({"origin": self._local.origin, "key": key}),
+            )
+        except RedisError as exc:
+            logger.warning(
+                "Redis недоступен, инвалидация кэша счетов не отправлена: %s", exc
+            )
+
+    @staticmethod
+    def account_key(account_id: AccountId) -> str:
+        return f"account:{account_id.as_generic_type()}"
+
+    @staticmethod
+    def user_accounts_key(user_id: UserId) -> str:
+        return f"accounts:user:{user_id.as_generic_type()}"
+
+
+class AccountCacheInvalidator:
+    """
+    Подписка воркера на инвалидации кэша счетов из других воркеров
+
+    При обрыве соединения L1 очищается целиком: сообщения за время переподключения потеряны
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        local: InMemoryAccountCache,
+        reconnect_delay: float = 1.0,
+    ):
+        self._redis = redis
+        self._local = local
+        self._reconnect_delay = reconnect_delay
+        self._task: Optional[asyncio.Task] = None
+        self.subscribed = asyncio.Event()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATION_CHANNEL)
+                    self._local.clear()
+                    self.subscribed.set()
+
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self._handle(message["data"])
+            except RedisError as exc:
+                logger.warning("Подписка на инвалидации кэша счетов прервана: %s", exc)
+                self.subscribed.clear()
+                self._local.clear()
+                await asyncio.sleep(self._reconnect_delay)
+
+    def _handle(self, payload: bytes) -> None:
+        # Битое сообщение в канале не должно останавливать подписку
+        try:
+            data = orjson.loads(payload)
+            if data["origin"] != self._local.origin:
+                self._local.evict(data["key"])
+        except (orjson.JSONDecodeError, KeyError, TypeError) as exc:
+            logger.warning("Некорректная инвалидация кэша счетов %r: %s", payload, exc)
+
+
+# L1 кэш общий для всех запросов воркера
+local_account_cache = InMemoryAccountCache(stats=local_account_cache_stats)
 
 
 def get_account_cache(redis: RedisDep) -> AccountCacheProtocol:
-    return RedisAccountCache(redis)
+    return TieredAccountCache(local_account_cache, RedisAccountCache(redis), redis)
 
 
 AccountCacheDep = Annotated[AccountCacheProtocol, Depends(get_account_cache)]
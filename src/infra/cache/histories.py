@@ -0,0 +1,167 @@
+import logging
+from typing import Optional, Annotated, Awaitable, Callable
+
+from fastapi import Depends
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from core.settings import settings
+from domain.histories.cache import HistoryCacheProtocol
+from infra.cache.redis import RedisDep
+from infra.cache.stampede import (
+    CacheEntry,
+    SingleFlight,
+    load_with_lease,
+    read_entry,
+    timed,
+    write_entry,
+)
+
+logger = logging.getLogger(__name__)
+
+# Сборки ответов по истории, общие для всех запросов воркера
+history_flight = SingleFlight()
+
+
+class InMemoryHistoryCache:
+
+    def __init__(self):
+        self._versions: dict[str, int] = {}
+        self._cache: dict[str, bytes] = {}
+        self._flight = SingleFlight()
+
+    async def get_version(self, account_id: str) -> int:
+        return self._versions.get(account_id, 0)
+
+    async def bump_version(self, account_id: str) -> int:
+        self._versions[account_id] = self._versions.get(account_id, 0) + 1
+        return self._versions[account_id]
+
+    async def get(self, account_id: str, version: int, key: str) -> Optional[bytes]:
+        return self._cache.get(self.entry_key(account_id, version, key))
+
+    async def set(
+        self, account_id: str, version: int, key: str, payload: bytes
+    ) -> None:
+        self._cache[self.entry_key(account_id, version, key)] = payload
+
+    async def get_or_build(
+        self,
+        account_id: str,
+        version: int,
+        key: str,
+        build: Callable[[], Awaitable[bytes]],
+    ) -> bytes:
+        if payload := await self.get(account_id, version, key):
+            return payload
+
+        async def fetch() -> bytes:
+            payload = await build()
+            await self.set(account_id, version, key, payload)
+            return payload
+
+        return await self._flight.do(self.entry_key(account_id, version, key), fetch)
+
+    @staticmethod
+    def entry_key(account_id: str, version: int, key: str) -> str:
+        return f"history:{account_id}:{version}:{key}"
+
+
+class RedisHistoryCache:
+    """
+    Кэш ответов по истории в Redis
+
+    Одновременные промахи по ответу собирают его один раз на все воркеры,
+    а запись, близкая к истечению, обновляется заранее (XFetch).
+    Недоступность Redis не ломает запросы: чтение считается промахом, запись пропускается
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        ttl: int = settings.cache.history_ttl,
+        flight: SingleFlight = history_flight,
+    ):
+        self._redis = redis
+        self._ttl = ttl
+        self._flight = flight
+
+    async def get_version(self, account_id: str) -> int:
+        try:
+            version = await self._redis.get(self.version_key(account_id))
+        except RedisError as exc:
+            logger.warning("Redis недоступен, версия истории не получена: %s", exc)
+            return 0
+        return int(version or 0)
+
+    async def bump_version(self, account_id: str) -> int:
+        try:
+            return await self._redis.incr(self.version_key(account_id))
+        except RedisError as exc:
+            logger.warning("Redis недоступен, версия истории не обновлена: %s", exc)
+            return 0
+
+    async def get(self, account_id: str, version: int, key: str) -> Optional[bytes]:
+        entry = await self._get(self.entry_key(account_id, version, key))
+        return entry.value if entry else None
+
+    async def set(
+        self, account_id: str, version: int, key: str, payload: bytes
+    ) -> None:
+        await self._set(self.entry_key(account_id, version, key), payload)
+
+    async def get_or_build(
+        self,
+        account_id: str,
+        version: int,
+        key: str,
+        build: Callable[[], Awaitable[bytes]],
+    ) -> bytes:
+        entry_key = self.entry_key(account_id, version, key)
+        entry = await self._get(entry_key)
+        if entry and not entry.should_refresh():
+            return entry.value
+
+        async def fetch() -> bytes:
+            payload, delta = await timed(build)
+            await self._set(entry_key, payload, delta)
+            return payload
+
+        return await self._flight.do(
+            entry_key,
+            lambda: load_with_lease(
+                self._redis,
+                entry_key,
+                fetch,
+                wait_for=lambda: self.get(account_id, version, key),
+                stale=entry.value if entry else None,
+            ),
+        )
+
+    async def _get(self, entry_key: str) -> Optional[CacheEntry[bytes]]:
+        try:
+            return await read_entry(self._redis, entry_key)
+        except RedisError as exc:
+            logger.warning("Redis недоступен, кэш истории не прочитан: %s", exc)
+            return None
+
+    async def _set(self, entry_key: str, payload: bytes, delta: float = 0.0) -> None:
+        try:
+            await write_entry(self._redis, entry_key, payload, self._ttl, delta)
+        except RedisError as exc:
+            logger.warning("Redis недоступен, кэш истории не записан: %s", exc)
+
+    @staticmethod
+    def version_key(account_id: str) -> str:
+        return f"history:version:{account_id}"
+
+    @staticmethod
+    def entry_key(account_id: str, version: int, key: str) -> str:
+        return f"history:{account_id}:{version}:{key}"
+
+
+def get_history_cache(redis: RedisDep) -> HistoryCacheProtocol:
+    return RedisHistoryCache(redis)
+
+
+HistoryCacheDep = Annotated[HistoryCacheProtocol, Depends(get_history_cache)]
@@ -0,0 +1,174 @@
+"""
+Защита от «лавины» промахов кэша
+
+- SingleFlight схлопывает одновременные загрузки одного ключа в воркере в один вызов
+- load_with_lease пропускает к источнику один воркер из всех через короткую блокировку
+  в Redis, остальные ждут, пока значение появится в кэше
+- CacheEntry.should_refresh - вероятностное раннее обновление (XFetch): чем ближе
+  истечение записи и чем дольше её вычисление, тем вероятнее обновить её заранее
+"""
+
+import asyncio
+import logging
+import math
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CacheEntry[T]:
+    """
+    Значение кэша с метаданными для раннего обновления
+
+    - delta: время вычисления значения, сек
+    - expires_at: время истечения записи, unix-время
+    """
+
+    value: T
+    delta: float
+    expires_at: float
+
+    def should_refresh(
+        self, beta: float = settings.cache.xfetch_beta, now: Optional[float] = None
+    ) -> bool:
+        now = time.time() if now is None else now
+        return (
+            now - self.delta * beta * math.log(1 - random.random()) >= self.expires_at
+        )
+
+
+async def read_entry(redis: Redis, key: str) -> Optional[CacheEntry[bytes]]:
+    value, delta, expires_at = await redis.hmget(key, "value", "delta", "expires_at")
+    if value is None:
+        return None
+    return CacheEntry(value=value, delta=float(delta), expires_at=float(expires_at))
+
+
+async def write_entry(
+    redis: Redis, key: str, value: bytes, ttl: int, delta: float
+) -> None:
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.delete(key)
+        pipe.hset(
+            key,
+            mapping={"value": value, "delta": delta, "expires_at": time.time() + ttl},
+        )
+        pipe.expire(key, ttl)
+        await pipe.execute()
+
+
+async def timed[T](load: Callable[[], Awaitable[T]]) -> tuple[T, float]:
+    """Значение и время его вычисления"""
+
+    started = time.perf_counter()
+    value = await load()
+    return value, time.perf_counter() - started
+
+
+class SingleFlight:
+    """Одновременные вызовы с одним ключом получают результат одной загрузки"""
+
+    def __init__(self):
+        self._flights: dict[str, asyncio.Future] = {}
+
+    async def do[T](self, key: str, load: Callable[[], Awaitable[T]]) -> T:
+        while (flight := self._flights.get(key)) is not None:
+            try:
+                return await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                # Отменён сам ожидающий, а не загрузка - пробрасываем
+                if not flight.cancelled():
+                    raise
+
+        flight = asyncio.get_running_loop().create_future()
+        self._flights[key] = flight
+        try:
+            value = await load()
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except Exception as exc:
+            flight.set_exception(exc)
+            # Ошибку получают ожидающие, а не цикл событий
+            flight.exception()
+            raise
+        else:
+            flight.set_result(value)
+            return value
+        finally:
+            del self._flights[key]
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+
+async def load_with_lease[T](
+    redis: Redis,
+    key: str,
+    load: Callable[[], Awaitable[T]],
+    wait_for: Callable[[], Awaitable[Optional[T]]],
+    stale: Optional[T] = None,
+    lease: float = settings.cache.lock_lease,
+    poll_interval: float = 0.05,
+) -> T:
+    """
+    Загрузка значения одним воркером из всех
+
+    Воркер, взявший блокировку, загружает значение (и записывает его в кэш внутри load).
+    Остальные опрашивают кэш через wait_for, пока блокировка не снята или не истекла,
+    после чего загружают сами. При раннем обновлении остальные сразу получают
+    прежнее значение stale. Недоступность Redis - загрузка без блокировки
+    """
+
+    lock_key, token = f"lock:{key}", uuid.uuid4().hex
+    try:
+        acquired = await redis.set(lock_key, token, nx=True, px=int(lease * 1000))
+    except RedisError as exc:
+        logger.warning("Redis недоступен, загрузка %s без блокировки: %s", key, exc)
+        return await load()
+
+    if acquired:
+        try:
+            return await load()
+        finally:
+            await _release(redis, lock_key, token)
+
+    if stale is not None:
+        return stale
+
+    deadline = time.monotonic() + lease
+    while time.monotonic() < deadline:
+        await asyncio.sleep(poll_interval)
+        if (value := await wait_for()) is not None:
+            return value
+        try:
+            if not await redis.exists(lock_key):
+                break
+        except RedisError:
+            break
+
+    return await load()
+
+
+async def _release(redis: Redis, lock_key: str, token: str) -> None:
+    """Снимает только свою блокировку: чужую (после истечения аренды) не трогаем"""
+
+    try:
+        async with redis.pipeline(transaction=True) as pipe:
+            await pipe.watch(lock_key)
+            if await pipe.get(lock_key) == token.encode():
+                pipe.multi()
+                pipe.delete(lock_key)
+                await pipe.execute()
+    except RedisError as exc:
+        logger.warning("Блокировка %s не снята: %s", lock_key, exc)
@@ -0,0 +1,27 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class CacheStats:
+    """Счётчики попаданий и промахов кэша (общие на процесс)"""
+
+    hits: int = 0
+    misses: int = 0
+
+    def record(self, hit: bool) -> None:
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def reset(self) -> None:
+        self.hits = self.misses = 0
+
+
+account_cache_stats = CacheStats()
+local_account_cache_stats = CacheStats()
@@ -3,6 +3,7 @@ from typing import Annotated
 
 from asyncpg import ConnectionDoesNotExistError
 from fastapi import Depends
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import (
     create_async_engine,
     async_sessionmaker,
@@ -12,10 +13,19 @@ from sqlalchemy.ext.asyncio import (
 
 from core.settings import settings
 from infra.exceptions import UnavailableDBException
+from infra.identity import count_query
 
 logger = logging.getLogger(__name__)
 
 
+def _sqlite_connect(dbapi_connection, _) -> None:
+    dbapi_connection.isolation_level = None
+
+
+def _sqlite_begin(connection) -> None:
+    connection.exec_driver_sql("BEGIN")
+
+
 class SQLADatabaseHelper:
 
     def __init__(self, url: str, echo: bool):
@@ -25,6 +35,12 @@ class SQLADatabaseHelper:
             pool_size=20,
             max_overflow=30,
         )
+        event.listen(self._engine.sync_engine, "before_cursor_execute", count_query)
+        if self._engine.dialect.name == "sqlite":
+            # Транзакцию открывает SQLAlchemy, а не драйвер: иначе SAVEPOINT вне
+            # транзакции драйвера фиксирует изменения при RELEASE
+            event.listen(self._engine.sync_engine, "connect", _sqlite_connect)
+            event.listen(self._engine.sync_engine, "begin", _sqlite_begin)
         self._session_factory = async_sessionmaker(
             bind=self._engine, expire_on_commit=False
         )
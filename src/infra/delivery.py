@@ -0,0 +1,148 @@
+"""
+Режим доставки задач «выполнить и забыть»
+
+Задачи с меткой delivery=fire_and_forget (запись без полезного результата) не пишут
+результат в result backend, а API не опрашивает их готовность. Ошибки не теряются:
+каждая неудачная попытка учитывается в счётчиках, а задача, исчерпавшая повторы,
+отправляется в очередь недоставленных сообщений (DLQ)
+"""
+
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Protocol
+
+from aio_pika import DeliveryMode, Message
+from taskiq import (
+    AsyncBroker,
+    AsyncTaskiqDecoratedTask,
+    NoResultError,
+    TaskiqMessage,
+    TaskiqMiddleware,
+    TaskiqResult,
+)
+from taskiq.message import BrokerMessage
+from taskiq_aio_pika import AioPikaBroker
+
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_LABEL = "delivery"
+FIRE_AND_FORGET = "fire_and_forget"
+
+
+def is_fire_and_forget(task: AsyncTaskiqDecoratedTask) -> bool:
+    return task.labels.get(DELIVERY_LABEL) == FIRE_AND_FORGET
+
+
+@dataclass
+class TaskErrorStats:
+    """
+    Ошибки задач «выполнить и забыть» (общие на процесс)
+
+    - errors: неудачные попытки по имени задачи, включая повторённые
+    - dead_lettered: задачи, отправленные в DLQ
+    """
+
+    errors: Counter[str] = field(default_factory=Counter)
+    dead_lettered: int = 0
+
+    def reset(self) -> None:
+        self.errors.clear()
+        self.dead_lettered = 0
+
+
+task_error_stats = TaskErrorStats()
+
+
+class DeadLetterQueue(Protocol):
+    async def put(self, message: BrokerMessage, error: BaseException) -> None: ...
+
+
+class InMemoryDeadLetterQueue:
+    """DLQ процесса для InMemoryBroker (тесты)"""
+
+    def __init__(self):
+        self.messages: list[tuple[BrokerMessage, str]] = []
+
+    async def put(self, message: BrokerMessage, error: BaseException) -> None:
+        self.messages.append((message, repr(error)))
+
+
+class RabbitDeadLetterQueue:
+    """
+    Очередь недоставленных сообщений брокера в RabbitMQ
+
+    Сообщение кладётся в исходном формате брокера - его можно вернуть в основную
+    очередь без преобразований. Ошибка передаётся в заголовках
+    """
+
+    def __init__(self, broker: AioPikaBroker, queue_name: str):
+        self.broker = broker
+        self.queue_name = queue_name
+
+    async def put(self, message: BrokerMessage, error: BaseException) -> None:
+        await self.broker.write_channel.default_exchange.publish(
+            Message(
+                body=message.message,
+                headers={
+                    "task_id": message.task_id,
+                    "task_name": message.task_name,
+                    "error": repr(error)[:1024],
+                },
+                delivery_mode=DeliveryMode.PERSISTENT,
+            ),
+            routing_key=self.queue_name,
+        )
+
+
+def get_dead_letter_queue(broker: AsyncBroker) -> DeadLetterQueue:
+    if isinstance(broker, AioPikaBroker):
+        return RabbitDeadLetterQueue(broker, settings.broker.dead_letter_queue)
+    return InMemoryDeadLetterQueue()
+
+
+class FireAndForgetMiddleware(TaskiqMiddleware):
+    """
+    Результат задач «выполнить и забыть» не сохраняется (NoResultError)
+
+    Стоит после SmartRetryMiddleware: к post_execute повтор уже запланирован
+    и его результат заменён на NoResultError, иначе ошибка окончательная
+    """
+
+    def __init__(
+        self,
+        dead_letters: DeadLetterQueue,
+        stats: TaskErrorStats = task_error_stats,
+    ):
+        super().__init__()
+        self.dead_letters = dead_letters
+        self.stats = stats
+
+    async def post_execute(
+        self, message: TaskiqMessage, result: TaskiqResult[Any]
+    ) -> None:
+        if message.labels.get(DELIVERY_LABEL) != FIRE_AND_FORGET:
+            return
+
+        if result.is_err:
+            self.stats.errors[message.task_name] += 1
+            if not isinstance(result.error, NoResultError):
+                await self._dead_letter(message, result.error)
+
+        result.error = NoResultError()
+
+    async def _dead_letter(self, message: TaskiqMessage, error: BaseException) -> None:
+        logger.error(
+            "Задача %s #%s завершилась ошибкой, отправляем в DLQ: %r",
+            message.task_name,
+            message.task_id,
+            error,
+        )
+        try:
+            await self.dead_letters.put(self.broker.formatter.dumps(message), error)
+        except Exception as exc:
+            logger.exception("Задача #%s не отправлена в DLQ: %s", message.task_id, exc)
+        else:
+            self.stats.dead_lettered += 1
@@ -0,0 +1,67 @@
+"""
+Область запроса: карта идентичности сущностей и счётчик SQL-запросов
+
+Репозитории сначала ищут сущность в карте текущего запроса и кладут туда
+загруженные и изменённые сущности - каждая загружается из БД не больше одного раза
+за запрос. Вне области (задачи, CLI) карты нет и репозитории всегда идут в БД
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional
+
+
+class IdentityMap:
+    """Сущности, загруженные за время запроса, по типу и id"""
+
+    def __init__(self):
+        self._entities: dict[tuple[type, str], Any] = {}
+
+    def get[T](self, kind: type[T], entity_id: str) -> Optional[T]:
+        return self._entities.get((kind, entity_id))
+
+    def add(self, kind: type, entity_id: str, entity: Any) -> None:
+        self._entities[(kind, entity_id)] = entity
+
+    def discard(self, kind: type, entity_id: str) -> None:
+        self._entities.pop((kind, entity_id), None)
+
+
+@dataclass
+class RequestScope:
+    identity_map: IdentityMap = field(default_factory=IdentityMap)
+    queries: int = 0
+
+
+_request_scope: ContextVar[Optional[RequestScope]] = ContextVar(
+    "request_scope", default=None
+)
+
+
+@contextmanager
+def request_scope() -> Iterator[RequestScope]:
+    scope = RequestScope()
+    token = _request_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _request_scope.reset(token)
+
+
+def current_identity_map() -> Optional[IdentityMap]:
+    scope = _request_scope.get()
+    return scope.identity_map if scope else None
+
+
+# Управление транзакцией (точки сохранения, BEGIN в SQLite) запросами не считается
+TRANSACTION_STATEMENTS = ("BEGIN", "SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO")
+
+
+def count_query(_conn, _cursor, statement: str, *_) -> None:
+    """Обработчик before_cursor_execute: считает запросы текущего запроса"""
+
+    if statement.startswith(TRANSACTION_STATEMENTS):
+        return
+    if scope := _request_scope.get():
+        scope.queries += 1
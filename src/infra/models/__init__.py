@@ -4,12 +4,18 @@ __all__ = (
     "AccountCurrency",
     "UserModel",
     "HistoryModel",
+    "HistoryCompactionModel",
     "GoalStatus",
     "GoalModel",
+    "HistoryRollupMixin",
+    "ROLLUP_MODELS",
+    "OutboxModel",
 )
 
 from .accounts import AccountModel, AccountCurrency
 from .base import Base
 from .goals import GoalStatus, GoalModel
-from .histories import HistoryModel
+from .histories import HistoryModel, HistoryCompactionModel
+from .outbox import OutboxModel
+from .rollups import HistoryRollupMixin, ROLLUP_MODELS
 from .users import UserModel
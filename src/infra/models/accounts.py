@@ -32,6 +32,8 @@ class AccountModel(Base, TimeStampMixin):
     type: Mapped[AccountType]
     balance: Mapped[float]
     currency: Mapped[AccountCurrency]
+    # Версия строки для оптимистичной блокировки при обновлении баланса
+    version: Mapped[int] = mapped_column(default=1, server_default="1")
 
     # Отношения
     user: Mapped["UserModel"] = relationship(
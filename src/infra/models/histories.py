@@ -1,4 +1,18 @@
-from sqlalchemy import ForeignKey, CheckConstraint
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import (
+    ForeignKey,
+    CheckConstraint,
+    PrimaryKeyConstraint,
+    UniqueConstraint,
+    Index,
+    DDL,
+    DateTime,
+    event,
+    func,
+    String,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .accounts import AccountModel
@@ -7,8 +21,21 @@ from .mixin import CreatedAtMixin
 
 
 class HistoryModel(Base, CreatedAtMixin):
+    """
+    История счёта
+
+    В Postgres таблица секционирована по месяцам created_at, поэтому created_at
+    входит в первичный ключ. Секции создаются периодической задачей
+    """
+
     __tablename__ = "accounts_history"
-    __table_args__ = (CheckConstraint("balance >= 0", name="history_balance_gt_0"),)
+    __table_args__ = (
+        CheckConstraint("balance >= 0", name="history_balance_gt_0"),
+        PrimaryKeyConstraint("id", "created_at", name="accounts_history_pkey"),
+        # Одна запись на событие; created_at - ключ секционирования, входит в ключ
+        UniqueConstraint("event_id", "created_at", name="uq_accounts_history_event"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
     account_id: Mapped[str] = mapped_column(
         ForeignKey("accounts.id", name="fk_savings_acc_id", ondelete="CASCADE")
@@ -16,6 +43,55 @@ class HistoryModel(Base, CreatedAtMixin):
     balance: Mapped[float]
     delta: Mapped[float]
     is_monthly_closing: Mapped[bool] = mapped_column(default=False)
+    # id события-источника: повтор доставки не создаёт вторую запись
+    event_id: Mapped[Optional[str]]
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        primary_key=True,
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
+    )
 
     # Отношения
     account: Mapped["AccountModel"] = relationship(back_populates="histories")
+
+
+# Все выборки истории ограничены одним счётом и диапазоном дат,
+# id - для keyset-пагинации по (created_at, id)
+Index(
+    "ix_accounts_history_acc_id_created_at_id",
+    HistoryModel.account_id,
+    HistoryModel.created_at.desc(),
+    HistoryModel.id.desc(),
+)
+
+# Записи вне созданных месячных секций попадают в секцию по умолчанию
+event.listen(
+    HistoryModel.__table__,
+    "after_create",
+    DDL(
+        "CREATE TABLE IF NOT EXISTS accounts_history_default "
+        "PARTITION OF accounts_history DEFAULT"
+    ).execute_if(dialect="postgresql"),
+)
+
+
+class HistoryCompactionModel(Base):
+    """Водяной знак прореживания: записи счёта до compacted_until уже свёрнуты до периода"""
+
+    __tablename__ = "accounts_history_compaction"
+    __table_args__ = (
+        UniqueConstraint(
+            "account_id", "period", name="uc_accounts_history_compaction_acc_id_period"
+        ),
+    )
+
+    account_id: Mapped[str] = mapped_column(
+        ForeignKey(
+            "accounts.id",
+            name="fk_accounts_history_compaction_acc_id",
+            ondelete="CASCADE",
+        )
+    )
+    period: Mapped[str] = mapped_column(String(16))
+    compacted_until: Mapped[datetime] = mapped_column(DateTime(timezone=True))
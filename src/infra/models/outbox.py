@@ -0,0 +1,27 @@
+from typing import Any, Optional
+
+from sqlalchemy import JSON, Index, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+from .mixin import CreatedAtMixin
+
+
+class OutboxModel(Base, CreatedAtMixin):
+    """
+    Исходящие доменные события
+
+    Пишутся в одной транзакции с изменением, которое их породило, и отправляются
+    обработчикам фоновым ретранслятором. Отправленные события удаляются
+    """
+
+    __tablename__ = "outbox"
+
+    event_type: Mapped[str] = mapped_column(String(64))
+    payload: Mapped[dict[str, Any]] = mapped_column(JSON)
+    attempts: Mapped[int] = mapped_column(default=0, server_default="0")
+    last_error: Mapped[Optional[str]]
+
+
+# Ретранслятор выбирает события по порядку создания
+Index("ix_outbox_created_at", OutboxModel.created_at)
@@ -0,0 +1,74 @@
+from datetime import datetime
+
+from sqlalchemy import ForeignKey, UniqueConstraint, DateTime
+from sqlalchemy.orm import Mapped, mapped_column, declared_attr
+
+from domain.histories.values import HistoryPeriod
+from .base import Base
+
+
+class HistoryRollupMixin:
+    """
+    Агрегат истории счёта за период (одна строка на счёт и период)
+
+    - balance: баланс последней записи периода
+    - delta: сумма изменений за период
+    - is_monthly_closing: в периоде было закрытие месяца
+    - last_created_at: дата последней записи периода
+    """
+
+    bucket: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    balance: Mapped[float]
+    delta: Mapped[float] = mapped_column(default=0)
+    is_monthly_closing: Mapped[bool] = mapped_column(default=False)
+    last_created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+    @declared_attr
+    def account_id(cls) -> Mapped[str]:
+        return mapped_column(
+            ForeignKey(
+                "accounts.id", name=f"fk_{cls.__tablename__}_acc_id", ondelete="CASCADE"
+            )
+        )
+
+    @declared_attr.directive
+    def __table_args__(cls) -> tuple:
+        return (
+            UniqueConstraint(
+                "account_id", "bucket", name=f"uc_{cls.__tablename__}_acc_id_bucket"
+            ),
+        )
+
+
+class HistoryMinutesRollupModel(Base, HistoryRollupMixin):
+    __tablename__ = "accounts_history_minutes"
+
+
+class HistoryHoursRollupModel(Base, HistoryRollupMixin):
+    __tablename__ = "accounts_history_hours"
+
+
+class HistoryDaysRollupModel(Base, HistoryRollupMixin):
+    __tablename__ = "accounts_history_days"
+
+
+class HistoryWeeksRollupModel(Base, HistoryRollupMixin):
+    __tablename__ = "accounts_history_weeks"
+
+
+class HistoryMonthsRollupModel(Base, HistoryRollupMixin):
+    __tablename__ = "accounts_history_months"
+
+
+class HistoryYearsRollupModel(Base, HistoryRollupMixin):
+    __tablename__ = "accounts_history_years"
+
+
+ROLLUP_MODELS: dict[HistoryPeriod, type[HistoryRollupMixin]] = {
+    HistoryPeriod.MINUTES: HistoryMinutesRollupModel,
+    HistoryPeriod.HOURS: HistoryHoursRollupModel,
+    HistoryPeriod.DAYS: HistoryDaysRollupModel,
+    HistoryPeriod.WEEKS: HistoryWeeksRollupModel,
+    HistoryPeriod.MONTHS: HistoryMonthsRollupModel,
+    HistoryPeriod.YEARS: HistoryYearsRollupModel,
+}
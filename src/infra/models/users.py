@@ -1,6 +1,7 @@
 from typing import TYPE_CHECKING
 
-from sqlalchemy.orm import Mapped, relationship
+from sqlalchemy import CheckConstraint
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 if TYPE_CHECKING:
     from . import AccountModel, GoalModel
@@ -11,8 +12,13 @@ from .mixin import CreatedAtMixin
 
 class UserModel(Base, CreatedAtMixin):
     __tablename__ = "users"
+    __table_args__ = (
+        CheckConstraint("accounts_count >= 0", name="user_accounts_count_gt_0"),
+    )
 
     name: Mapped[str]
+    # Число счетов пользователя: лимит проверяется и занимается одним UPDATE
+    accounts_count: Mapped[int] = mapped_column(default=0, server_default="0")
 
     accounts: Mapped[list["AccountModel"]] = relationship(
         back_populates="user",
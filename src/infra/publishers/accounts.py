@@ -1,19 +1,27 @@
-import asyncio
 import logging
 from typing import Annotated, Callable
 
 from fastapi import Depends
-from taskiq import AsyncTaskiqTask
+from taskiq import AsyncTaskiqDecoratedTask
 
 from core.domain import DomainEvent
+from core.settings import settings
 from domain.accounts.events import AccountCreatedEvent, BalanceUpdatedEvent
 from domain.accounts.protocols import AccountEventPublisherProtocol
-from infra.tasks.accounts import save_account_history
+from infra.cache.histories import HistoryCacheDep
+from infra.database import SessionDep
+from infra.delivery import is_fire_and_forget
+from infra.publishers.histories import InProcessHistoryPublisher
+from infra.publishers.outbox import OutboxPublisher
+from infra.repositories.outbox import OutboxRepositoryDep
+from infra.tasks.accounts import save_account_history, save_accounts_history
+from infra.tracker import task_tracker
 
 logger = logging.getLogger(__name__)
 
 
 class AccountTaskiqPublisher:
+    """Отправка событий счетов в брокер: используется ретранслятором outbox"""
 
     def __init__(self):
         self.handlers: dict[type[DomainEvent], list[Callable]] = {
@@ -26,32 +34,39 @@ class AccountTaskiqPublisher:
             await handler(event)
         return
 
+    async def publish_many(self, events: list[DomainEvent]) -> None:
+        """Публикует события счетов одной задачей сохранения истории"""
+
+        if not events:
+            return
+
+        await self._send(save_accounts_history, events)
+        return
+
     async def _handle_account_update_history(
         self, event: AccountCreatedEvent | BalanceUpdatedEvent
     ) -> None:
         logger.info(event)
-        task: AsyncTaskiqTask = await save_account_history.kiq(event)
-        asyncio.create_task(self.track_tasks([task]))
+        await self._send(save_account_history, event)
         return
 
     @staticmethod
-    async def track_tasks(tasks: list[AsyncTaskiqTask]) -> None:
-        """Фоновая задача для отслеживания результатов"""
-
-        for task in tasks:
-            try:
-                result = await task.wait_result(timeout=300)
-                logger.info(f"Задача #{task.task_id} выполнена: {result.return_value}")
-
-            except asyncio.TimeoutError:
-                logger.warning(f"Задача #{task.task_id} не завершилась за 300 секунд")
-
-            except Exception as e:
-                logger.error(f"Ошибка в задаче #{task.task_id}: {e}")
-
-
-def get_account_event_publisher() -> AccountEventPublisherProtocol:
-    return AccountTaskiqPublisher()
+    async def _send(task: AsyncTaskiqDecoratedTask, *args) -> None:
+        """Результат задач «выполнить и забыть» не отслеживается"""
+
+        sent = await task.kiq(*args)
+        if not is_fire_and_forget(task):
+            task_tracker.track(sent)
+
+
+def get_account_event_publisher(
+    outbox_repo: OutboxRepositoryDep,
+    session: SessionDep,
+    history_cache: HistoryCacheDep,
+) -> AccountEventPublisherProtocol:
+    if settings.history_writer.mode == "in_process":
+        return InProcessHistoryPublisher(session, history_cache)
+    return OutboxPublisher(outbox_repo)
 
 
 AccountEventPublisherDep = Annotated[
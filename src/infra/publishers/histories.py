@@ -0,0 +1,56 @@
+import logging
+from functools import partial
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.domain import DomainEvent
+from domain.accounts.events import AccountCreatedEvent, BalanceUpdatedEvent
+from domain.histories.cache import HistoryCacheProtocol
+from domain.histories.service import HistoryService
+from infra.repositories.histories import SQLAlchemyHistoryRepository
+from infra.tasks.accounts import to_save_history_command
+from infra.uow import after_commit
+
+logger = logging.getLogger(__name__)
+
+HISTORY_EVENTS = (AccountCreatedEvent, BalanceUpdatedEvent)
+
+
+class InProcessHistoryPublisher:
+    """
+    Запись истории счетов в процессе приложения, без брокера (один узел)
+
+    История и её агрегаты пишутся в сессии изменения счёта и фиксируются с ним
+    одной транзакцией: график истории сразу видит новый баланс.
+    Кэш ответов по истории сбрасывается после фиксации
+    """
+
+    def __init__(
+        self,
+        session: AsyncSession,
+        history_cache: Optional[HistoryCacheProtocol] = None,
+    ):
+        self._session = session
+        # Без кэша: сервис сбросил бы его до фиксации транзакции
+        self._history = HistoryService(SQLAlchemyHistoryRepository(session))
+        self._cache = history_cache
+
+    async def publish(self, event: DomainEvent) -> None:
+        await self.publish_many([event])
+
+    async def publish_many(self, events: list[DomainEvent]) -> None:
+        events = [event for event in events if isinstance(event, HISTORY_EVENTS)]
+        if not events:
+            return
+
+        await self._history.save_accounts_history(
+            [to_save_history_command(event) for event in events]
+        )
+        if self._cache:
+            account_ids = {event.account_id for event in events}
+            await after_commit(self._session, partial(self._invalidate, account_ids))
+
+    async def _invalidate(self, account_ids: set[str]) -> None:
+        for account_id in account_ids:
+            await self._cache.bump_version(account_id)
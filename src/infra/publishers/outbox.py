@@ -0,0 +1,97 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from core.domain import DomainEvent
+from core.settings import settings
+from infra.repositories.outbox import SQLAlchemyOutboxRepository
+
+logger = logging.getLogger(__name__)
+
+OutboxHandler = Callable[[list[DomainEvent]], Awaitable[None]]
+
+
+class OutboxPublisher:
+    """
+    Публикация событий через outbox
+
+    События только добавляются в сессию изменения и фиксируются вместе с ним,
+    брокер в запросе не участвует
+    """
+
+    def __init__(self, outbox_repo: SQLAlchemyOutboxRepository):
+        self._outbox = outbox_repo
+
+    async def publish(self, event: DomainEvent) -> None:
+        await self._outbox.add([event])
+
+    async def publish_many(self, events: list[DomainEvent]) -> None:
+        await self._outbox.add(events)
+
+
+class OutboxRelay:
+    """
+    Ретранслятор outbox: пачками передаёт события обработчику и удаляет отправленные
+
+    Доставка - не менее одного раза: пачка удаляется после успешной обработки
+    в той же транзакции, что и выборка. При ошибке у событий растёт счётчик попыток,
+    события исчерпавшие max_attempts остаются в таблице для разбора
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        handler: OutboxHandler,
+        batch_size: int = settings.outbox.batch_size,
+        poll_interval: float = settings.outbox.poll_interval,
+        max_attempts: int = settings.outbox.max_attempts,
+    ):
+        self._session_factory = session_factory
+        self._handler = handler
+        self._batch_size = batch_size
+        self._poll_interval = poll_interval
+        self._max_attempts = max_attempts
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def relay_once(self) -> int:
+        """Отправляет одну пачку, возвращает число отправленных событий"""
+
+        async with self._session_factory() as session:
+            outbox = SQLAlchemyOutboxRepository(session)
+            batch = await outbox.fetch(self._batch_size, self._max_attempts)
+            if not batch:
+                return 0
+
+            ids = [event_id for event_id, _ in batch]
+            try:
+                await self._handler([event for _, event in batch])
+            except Exception as exc:
+                logger.error("Ошибка отправки %s событий outbox: %s", len(ids), exc)
+                await outbox.record_failure(ids, error=str(exc))
+                await session.commit()
+                raise
+
+            await outbox.delete(ids)
+            await session.commit()
+            return len(ids)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                # Полная пачка - в outbox, скорее всего, есть ещё события
+                if await self.relay_once() == self._batch_size:
+                    continue
+            except Exception as exc:
+                logger.warning("Ретранслятор outbox: %s", exc)
+            await asyncio.sleep(self._poll_interval)
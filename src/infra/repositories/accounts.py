@@ -1,41 +1,205 @@
+import logging
+from datetime import datetime, timezone
+from decimal import Decimal
 from typing import Optional, Annotated, Any
 
 from fastapi import Depends
-from sqlalchemy import select, func, update, delete
+from sqlalchemy import (
+    select,
+    func,
+    update,
+    delete,
+    insert,
+    literal,
+    case,
+    column,
+    values,
+    Float,
+    Insert,
+    String,
+    Update,
+)
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
+from domain.accounts.dto import AccountDTO
 from domain.accounts.entity import Account
+from domain.accounts.exceptions import (
+    AccountBalanceConflictException,
+    AccountAlreadyCreatedException,
+)
 from domain.accounts.protocols import AccountRepositoryProtocol
 from infra import SessionDep
-from infra.models import AccountModel
+from infra.identity import current_identity_map
+from infra.uow import commit_or_flush
+from infra.models import AccountModel, UserModel
 from .dto.accounts import AccountOrmDTO
 
+logger = logging.getLogger(__name__)
+
+# Попытки обновить баланс при конкурентных изменениях счёта
+BALANCE_UPDATE_ATTEMPTS = 5
+
 
 class SQLAlchemyAccountRepository:
 
     def __init__(self, session: AsyncSession):
         self._session = session
 
+    @property
+    def _dialect(self) -> str:
+        return self._session.bind.dialect.name
+
+    @staticmethod
+    def _remember(account: Account) -> Account:
+        """Кладёт счёт в карту идентичности запроса"""
+
+        if identity_map := current_identity_map():
+            identity_map.add(Account, account.id.as_generic_type(), account)
+        return account
+
     async def save(self, account: Account) -> str:
         acc: AccountModel = AccountOrmDTO.from_entity_to_orm(account)
         self._session.add(acc)
-        await self._session.commit()
+        await self._session.execute(
+            update(UserModel)
+            .filter_by(id=acc.user_id)
+            .values(accounts_count=UserModel.accounts_count + 1)
+        )
+        await commit_or_flush(self._session)
+        self._remember(account)
         return acc.id
 
+    async def create(self, account: Account, max_accounts: int) -> bool:
+        """
+        Сохраняет счёт, если у пользователя меньше max_accounts счетов (False - лимит)
+
+        Postgres: один запрос - UPDATE счётчика users.accounts_count с условием на лимит
+        в CTE и INSERT счёта из его результата. Занятое название счёта отсекает
+        уникальный индекс uc_user_id_with_name - AccountAlreadyCreatedException
+        """
+
+        try:
+            if self._dialect == "postgresql":
+                created = await self._session.scalar(
+                    self.create_statement(account, max_accounts)
+                )
+            else:
+                created = await self._create_in_transaction(account, max_accounts)
+        except IntegrityError as exc:
+            await self._session.rollback()
+            if self._is_name_taken_violation(exc):
+                raise AccountAlreadyCreatedException from exc
+            raise
+
+        if not created:
+            await self._session.rollback()
+            return False
+
+        await commit_or_flush(self._session)
+        self._remember(account)
+        return True
+
+    @staticmethod
+    def create_statement(account: Account, max_accounts: int) -> Insert:
+        data = AccountDTO.from_entity_to_dict(account)
+        slot = (
+            update(UserModel)
+            .where(
+                UserModel.id == data["user_id"],
+                UserModel.accounts_count < max_accounts,
+            )
+            .values(accounts_count=UserModel.accounts_count + 1)
+            .returning(UserModel.id)
+            .cte("slot")
+        )
+        columns = AccountModel.__table__.c
+        return (
+            insert(AccountModel)
+            .from_select(
+                list(data),
+                select(
+                    *(
+                        (
+                            slot.c.id
+                            if name == "user_id"
+                            else literal(value, columns[name].type)
+                        )
+                        for name, value in data.items()
+                    )
+                ),
+            )
+            .add_cte(slot)
+            .returning(AccountModel.id)
+        )
+
+    async def _create_in_transaction(
+        self, account: Account, max_accounts: int
+    ) -> Optional[str]:
+        """Для SQLite (нет изменяющих CTE): те же UPDATE счётчика и INSERT в одной транзакции"""
+
+        data = AccountDTO.from_entity_to_dict(account)
+        if not await self._session.scalar(
+            update(UserModel)
+            .where(
+                UserModel.id == data["user_id"],
+                UserModel.accounts_count < max_accounts,
+            )
+            .values(accounts_count=UserModel.accounts_count + 1)
+            .returning(UserModel.id)
+        ):
+            return None
+
+        return await self._session.scalar(
+            insert(AccountModel).values(**data).returning(AccountModel.id)
+        )
+
+    @staticmethod
+    def _is_name_taken_violation(exc: IntegrityError) -> bool:
+        message = str(exc.orig)
+        # Postgres называет ограничение, SQLite - его столбцы
+        return (
+            "uc_user_id_with_name" in message
+            or "accounts.user_id, accounts.name" in message
+        )
+
     async def get_by_id(self, user_id: str, account_id: str) -> Optional[Account]:
+        identity_map = current_identity_map()
+        if identity_map and (account := identity_map.get(Account, account_id)):
+            return account if account.user_id.as_generic_type() == user_id else None
+
         query = select(AccountModel).filter_by(id=account_id, user_id=user_id)
         account = await self._session.scalar(query)
-        return AccountOrmDTO.from_orm_to_entity(account) if account else None
+        return (
+            self._remember(AccountOrmDTO.from_orm_to_entity(account))
+            if account
+            else None
+        )
 
     async def get_by_user_id(self, user_id: str) -> list[Account]:
         query = select(AccountModel).filter_by(user_id=user_id)
         accounts = await self._session.scalars(query)
-        return [AccountOrmDTO.from_orm_to_entity(account) for account in accounts.all()]
+        return [
+            self._remember(AccountOrmDTO.from_orm_to_entity(account))
+            for account in accounts.all()
+        ]
 
     async def delete(self, user_id: str, account_id: str) -> None:
-        stmt = delete(AccountModel).filter_by(id=account_id, user_id=user_id)
-        await self._session.execute(stmt)
-        await self._session.commit()
+        stmt = (
+            delete(AccountModel)
+            .filter_by(id=account_id, user_id=user_id)
+            .returning(AccountModel.id)
+        )
+        if await self._session.scalar(stmt):
+            await self._session.execute(
+                update(UserModel)
+                .filter_by(id=user_id)
+                .values(accounts_count=UserModel.accounts_count - 1)
+            )
+        await commit_or_flush(self._session)
+        if identity_map := current_identity_map():
+            identity_map.discard(Account, account_id)
         return
 
     async def count_by_user_id(self, user_id: str) -> int:
@@ -64,9 +228,226 @@ class SQLAlchemyAccountRepository:
             .returning(AccountModel)
         )
         res = await self._session.execute(stmt)
-        await self._session.commit()
+        await commit_or_flush(self._session)
         return res.scalar_one_or_none()
 
+    async def update_balance(
+        self, user_id: str, account_id: str, new_balance: Decimal
+    ) -> Optional[tuple[Account, Decimal]]:
+        """
+        Обновление баланса с оптимистичной блокировкой по version
+
+        Postgres: один UPDATE ... FROM (прежняя строка) ... RETURNING прежнего баланса.
+        Если строку успели изменить, условие на version не выполнится - попытка повторяется.
+        Каждая попытка - точка сохранения (SAVEPOINT): транзакцией владеет вызывающий.
+        Неизменный баланс не перезаписывается (не меняются version и updated_at)
+        """
+
+        update_once = (
+            self._update_balance_returning
+            if self._dialect == "postgresql"
+            else self._update_balance_guarded
+        )
+
+        for _ in range(BALANCE_UPDATE_ATTEMPTS):
+            async with self._session.begin_nested():
+                result = await update_once(user_id, account_id, new_balance)
+
+            if not result:
+                current = await self._session.scalar(
+                    select(AccountModel)
+                    .filter_by(id=account_id, user_id=user_id)
+                    .execution_options(populate_existing=True)
+                )
+                if current is None:
+                    return None
+                if Decimal(str(current.balance)) != new_balance:
+                    logger.info("Конфликт версий счёта #%s, повтор", account_id[:8])
+                    continue
+                result = current, current.balance
+
+            await commit_or_flush(self._session)
+            account, old_balance = result
+            return self._remember(AccountOrmDTO.from_orm_to_entity(account)), Decimal(
+                str(old_balance)
+            )
+
+        raise AccountBalanceConflictException
+
+    @staticmethod
+    def update_balance_statement(
+        user_id: str, account_id: str, new_balance: Decimal
+    ) -> Update:
+        account = aliased(AccountModel)
+        previous = (
+            select(account.balance, account.version)
+            .filter_by(id=account_id, user_id=user_id)
+            .subquery("previous")
+        )
+        return (
+            update(AccountModel)
+            .where(
+                AccountModel.id == account_id,
+                AccountModel.user_id == user_id,
+                AccountModel.version == previous.c.version,
+                AccountModel.balance.is_distinct_from(new_balance),
+            )
+            .values(
+                balance=new_balance,
+                version=AccountModel.version + 1,
+                updated_at=datetime.now(timezone.utc),
+            )
+            .returning(AccountModel, previous.c.balance)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+
+    async def _update_balance_returning(
+        self, user_id: str, account_id: str, new_balance: Decimal
+    ) -> Optional[tuple[AccountModel, float]]:
+        res = await self._session.execute(
+            self.update_balance_statement(user_id, account_id, new_balance)
+        )
+        return res.one_or_none()
+
+    async def _update_balance_guarded(
+        self, user_id: str, account_id: str, new_balance: Decimal
+    ) -> Optional[tuple[AccountModel, float]]:
+        """Для SQLite: RETURNING не видит таблиц из FROM - чтение и UPDATE по версии"""
+
+        previous = (
+            await self._session.execute(
+                select(AccountModel.balance, AccountModel.version).filter_by(
+                    id=account_id, user_id=user_id
+                )
+            )
+        ).one_or_none()
+        if not previous:
+            return None
+
+        account = await self._session.scalar(
+            update(AccountModel)
+            .filter_by(id=account_id, user_id=user_id, version=previous.version)
+            .where(AccountModel.balance.is_distinct_from(new_balance))
+            .values(
+                balance=new_balance,
+                version=AccountModel.version + 1,
+                updated_at=datetime.now(timezone.utc),
+            )
+            .returning(AccountModel)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+        return (account, previous.balance) if account else None
+
+    async def update_balances(
+        self, user_id: str, balances: dict[str, Decimal]
+    ) -> Optional[list[tuple[Account, Decimal]]]:
+        """
+        Балансы нескольких счетов одним UPDATE в одной транзакции
+
+        Postgres: UPDATE ... FROM (VALUES ...) с прежними строками ... RETURNING, как и
+        для одного счёта. Если хотя бы одна строка не обновилась из-за версии - откат
+        и повтор всего пакета
+        """
+
+        update_once = (
+            self._update_balances_returning
+            if self._dialect == "postgresql"
+            else self._update_balances_guarded
+        )
+
+        for _ in range(BALANCE_UPDATE_ATTEMPTS):
+            rows = await update_once(user_id, balances)
+            if len(rows) == len(balances):
+                await commit_or_flush(self._session)
+                by_id = {
+                    account.id: (
+                        self._remember(AccountOrmDTO.from_orm_to_entity(account)),
+                        Decimal(str(old_balance)),
+                    )
+                    for account, old_balance in rows
+                }
+                return [by_id[account_id] for account_id in balances]
+
+            await self._session.rollback()
+            existing = await self._session.scalar(
+                select(func.count())
+                .select_from(AccountModel)
+                .where(AccountModel.id.in_(balances), AccountModel.user_id == user_id)
+            )
+            if existing < len(balances):
+                return None
+            logger.info("Конфликт версий счетов пользователя #%s, повтор", user_id[:8])
+
+        raise AccountBalanceConflictException
+
+    @staticmethod
+    def update_balances_statement(user_id: str, balances: dict[str, Decimal]) -> Update:
+        new = values(column("id", String), column("balance", Float), name="new").data(
+            list(balances.items())
+        )
+        previous = aliased(AccountModel, name="previous")
+        return (
+            update(AccountModel)
+            .where(
+                AccountModel.id == new.c.id,
+                AccountModel.user_id == user_id,
+                previous.id == new.c.id,
+                AccountModel.version == previous.version,
+            )
+            .values(
+                balance=new.c.balance,
+                version=AccountModel.version + 1,
+                updated_at=datetime.now(timezone.utc),
+            )
+            .returning(AccountModel, previous.balance)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+
+    async def _update_balances_returning(
+        self, user_id: str, balances: dict[str, Decimal]
+    ) -> list[tuple[AccountModel, float]]:
+        res = await self._session.execute(
+            self.update_balances_statement(user_id, balances)
+        )
+        return list(res.tuples())
+
+    async def _update_balances_guarded(
+        self, user_id: str, balances: dict[str, Decimal]
+    ) -> list[tuple[AccountModel, float]]:
+        """Для SQLite: чтение прежних строк и один UPDATE с CASE по id и версии"""
+
+        previous = {
+            row.id: row
+            for row in await self._session.execute(
+                select(
+                    AccountModel.id, AccountModel.balance, AccountModel.version
+                ).where(AccountModel.id.in_(balances), AccountModel.user_id == user_id)
+            )
+        }
+        if len(previous) < len(balances):
+            return []
+
+        accounts = await self._session.scalars(
+            update(AccountModel)
+            .where(
+                AccountModel.id.in_(balances),
+                AccountModel.user_id == user_id,
+                AccountModel.version
+                == case(
+                    {id_: row.version for id_, row in previous.items()},
+                    value=AccountModel.id,
+                ),
+            )
+            .values(
+                balance=case(balances, value=AccountModel.id),
+                version=AccountModel.version + 1,
+                updated_at=datetime.now(timezone.utc),
+            )
+            .returning(AccountModel)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+        return [(account, previous[account.id].balance) for account in accounts.all()]
+
 
 def get_account_repository(session: SessionDep) -> AccountRepositoryProtocol:
     return SQLAlchemyAccountRepository(session)
@@ -3,7 +3,7 @@ from domain.histories.dto import HistoryDTO
 from domain.histories.entities import History
 from domain.histories.values import HistoryId
 from domain.values import Money
-from infra.models import HistoryModel
+from infra.models import HistoryModel, HistoryRollupMixin
 from infra.repositories.dto.base import BaseOrmDTO
 
 
@@ -17,9 +17,23 @@ class HistoryOrmDTO(BaseOrmDTO, HistoryDTO):
             delta=float(model.delta),
             balance=Money(model.balance),
             is_monthly_closing=model.is_monthly_closing,
+            event_id=model.event_id,
             created_at=HistoryOrmDTO._ensure_utc(model.created_at),
         )
 
     @staticmethod
     def from_entity_to_orm(entity: History) -> HistoryModel:
-        return HistoryModel(**HistoryDTO.from_entity_to_dict(entity))
+        return HistoryModel(
+            **HistoryDTO.from_entity_to_dict(entity), event_id=entity.event_id
+        )
+
+    @staticmethod
+    def from_rollup_to_entity(model: HistoryRollupMixin) -> History:
+        return History(
+            id=HistoryId(model.id),
+            account_id=AccountId(model.account_id),
+            delta=float(model.delta),
+            balance=Money(model.balance),
+            is_monthly_closing=model.is_monthly_closing,
+            created_at=HistoryOrmDTO._ensure_utc(model.last_created_at),
+        )
@@ -0,0 +1,68 @@
+from sqlalchemy import DateTime, Float
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.sql.visitors import InternalTraversal
+
+from domain.histories.values import HistoryPeriod
+
+SQLITE_TRUNC_FORMATS: dict[HistoryPeriod, tuple[str, ...]] = {
+    HistoryPeriod.MINUTES: ("%Y-%m-%d %H:%M:00",),
+    HistoryPeriod.HOURS: ("%Y-%m-%d %H:00:00",),
+    HistoryPeriod.DAYS: ("%Y-%m-%d 00:00:00",),
+    HistoryPeriod.WEEKS: ("%Y-%m-%d 00:00:00", "-6 days", "weekday 1"),
+    HistoryPeriod.MONTHS: ("%Y-%m-01 00:00:00",),
+    HistoryPeriod.YEARS: ("%Y-01-01 00:00:00",),
+}
+
+
+class date_trunc(FunctionElement):
+    """
+    date_trunc(period, column) для Postgres и его аналог через strftime для SQLite
+
+    Период подставляется литералом, чтобы одно и то же выражение совпадало
+    в DISTINCT ON, PARTITION BY и ORDER BY
+    """
+
+    type = DateTime(timezone=True)
+    inherit_cache = True
+    _traverse_internals = FunctionElement._traverse_internals + [
+        ("period", InternalTraversal.dp_string)
+    ]
+
+    def __init__(self, period: HistoryPeriod | str, column):
+        self.period = HistoryPeriod(period)
+        super().__init__(column)
+
+
+@compiles(date_trunc)
+def _compile_date_trunc(element: date_trunc, compiler, **kw) -> str:
+    return "date_trunc('%s', %s)" % (
+        element.period.value,
+        compiler.process(element.clauses, **kw),
+    )
+
+
+@compiles(date_trunc, "sqlite")
+def _compile_date_trunc_sqlite(element: date_trunc, compiler, **kw) -> str:
+    fmt, *modifiers = SQLITE_TRUNC_FORMATS[element.period]
+    return "strftime(%s)" % ", ".join(
+        [f"'{fmt}'", compiler.process(element.clauses, **kw)]
+        + [f"'{modifier}'" for modifier in modifiers]
+    )
+
+
+class epoch(FunctionElement):
+    """Дата в секундах unix-времени: extract(epoch) для Postgres, unixepoch для SQLite"""
+
+    type = Float()
+    inherit_cache = True
+
+
+@compiles(epoch)
+def _compile_epoch(element: epoch, compiler, **kw) -> str:
+    return "extract(epoch from %s)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(epoch, "sqlite")
+def _compile_epoch_sqlite(element: epoch, compiler, **kw) -> str:
+    return "unixepoch(%s)" % compiler.process(element.clauses, **kw)
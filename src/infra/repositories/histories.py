@@ -1,15 +1,56 @@
-from datetime import datetime
-from typing import Optional, Annotated, Any
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Optional, Annotated, Any, AsyncIterator, Sequence
 
+import numpy as np
+import orjson
 from fastapi import Depends
-from sqlalchemy import select, desc, func, update
+from sqlalchemy import (
+    select,
+    func,
+    update,
+    delete,
+    case,
+    or_,
+    insert,
+    tuple_,
+    Select,
+    Row,
+)
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
-from domain.histories.entities import History
+from domain.accounts.entity import Account
+from domain.histories.analytics import HistorySeries
+from domain.histories.dto import HistoryDTO
+from domain.histories.entities import History, HistorySummary
+from domain.histories.formats import HistoryRow
 from domain.histories.protocols import HistoryRepositoryProtocol
+from domain.histories.values import HistoryPeriod, HistoryCursor
+from domain.values import Money
 from infra.database import SessionDep
-from infra.models import HistoryModel
+from infra.identity import current_identity_map
+from infra.models import (
+    HistoryModel,
+    HistoryCompactionModel,
+    AccountModel,
+    ROLLUP_MODELS,
+)
 from infra.repositories.dto.histories import HistoryOrmDTO
+from infra.repositories.functions import date_trunc, epoch
+from infra.uow import commit_or_flush
+
+ROLLUP_BATCH_SIZE = 5000
+STREAM_BATCH_SIZE = 1000
+IMPORT_COLUMNS = (
+    "id",
+    "account_id",
+    "balance",
+    "delta",
+    "is_monthly_closing",
+    "created_at",
+)
 
 
 class SQLAlchemyHistoryRepository:
@@ -17,11 +58,79 @@ class SQLAlchemyHistoryRepository:
     def __init__(self, session: AsyncSession):
         self._session = session
 
+    @property
+    def _dialect(self) -> str:
+        return self._session.bind.dialect.name
+
     async def save(self, history: History) -> str:
-        history_model: HistoryModel = HistoryOrmDTO.from_entity_to_orm(history)
-        self._session.add(history_model)
-        await self._session.commit()
-        return history_model.id
+        (history_id,) = await self.save_many([history])
+        return history_id
+
+    async def save_many(self, histories: list[History]) -> list[str]:
+        """
+        Записи истории одной многострочной вставкой и агрегаты - по запросу на период
+
+        Запись события, которое уже записано (повтор доставки), не вставляется
+        и не меняет агрегаты: для неё возвращается id существующей записи
+        """
+
+        if not histories:
+            return []
+
+        # Один INSERT ... VALUES (...), (...) на пачку (insertmanyvalues)
+        dialect = postgresql if self._dialect == "postgresql" else sqlite
+        stmt = (
+            dialect.insert(HistoryModel)
+            .on_conflict_do_nothing(
+                index_elements=[HistoryModel.event_id, HistoryModel.created_at]
+            )
+            .returning(HistoryModel.id)
+        )
+        inserted = set(
+            await self._session.scalars(
+                stmt,
+                [
+                    HistoryDTO.from_entity_to_dict(history)
+                    | {"event_id": history.event_id}
+                    for history in histories
+                ],
+            )
+        )
+
+        new = [h for h in histories if h.id.as_generic_type() in inserted]
+        if new:
+            await self._upsert_rollups_many(new)
+        await commit_or_flush(self._session)
+
+        if len(new) == len(histories):
+            return [h.id.as_generic_type() for h in histories]
+        return await self._ids_by_event(histories, inserted)
+
+    async def _ids_by_event(
+        self, histories: list[History], inserted: set[str]
+    ) -> list[str]:
+        """id записей пачки: для повторов событий - id уже существующих записей"""
+
+        replayed = {
+            h.event_id for h in histories if h.id.as_generic_type() not in inserted
+        }
+        existing = dict(
+            (
+                await self._session.execute(
+                    select(HistoryModel.event_id, HistoryModel.id).where(
+                        HistoryModel.event_id.in_(replayed)
+                    )
+                )
+            ).all()
+        )
+        return [
+            (
+                h.id.as_generic_type()
+                if h.id.as_generic_type() in inserted
+                else existing[h.event_id]
+            )
+            for h in histories
+        ]
 
     async def get_by_id(self, history_id: str) -> Optional[History]:
         query = select(HistoryModel).filter_by(id=history_id)
@@ -38,6 +147,43 @@ class SQLAlchemyHistoryRepository:
         history = await self._session.scalar(query)
         return HistoryOrmDTO.from_orm_to_entity(history) if history else None
 
+    async def get_history_page(
+        self,
+        account_id: str,
+        limit: int,
+        cursor: Optional[HistoryCursor] = None,
+        is_monthly_closing: Optional[bool] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+    ) -> list[History]:
+        """
+        Страница сырой истории счёта от новых записей к старым
+
+        Keyset-пагинация по (created_at, id) без OFFSET: следующая страница начинается
+        строго после курсора и читается из индекса (account_id, created_at, id)
+        """
+
+        query = (
+            select(HistoryModel)
+            .filter_by(account_id=account_id)
+            .order_by(HistoryModel.created_at.desc(), HistoryModel.id.desc())
+            .limit(limit)
+        )
+        if cursor:
+            query = query.where(
+                tuple_(HistoryModel.created_at, HistoryModel.id)
+                < tuple_(cursor.created_at, cursor.id)
+            )
+        if is_monthly_closing is not None:
+            query = query.filter_by(is_monthly_closing=is_monthly_closing)
+        if date_from:
+            query = query.where(HistoryModel.created_at >= date_from)
+        if date_to:
+            query = query.where(HistoryModel.created_at < date_to)
+
+        res = await self._session.scalars(query)
+        return [HistoryOrmDTO.from_orm_to_entity(row) for row in res.all()]
+
     async def get_history_linked_to_period(
         self,
         account_id: str,
@@ -46,31 +192,508 @@ class SQLAlchemyHistoryRepository:
         limit: Optional[int] = None,
         asc: bool = True,
     ) -> list[History]:
+        """Последняя запись счёта в каждом периоде начиная с start_date"""
 
-        subq = (
-            select(
-                func.max(HistoryModel.created_at).label("last_date"),
-                func.date_trunc(period, HistoryModel.created_at).label("trunc_date"),
-            )
-            .group_by("trunc_date")
-            .order_by(desc("trunc_date"))
-            .subquery()
+        query = self._linked_to_period_query(
+            account_id=account_id, period=period, start_date=start_date
+        )
+        history = aliased(HistoryModel, query.subquery())
+
+        query = select(history).order_by(
+            history.created_at if asc else history.created_at.desc()
+        )
+        if limit:
+            query = query.limit(limit)
+
+        res = await self._session.scalars(query)
+        return [HistoryOrmDTO.from_orm_to_entity(row) for row in res.all()]
+
+    async def get_history_summary(
+        self, account_id: str, start_date: datetime
+    ) -> Optional[HistorySummary]:
+        """Первый/последний/мин/макс баланс и сумма изменений за один запрос"""
+
+        account_filter = (
+            HistoryModel.account_id == account_id,
+            HistoryModel.created_at >= start_date,
+        )
+        first_balance, last_balance = (
+            select(HistoryModel.balance)
+            .where(*account_filter)
+            .order_by(order)
+            .limit(1)
+            .scalar_subquery()
+            for order in (HistoryModel.created_at, HistoryModel.created_at.desc())
         )
+        query = select(
+            func.count(),
+            first_balance,
+            last_balance,
+            func.min(HistoryModel.balance),
+            func.max(HistoryModel.balance),
+            func.sum(case((HistoryModel.delta > 0, HistoryModel.delta), else_=0)),
+            func.sum(case((HistoryModel.delta < 0, HistoryModel.delta), else_=0)),
+        ).where(*account_filter)
 
+        count, first, last, min_, max_, incomes, expenses = (
+            await self._session.execute(query)
+        ).one()
+        if not count:
+            return None
+
+        return HistorySummary(
+            first_balance=Money(first),
+            last_balance=Money(last),
+            min_balance=Money(min_),
+            max_balance=Money(max_),
+            incomes=Decimal(str(incomes)).quantize(Decimal("1.00")),
+            expenses=Decimal(str(expenses)).quantize(Decimal("1.00")),
+        )
+
+    async def get_history_from_rollups(
+        self,
+        account_id: str,
+        period: str,
+        start_date: datetime,
+        limit: Optional[int] = None,
+        asc: bool = True,
+    ) -> list[History]:
+        """История счёта из агрегатов периода (одна запись на период)"""
+
+        model = ROLLUP_MODELS[HistoryPeriod(period)]
         query = (
-            select(HistoryModel)
+            select(model)
             .filter_by(account_id=account_id)
-            .join(subq, HistoryModel.created_at == subq.c.last_date)
-            .where(HistoryModel.created_at >= start_date)
-            .order_by(
-                HistoryModel.created_at.desc() if not asc else HistoryModel.created_at
+            .where(
+                model.bucket >= HistoryPeriod(period).truncate(start_date),
+                model.last_created_at >= start_date,
             )
+            .order_by(model.bucket if asc else model.bucket.desc())
         )
         if limit:
             query = query.limit(limit)
 
-        res = await self._session.execute(query)
-        return [HistoryOrmDTO.from_orm_to_entity(row) for row in res.scalars().all()]
+        res = await self._session.scalars(query)
+        return [HistoryOrmDTO.from_rollup_to_entity(row) for row in res.all()]
+
+    async def get_accounts_history_from_rollups(
+        self,
+        user_id: str,
+        period: str,
+        start_date: datetime,
+        account_ids: Optional[list[str]] = None,
+    ) -> dict[str, list[History]]:
+        """
+        История нескольких счетов пользователя из агрегатов периода одним запросом
+
+        По каждому счёту из account_ids (или по всем счетам пользователя) база читает
+        свой диапазон индекса (account_id, bucket). Чужие счета отбрасываются
+        """
+
+        model = ROLLUP_MODELS[HistoryPeriod(period)]
+        query = (
+            select(model)
+            .join(AccountModel, AccountModel.id == model.account_id)
+            .where(
+                AccountModel.user_id == user_id,
+                model.bucket >= HistoryPeriod(period).truncate(start_date),
+                model.last_created_at >= start_date,
+            )
+            .order_by(model.account_id, model.bucket)
+        )
+        if account_ids:
+            query = query.where(model.account_id.in_(account_ids))
+
+        histories: dict[str, list[History]] = {}
+        for row in await self._session.scalars(query):
+            histories.setdefault(row.account_id, []).append(
+                HistoryOrmDTO.from_rollup_to_entity(row)
+            )
+        return histories
+
+    async def get_history_series(
+        self, account_id: str, period: str, start_date: datetime
+    ) -> Optional[HistorySeries]:
+        """
+        Ряд истории счёта из агрегатов периода в массивах NumPy
+
+        Значения собираются в массивы на стороне БД (array_agg в Postgres,
+        json_group_array в SQLite): ряд приходит одной строкой, по списку Python
+        на столбец, и переводится в массивы np.asarray. Это быстрее чтения
+        ряда построчно (np.fromiter) и разбора текста np.fromstring - см.
+        benchmarks/history_analytics.py --load
+        """
+
+        model = ROLLUP_MODELS[HistoryPeriod(period)]
+        columns = (epoch(model.bucket), model.balance, model.delta)
+        filters = (
+            model.account_id == account_id,
+            model.bucket >= HistoryPeriod(period).truncate(start_date),
+            model.last_created_at >= start_date,
+        )
+
+        if self._dialect == "postgresql":
+            query = select(
+                *(
+                    func.array_agg(postgresql.aggregate_order_by(column, model.bucket))
+                    for column in columns
+                )
+            ).where(*filters)
+            arrays = (await self._session.execute(query)).one()
+        else:
+            ordered = (
+                select(*(column.label(f"c{i}") for i, column in enumerate(columns)))
+                .where(*filters)
+                .order_by(model.bucket)
+                .subquery()
+            )
+            query = select(*(func.json_group_array(column) for column in ordered.c))
+            arrays = [
+                orjson.loads(array)
+                for array in (await self._session.execute(query)).one()
+            ]
+
+        timestamps, balances, deltas = (
+            np.asarray(array or [], dtype=np.float64) for array in arrays
+        )
+        if not len(balances):
+            return None
+
+        return HistorySeries(timestamps=timestamps, balances=balances, deltas=deltas)
+
+    async def rebuild_rollups(self, account_id: str) -> int:
+        """
+        Пересчёт агрегатов счёта по сырой истории
+
+        Возвращает количество обработанных записей истории
+        """
+
+        count = await self._rebuild_rollups(account_id)
+        await self._session.commit()
+        return count
+
+    async def import_histories(
+        self, account_id: str, histories: list[History]
+    ) -> Money:
+        """
+        Загрузка истории счёта одной транзакцией
+
+        - Postgres: COPY через asyncpg (copy_records_to_table)
+        - SQLite: пачки executemany
+
+        Изменения баланса пересчитываются с учётом уже сохранённой истории счёта.
+        После загрузки баланс счёта выставляется по последней записи истории,
+        а агрегаты счёта пересчитываются
+        """
+
+        rows = [HistoryDTO.from_entity_to_dict(history) for history in histories]
+        updates = await self._link_import_deltas(account_id, rows)
+        if updates:
+            await self._session.execute(update(HistoryModel), updates)
+
+        if self._dialect == "postgresql":
+            conn = await self._session.connection()
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.copy_records_to_table(
+                HistoryModel.__tablename__,
+                columns=IMPORT_COLUMNS,
+                records=[
+                    tuple(row[column] for column in IMPORT_COLUMNS) for row in rows
+                ],
+            )
+        else:
+            for i in range(0, len(rows), ROLLUP_BATCH_SIZE):
+                await self._session.execute(
+                    insert(HistoryModel), rows[i : i + ROLLUP_BATCH_SIZE]
+                )
+
+        last_balance = (
+            select(HistoryModel.balance)
+            .filter_by(account_id=account_id)
+            .order_by(HistoryModel.created_at.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        balance = await self._session.scalar(
+            update(AccountModel)
+            .filter_by(id=account_id)
+            .values(balance=last_balance, updated_at=datetime.now(timezone.utc))
+            .returning(AccountModel.balance)
+        )
+
+        # Импортированные записи могут попасть до водяного знака прореживания
+        await self._session.execute(
+            delete(HistoryCompactionModel).filter_by(account_id=account_id)
+        )
+        await self._rebuild_rollups(account_id)
+        await self._session.commit()
+        # Баланс счёта изменён в обход репозитория счетов
+        if identity_map := current_identity_map():
+            identity_map.discard(Account, account_id)
+        return Money(balance)
+
+    async def _link_import_deltas(
+        self, account_id: str, rows: list[dict[str, Any]]
+    ) -> list[dict[str, Any]]:
+        """
+        delta загружаемых записей и новые delta сохранённых записей
+
+        Загружаемые записи встают между сохранёнными: delta каждой считается от
+        предыдущей записи в общей истории, а у сохранённой записи, следующей
+        за загруженной, delta пересчитывается от неё
+        """
+
+        rows.sort(key=lambda row: (row["created_at"], row["id"]))
+        columns = (HistoryModel.id, HistoryModel.created_at, HistoryModel.balance)
+        account = HistoryModel.account_id == account_id
+        first, last = rows[0]["created_at"], rows[-1]["created_at"]
+
+        existing = [
+            *await self._session.execute(
+                select(*columns)
+                .where(account, HistoryModel.created_at < first)
+                .order_by(HistoryModel.created_at.desc(), HistoryModel.id.desc())
+                .limit(1)
+            ),
+            *await self._session.execute(
+                select(*columns).where(
+                    account, HistoryModel.created_at.between(first, last)
+                )
+            ),
+            *await self._session.execute(
+                select(*columns)
+                .where(account, HistoryModel.created_at > last)
+                .order_by(HistoryModel.created_at, HistoryModel.id)
+                .limit(1)
+            ),
+        ]
+        merged = sorted(
+            [
+                *(
+                    (HistoryOrmDTO._ensure_utc(row.created_at), row.id, row, False)
+                    for row in existing
+                ),
+                *((row["created_at"], row["id"], row, True) for row in rows),
+            ],
+            key=lambda item: item[:2],
+        )
+
+        updates: list[dict[str, Any]] = []
+        previous: Optional[Decimal] = None
+        previous_imported = False
+        for created_at, row_id, row, imported in merged:
+            balance = Decimal(str(row["balance"] if imported else row.balance))
+            if imported:
+                row["delta"] = float(balance - previous) if previous is not None else 0
+            elif previous_imported:
+                updates.append(
+                    {
+                        "id": row_id,
+                        "created_at": row.created_at,
+                        "delta": float(balance - previous),
+                    }
+                )
+            previous, previous_imported = balance, imported
+        return updates
+
+    async def _rebuild_rollups(self, account_id: str) -> int:
+        buckets: dict[HistoryPeriod, dict[datetime, dict[str, Any]]] = {
+            period: {} for period in ROLLUP_MODELS
+        }
+        query = (
+            select(
+                HistoryModel.balance,
+                HistoryModel.delta,
+                HistoryModel.is_monthly_closing,
+                HistoryModel.created_at,
+            )
+            .filter_by(account_id=account_id)
+            .order_by(HistoryModel.created_at)
+            .execution_options(yield_per=ROLLUP_BATCH_SIZE)
+        )
+
+        count = 0
+        async for (
+            balance,
+            delta,
+            is_monthly_closing,
+            created_at,
+        ) in await self._session.stream(query):
+            count += 1
+            for period, period_buckets in buckets.items():
+                bucket = period.truncate(created_at)
+                if not (row := period_buckets.get(bucket)):
+                    period_buckets[bucket] = self._rollup_row(
+                        account_id=account_id,
+                        bucket=bucket,
+                        balance=balance,
+                        delta=delta,
+                        is_monthly_closing=is_monthly_closing,
+                        created_at=created_at,
+                    )
+                    continue
+
+                row["balance"] = balance
+                row["delta"] += delta
+                row["is_monthly_closing"] |= is_monthly_closing
+                row["last_created_at"] = created_at
+
+        for period, model in ROLLUP_MODELS.items():
+            await self._session.execute(delete(model).filter_by(account_id=account_id))
+
+            rows = list(buckets[period].values())
+            for i in range(0, len(rows), ROLLUP_BATCH_SIZE):
+                await self._session.execute(
+                    insert(model), rows[i : i + ROLLUP_BATCH_SIZE]
+                )
+
+        return count
+
+    async def stream_history(
+        self,
+        account_id: str,
+        since: Optional[datetime] = None,
+        after_id: Optional[str] = None,
+    ) -> AsyncIterator[list[HistoryRow]]:
+        """
+        Сырая история счёта пачками через серверный курсор
+
+        Записи идут по (created_at, id): с after_id выгрузка продолжается строго
+        после записи (since, after_id), в том числе среди записей с той же датой
+        """
+
+        query = (
+            select(
+                HistoryModel.id,
+                HistoryModel.balance,
+                HistoryModel.delta,
+                HistoryModel.is_monthly_closing,
+                HistoryModel.created_at,
+            )
+            .filter_by(account_id=account_id)
+            .order_by(HistoryModel.created_at, HistoryModel.id)
+            .execution_options(yield_per=STREAM_BATCH_SIZE)
+        )
+        if since and after_id:
+            query = query.where(
+                tuple_(HistoryModel.created_at, HistoryModel.id)
+                > tuple_(since, after_id)
+            )
+        elif since:
+            query = query.where(HistoryModel.created_at > since)
+
+        res = await self._session.stream(query)
+        async for partition in res.partitions():
+            yield partition
+
+    async def get_account_ids(self, after: Optional[str], limit: int) -> list[str]:
+        """Пачка id счетов по возрастанию, начиная после `after`"""
+
+        query = select(AccountModel.id).order_by(AccountModel.id).limit(limit)
+        if after:
+            query = query.where(AccountModel.id > after)
+        return list(await self._session.scalars(query))
+
+    async def compact_history(
+        self,
+        account_id: str,
+        period: HistoryPeriod,
+        before: datetime,
+        page_size: int = ROLLUP_BATCH_SIZE,
+    ) -> int:
+        """
+        Сворачивает записи счёта до `before` до одной на период
+
+        - Остаётся последняя запись периода, её delta - сумма изменений свёрнутых записей
+        - Записи закрытия месяца не удаляются
+        - Обрабатываются только записи после водяного знака прошлого запуска
+
+        Записи читаются страницами по page_size, каждая страница - своя транзакция.
+        Последняя запись страницы остаётся и копит delta, следующая страница
+        начинается с неё. Водяной знак после каждой страницы - начало её последнего
+        периода: прерванный запуск продолжится с него. Возвращает количество
+        удалённых записей
+        """
+
+        since = await self._session.scalar(
+            select(HistoryCompactionModel.compacted_until).filter_by(
+                account_id=account_id, period=period.value
+            )
+        )
+        since = HistoryOrmDTO._ensure_utc(since) if since else None
+        if since and since >= before:
+            return 0
+
+        window = [
+            HistoryModel.account_id == account_id,
+            HistoryModel.created_at < before,
+        ]
+        if since:
+            window.append(HistoryModel.created_at >= since)
+
+        # Страница - перенесённая запись прошлой страницы и хотя бы одна новая
+        page_size = max(page_size, 2)
+        removed_total, cursor = 0, None
+        while True:
+            query = select(
+                HistoryModel.id,
+                HistoryModel.delta,
+                HistoryModel.is_monthly_closing,
+                HistoryModel.created_at,
+            ).where(*window)
+            if cursor:
+                query = query.where(
+                    tuple_(HistoryModel.created_at, HistoryModel.id) >= cursor
+                )
+            rows = (
+                await self._session.execute(
+                    query.order_by(HistoryModel.created_at, HistoryModel.id).limit(
+                        page_size
+                    )
+                )
+            ).all()
+
+            removed, updates = self._compact_rows(rows, period)
+            for i in range(0, len(removed), ROLLUP_BATCH_SIZE):
+                await self._session.execute(
+                    delete(HistoryModel).where(
+                        *window,
+                        HistoryModel.id.in_(removed[i : i + ROLLUP_BATCH_SIZE]),
+                    )
+                )
+            if updates:
+                await self._session.execute(update(HistoryModel), updates)
+            removed_total += len(removed)
+
+            if len(rows) < page_size:
+                await self._set_compacted_until(account_id, period, before)
+                await self._session.commit()
+                return removed_total
+
+            last = rows[-1]
+            cursor = (last.created_at, last.id)
+            # Период последней записи может продолжаться на следующей странице
+            until = HistoryOrmDTO._ensure_utc(period.truncate(last.created_at))
+            if not since or until > since:
+                await self._set_compacted_until(account_id, period, until)
+            await self._session.commit()
+
+    async def _set_compacted_until(
+        self, account_id: str, period: HistoryPeriod, until: datetime
+    ) -> None:
+        dialect = postgresql if self._dialect == "postgresql" else sqlite
+        stmt = dialect.insert(HistoryCompactionModel).values(
+            account_id=account_id, period=period.value, compacted_until=until
+        )
+        await self._session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[
+                    HistoryCompactionModel.account_id,
+                    HistoryCompactionModel.period,
+                ],
+                set_={"compacted_until": stmt.excluded.compacted_until},
+            )
+        )
 
     async def update(
         self, history_id: str, upd_data: dict[str, Any]
@@ -85,6 +708,146 @@ class SQLAlchemyHistoryRepository:
         await self._session.commit()
         return HistoryOrmDTO.from_orm_to_entity(history) if history else None
 
+    def _linked_to_period_query(
+        self, account_id: str, period: str, start_date: datetime
+    ) -> Select:
+        """
+        Запрос последних записей по периодам в рамках одного счёта
+
+        - Postgres: DISTINCT ON по началу периода
+        - SQLite: row_number() в окне периода
+
+        Оба варианта читают только диапазон индекса (account_id, created_at) счёта
+        """
+
+        bucket = date_trunc(period, HistoryModel.created_at)
+        account_filter = (
+            HistoryModel.account_id == account_id,
+            HistoryModel.created_at >= start_date,
+        )
+
+        if self._dialect == "postgresql":
+            return (
+                select(HistoryModel)
+                .distinct(bucket)
+                .where(*account_filter)
+                .order_by(bucket.desc(), HistoryModel.created_at.desc())
+            )
+
+        ranked = (
+            select(
+                HistoryModel,
+                func.row_number()
+                .over(partition_by=bucket, order_by=HistoryModel.created_at.desc())
+                .label("row_number"),
+            )
+            .where(*account_filter)
+            .subquery()
+        )
+        return select(aliased(HistoryModel, ranked)).where(ranked.c.row_number == 1)
+
+    async def _upsert_rollups_many(self, histories: list[History]) -> None:
+        """
+        Добавляет записи истории в агрегаты всех периодов - один запрос на период
+
+        Записи одного счёта и периода сначала сворачиваются в одну строку:
+        многострочный ON CONFLICT не может изменить одну строку дважды
+        """
+
+        dialect = postgresql if self._dialect == "postgresql" else sqlite
+
+        for period, model in ROLLUP_MODELS.items():
+            rows: dict[tuple[str, datetime], dict[str, Any]] = {}
+            for history in sorted(histories, key=lambda h: h.created_at):
+                row = self._rollup_row(
+                    account_id=history.account_id.as_generic_type(),
+                    bucket=period.truncate(history.created_at),
+                    balance=history.balance.as_generic_type(),
+                    delta=history.delta,
+                    is_monthly_closing=history.is_monthly_closing,
+                    created_at=history.created_at,
+                )
+                if previous := rows.get((row["account_id"], row["bucket"])):
+                    row["delta"] += previous["delta"]
+                    row["is_monthly_closing"] |= previous["is_monthly_closing"]
+                rows[(row["account_id"], row["bucket"])] = row
+
+            stmt = dialect.insert(model).values(list(rows.values()))
+            is_newer = stmt.excluded.last_created_at >= model.last_created_at
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[model.account_id, model.bucket],
+                set_={
+                    "balance": case(
+                        (is_newer, stmt.excluded.balance), else_=model.balance
+                    ),
+                    "last_created_at": case(
+                        (is_newer, stmt.excluded.last_created_at),
+                        else_=model.last_created_at,
+                    ),
+                    "delta": model.delta + stmt.excluded.delta,
+                    "is_monthly_closing": or_(
+                        model.is_monthly_closing, stmt.excluded.is_monthly_closing
+                    ),
+                },
+            )
+            await self._session.execute(stmt)
+
+    @staticmethod
+    def _compact_rows(
+        rows: Sequence[Row], period: HistoryPeriod
+    ) -> tuple[list[str], list[dict[str, Any]]]:
+        """
+        id удаляемых записей и новые delta оставшихся
+
+        Изменения удаляемых записей переносятся в ближайшую следующую оставшуюся
+        запись - последнюю в периоде или запись закрытия месяца
+        """
+
+        removed: list[str] = []
+        updates: list[dict[str, Any]] = []
+        pending = Decimal(0)
+
+        for i, row in enumerate(rows):
+            bucket = period.truncate(row.created_at)
+            is_last = (
+                i + 1 == len(rows) or period.truncate(rows[i + 1].created_at) != bucket
+            )
+
+            if not (is_last or row.is_monthly_closing):
+                removed.append(row.id)
+                pending += Decimal(str(row.delta))
+                continue
+
+            if pending:
+                updates.append(
+                    {
+                        "id": row.id,
+                        "created_at": row.created_at,
+                        "delta": float(pending + Decimal(str(row.delta))),
+                    }
+                )
+                pending = Decimal(0)
+
+        return removed, updates
+
+    @staticmethod
+    def _rollup_row(
+        account_id: str,
+        bucket: datetime,
+        balance: Any,
+        delta: Any,
+        is_monthly_closing: bool,
+        created_at: datetime,
+    ) -> dict[str, Any]:
+        return {
+            "account_id": account_id,
+            "bucket": bucket,
+            "balance": float(balance),
+            "delta": float(delta or 0),
+            "is_monthly_closing": is_monthly_closing,
+            "last_created_at": created_at,
+        }
+
 
 def get_history_repository(session: SessionDep) -> HistoryRepositoryProtocol:
     return SQLAlchemyHistoryRepository(session)
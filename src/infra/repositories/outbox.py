@@ -0,0 +1,106 @@
+from dataclasses import fields
+from datetime import datetime
+from decimal import Decimal
+from typing import Annotated, Any, get_type_hints
+
+from fastapi import Depends
+from sqlalchemy import select, delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.domain import DomainEvent
+from domain.accounts.events import AccountCreatedEvent, BalanceUpdatedEvent
+from infra.database import SessionDep
+from infra.models import OutboxModel
+
+# События, которые можно записать в outbox, по имени типа
+OUTBOX_EVENTS: dict[str, type[DomainEvent]] = {
+    event.__name__: event for event in (AccountCreatedEvent, BalanceUpdatedEvent)
+}
+
+
+def dump_event(event: DomainEvent) -> dict[str, Any]:
+    """Событие в JSON: Decimal - строкой, даты - в ISO 8601"""
+
+    payload = {}
+    for field in fields(event):
+        value = getattr(event, field.name)
+        if isinstance(value, Decimal):
+            value = str(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        payload[field.name] = value
+    return payload
+
+
+def load_event(event_type: str, payload: dict[str, Any]) -> DomainEvent:
+    event = OUTBOX_EVENTS[event_type]
+    hints = get_type_hints(event)
+    data = {}
+    for name, value in payload.items():
+        if hints[name] is Decimal:
+            value = Decimal(value)
+        elif hints[name] is datetime:
+            value = datetime.fromisoformat(value)
+        data[name] = value
+    return event(**data)
+
+
+class SQLAlchemyOutboxRepository:
+
+    def __init__(self, session: AsyncSession):
+        self._session = session
+
+    @property
+    def _dialect(self) -> str:
+        return self._session.bind.dialect.name
+
+    async def add(self, events: list[DomainEvent]) -> None:
+        """Добавляет события в сессию без фиксации - их фиксирует изменение-источник"""
+
+        self._session.add_all(
+            [
+                OutboxModel(event_type=type(event).__name__, payload=dump_event(event))
+                for event in events
+            ]
+        )
+
+    async def fetch(
+        self, limit: int, max_attempts: int
+    ) -> list[tuple[str, DomainEvent]]:
+        """
+        Пачка неотправленных событий по порядку создания
+
+        В Postgres строки блокируются до конца транзакции (SKIP LOCKED), поэтому
+        несколько ретрансляторов забирают разные пачки
+        """
+
+        query = (
+            select(OutboxModel)
+            .where(OutboxModel.attempts < max_attempts)
+            .order_by(OutboxModel.created_at, OutboxModel.id)
+            .limit(limit)
+        )
+        if self._dialect == "postgresql":
+            query = query.with_for_update(skip_locked=True)
+
+        rows = await self._session.scalars(query)
+        return [(row.id, load_event(row.event_type, row.payload)) for row in rows]
+
+    async def delete(self, ids: list[str]) -> None:
+        await self._session.execute(delete(OutboxModel).where(OutboxModel.id.in_(ids)))
+
+    async def record_failure(self, ids: list[str], error: str) -> None:
+        await self._session.execute(
+            update(OutboxModel)
+            .where(OutboxModel.id.in_(ids))
+            .values(attempts=OutboxModel.attempts + 1, last_error=error)
+        )
+
+
+def get_outbox_repository(session: SessionDep) -> SQLAlchemyOutboxRepository:
+    return SQLAlchemyOutboxRepository(session)
+
+
+OutboxRepositoryDep = Annotated[
+    SQLAlchemyOutboxRepository, Depends(get_outbox_repository)
+]
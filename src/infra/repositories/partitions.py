@@ -0,0 +1,198 @@
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Annotated
+
+from dateutil.relativedelta import relativedelta
+from fastapi import Depends
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from infra.database import SessionDep
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class MonthPartition:
+    """Месячная секция таблицы, разбитой по created_at"""
+
+    table: str
+    start: datetime
+
+    @classmethod
+    def containing(cls, table: str, dt: datetime) -> "MonthPartition":
+        dt = dt.astimezone(timezone.utc)
+        return cls(
+            table=table, start=datetime(dt.year, dt.month, 1, tzinfo=timezone.utc)
+        )
+
+    @property
+    def end(self) -> datetime:
+        return self.start + relativedelta(months=1)
+
+    @property
+    def name(self) -> str:
+        return f"{self.table}_p{self.start:%Y_%m}"
+
+    @property
+    def next(self) -> "MonthPartition":
+        return MonthPartition(table=self.table, start=self.end)
+
+    @property
+    def default(self) -> str:
+        return f"{self.table}_default"
+
+    @property
+    def bounds(self) -> str:
+        return f"FOR VALUES FROM ('{self.start.isoformat()}') TO ('{self.end.isoformat()}')"
+
+    def create_ddl(self) -> str:
+        return (
+            f"CREATE TABLE IF NOT EXISTS {self.name} PARTITION OF {self.table} "
+            f"{self.bounds}"
+        )
+
+    def attach_ddl(self) -> str:
+        return f"ALTER TABLE {self.table} ATTACH PARTITION {self.name} {self.bounds}"
+
+
+class SQLAlchemyPartitionRepository:
+    """
+    Управление месячными секциями таблиц Postgres
+
+    Для остальных СУБД (SQLite в тестах) таблицы не секционируются - методы ничего не делают
+    """
+
+    def __init__(self, session: AsyncSession):
+        self._session = session
+
+    @property
+    def _is_supported(self) -> bool:
+        return self._session.bind.dialect.name == "postgresql"
+
+    async def get_partitions(self, table: str) -> list[str]:
+        """Имена секций таблицы (без секции по умолчанию)"""
+
+        if not self._is_supported:
+            return []
+
+        names = await self._session.scalars(
+            text(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+                "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "WHERE parent.relname = :table AND child.relname <> :default "
+                "ORDER BY child.relname"
+            ),
+            {"table": table, "default": f"{table}_default"},
+        )
+        return list(names)
+
+    async def create_partitions(
+        self, table: str, since: datetime, months: int
+    ) -> list[str]:
+        """
+        Создаёт секции на месяц `since` и `months` следующих месяцев
+
+        Возвращает имена созданных секций
+        """
+
+        if not self._is_supported:
+            return []
+
+        existing = set(await self.get_partitions(table))
+        partition = MonthPartition.containing(table, since)
+        created = []
+
+        for _ in range(months + 1):
+            if partition.name not in existing:
+                try:
+                    await self._create_partition(partition)
+                except SQLAlchemyError as exc:
+                    logger.error(
+                        "Секция %s за %s не создана: %s",
+                        partition.name,
+                        f"{partition.start:%Y-%m}",
+                        exc,
+                    )
+                    raise
+                created.append(partition.name)
+            partition = partition.next
+
+        await self._session.commit()
+        return created
+
+    async def _create_partition(self, partition: MonthPartition) -> None:
+        """
+        Создаёт секцию месяца
+
+        Postgres не создаёт секцию, пока строки её месяца лежат в секции по умолчанию
+        (например, история, записанная до создания секции заранее). Тогда секция
+        создаётся отдельной таблицей, строки переносятся в неё из секции
+        по умолчанию, и таблица присоединяется
+        """
+
+        bounds = {"start": partition.start, "end": partition.end}
+        in_range = "created_at >= :start AND created_at < :end"
+
+        if not await self._session.scalar(
+            text(f"SELECT EXISTS (SELECT 1 FROM {partition.default} WHERE {in_range})"),
+            bounds,
+        ):
+            await self._session.execute(text(partition.create_ddl()))
+            return
+
+        logger.warning(
+            "Строки за %s в секции %s переносятся в новую секцию %s",
+            f"{partition.start:%Y-%m}",
+            partition.default,
+            partition.name,
+        )
+        await self._session.execute(
+            text(
+                f"CREATE TABLE {partition.name} "
+                f"(LIKE {partition.table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+            )
+        )
+        await self._session.execute(
+            text(
+                f"WITH moved AS (DELETE FROM {partition.default} WHERE {in_range} "
+                f"RETURNING *) INSERT INTO {partition.name} SELECT * FROM moved"
+            ),
+            bounds,
+        )
+        await self._session.execute(text(partition.attach_ddl()))
+
+    async def detach_partitions(self, table: str, before: datetime) -> list[str]:
+        """
+        Отсоединяет секции, целиком лежащие раньше `before`
+
+        Отсоединенные секции остаются отдельными таблицами (архив)
+        """
+
+        if not self._is_supported:
+            return []
+
+        boundary = MonthPartition.containing(table, before)
+        detached = []
+
+        for name in await self.get_partitions(table):
+            if name < boundary.name:
+                await self._session.execute(
+                    text(f"ALTER TABLE {table} DETACH PARTITION {name}")
+                )
+                detached.append(name)
+
+        await self._session.commit()
+        return detached
+
+
+def get_partition_repository(session: SessionDep) -> SQLAlchemyPartitionRepository:
+    return SQLAlchemyPartitionRepository(session)
+
+
+PartitionRepositoryDep = Annotated[
+    SQLAlchemyPartitionRepository, Depends(get_partition_repository)
+]
@@ -8,6 +8,7 @@ from domain.users.entity import User
 from domain.users.repository import UserRepositoryProtocol
 from domain.users.values import UserId
 from infra import SessionDep
+from infra.identity import current_identity_map
 from infra.models import UserModel
 
 
@@ -24,12 +25,21 @@ class SQLAlchemyUserRepository:
         )
         self._session.add(user_model)
         await self._session.commit()
+        if identity_map := current_identity_map():
+            identity_map.add(User, user.id.as_generic_type(), user)
         return user.id
 
     async def get_by_id(self, user_id: UserId) -> Optional[User]:
+        identity_map = current_identity_map()
+        if identity_map and (user := identity_map.get(User, user_id.as_generic_type())):
+            return user
+
         query = select(UserModel).filter_by(id=user_id.as_generic_type())
         res = await self._session.execute(query)
-        return res.scalar_one_or_none()
+        user = res.scalar_one_or_none()
+        if identity_map and user:
+            identity_map.add(User, user_id.as_generic_type(), user)
+        return user
 
 
 def get_user_repository(session: SessionDep) -> UserRepositoryProtocol:
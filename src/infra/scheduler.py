@@ -0,0 +1,7 @@
+from taskiq import TaskiqScheduler
+from taskiq.schedule_sources import LabelScheduleSource
+
+from infra import broker
+
+# Запуск: taskiq scheduler infra.scheduler:scheduler -fsd -tp infra.tasks
+scheduler = TaskiqScheduler(broker=broker, sources=[LabelScheduleSource(broker)])
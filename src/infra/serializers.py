@@ -0,0 +1,135 @@
+"""
+Сериализация сообщений брокера в msgpack
+
+Сообщение - пара [версия схемы, данные]; поля TaskiqMessage форматтер передаёт
+списком в порядке MESSAGE_FIELDS, без имён. Decimal и datetime из событий
+передаются расширениями msgpack, а не строками, как в JSON-формате taskiq:
+- EXT_DECIMAL - строковое представление числа (точность не теряется)
+- EXT_DATETIME - микросекунды от эпохи и смещение часового пояса в минутах
+
+Сообщения в JSON (отправленные до переключения формата) по-прежнему читаются
+"""
+
+import calendar
+import struct
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Callable, Literal
+
+import msgpack
+from taskiq import AsyncBroker
+from taskiq.abc.formatter import TaskiqFormatter
+from taskiq.abc.serializer import TaskiqSerializer
+from taskiq.formatters.proxy_formatter import ProxyFormatter
+from taskiq.message import BrokerMessage, TaskiqMessage
+from taskiq.serializers import JSONSerializer
+
+SCHEMA_VERSION = 1
+MESSAGE_FIELDS = ("task_id", "task_name", "labels", "labels_types", "args", "kwargs")
+
+EXT_DECIMAL = 1
+EXT_DATETIME = 2
+
+_DATETIME = struct.Struct(">qh")
+# Смещение наивного datetime (без часового пояса)
+_NAIVE = -(2**15)
+_TIMEZONES: dict[int, timezone] = {0: timezone.utc}
+
+
+class UnsupportedSchemaError(ValueError):
+    """Сообщение записано в неизвестной версии схемы"""
+
+
+def _timezone(offset: int) -> timezone:
+    if (tz := _TIMEZONES.get(offset)) is None:
+        tz = _TIMEZONES[offset] = timezone(timedelta(minutes=offset))
+    return tz
+
+
+def _default(value: Any) -> msgpack.ExtType:
+    # Вызывается только для типов, которых нет в msgpack: держим его быстрым
+    if isinstance(value, Decimal):
+        return msgpack.ExtType(EXT_DECIMAL, str(value).encode())
+    if isinstance(value, datetime):
+        if (utcoffset := value.utcoffset()) is None:
+            offset, seconds = _NAIVE, calendar.timegm(value.timetuple())
+        else:
+            offset = utcoffset.days * 1440 + utcoffset.seconds // 60
+            seconds = calendar.timegm(value.utctimetuple())
+        micros = seconds * 1_000_000 + value.microsecond
+        return msgpack.ExtType(EXT_DATETIME, _DATETIME.pack(micros, offset))
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в msgpack")
+
+
+def _ext_hook(code: int, data: bytes) -> Any:
+    if code == EXT_DECIMAL:
+        return Decimal(data.decode())
+    if code == EXT_DATETIME:
+        micros, offset = _DATETIME.unpack(data)
+        seconds, micros = divmod(micros, 1_000_000)
+        if offset == _NAIVE:
+            value = datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None)
+        else:
+            value = datetime.fromtimestamp(seconds, _timezone(offset))
+        return value.replace(microsecond=micros)
+    return msgpack.ExtType(code, data)
+
+
+class MsgpackSerializer(TaskiqSerializer):
+    """msgpack с расширениями для Decimal и datetime и версией схемы"""
+
+    def dumpb(self, value: Any) -> bytes:
+        return msgpack.packb([SCHEMA_VERSION, value], default=_default)
+
+    def loadb(self, value: bytes) -> Any:
+        version, payload = msgpack.unpackb(value, ext_hook=_ext_hook)
+        if version != SCHEMA_VERSION:
+            raise UnsupportedSchemaError(
+                f"Версия схемы сообщения {version}, поддерживается {SCHEMA_VERSION}"
+            )
+        return payload
+
+
+class MsgpackFormatter(TaskiqFormatter):
+    """
+    Сообщение taskiq без приведения к JSON: Decimal и datetime аргументов
+    задач сериализуются расширениями msgpack
+    """
+
+    def __init__(self, serializer: TaskiqSerializer = MsgpackSerializer()):
+        self.serializer = serializer
+        self._json = JSONSerializer()
+
+    def dumps(self, message: TaskiqMessage) -> BrokerMessage:
+        data = message.model_dump()
+        return BrokerMessage(
+            task_id=message.task_id,
+            task_name=message.task_name,
+            message=self.serializer.dumpb([data[name] for name in MESSAGE_FIELDS]),
+            labels=message.labels,
+        )
+
+    def loads(self, message: bytes) -> TaskiqMessage:
+        # Сообщение в формате JSON всегда начинается с объекта
+        if message[:1] == b"{":
+            return TaskiqMessage.model_validate(self._json.loadb(message))
+        fields = self.serializer.loadb(message)
+        return TaskiqMessage.model_validate(dict(zip(MESSAGE_FIELDS, fields)))
+
+
+SerializerName = Literal["json", "msgpack"]
+
+SERIALIZERS: dict[
+    SerializerName,
+    Callable[[AsyncBroker], tuple[TaskiqSerializer, TaskiqFormatter]],
+] = {
+    "json": lambda broker: (JSONSerializer(), ProxyFormatter(broker)),
+    "msgpack": lambda broker: (MsgpackSerializer(), MsgpackFormatter()),
+}
+
+
+def with_serialization(broker: AsyncBroker, name: SerializerName) -> AsyncBroker:
+    """Формат сообщений брокера по имени из настроек"""
+
+    serializer, formatter = SERIALIZERS[name](broker)
+    return broker.with_serializer(serializer).with_formatter(formatter)
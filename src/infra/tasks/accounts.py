@@ -1,35 +1,89 @@
+import asyncio
 import logging
-from typing import Annotated
 
-from taskiq import TaskiqDepends
+from taskiq import TaskiqEvents, TaskiqState
 
+from core.settings import settings
 from domain.accounts.events import AccountCreatedEvent, BalanceUpdatedEvent
 from domain.accounts.values import AccountId
 from domain.histories.commands import SaveHistoryCommand
-from domain.histories.service import get_history_service, HistoryService
-from infra import broker
+from domain.histories.service import get_history_service
+from infra import broker, db_helper
+from infra.batching import BatchWriter
+from infra.cache.histories import get_history_cache
+from infra.cache.redis import get_redis_client
+from infra.delivery import DELIVERY_LABEL, FIRE_AND_FORGET
+from infra.repositories.histories import SQLAlchemyHistoryRepository
 
 logger = logging.getLogger(__name__)
 
 
-@broker.task(retry_on_error=True, max_retries=10)
-async def save_account_history(
+def to_save_history_command(
     event: AccountCreatedEvent | BalanceUpdatedEvent,
-    history_service: Annotated[HistoryService, TaskiqDepends(get_history_service)],
-) -> str:
+) -> SaveHistoryCommand:
+    return SaveHistoryCommand(
+        balance=event.new_balance,
+        account_id=event.account_id,
+        user_id=event.user_id,
+        delta=event.delta if isinstance(event, BalanceUpdatedEvent) else 0,
+        is_monthly_closing=(
+            event.is_monthly_closing
+            if isinstance(event, BalanceUpdatedEvent)
+            else False
+        ),
+        event_id=event.event_id,
+        occurred_at=event.occurred_at,
+    )
+
+
+async def write_history_batch(commands: list[SaveHistoryCommand]) -> list[str]:
+    """Пачка истории - одна вставка и один commit в отдельной сессии"""
+
+    async with db_helper.session_factory() as session:
+        history_service = get_history_service(
+            SQLAlchemyHistoryRepository(session),
+            get_history_cache(get_redis_client()),
+        )
+        return await history_service.save_accounts_history(commands)
+
+
+# Общий на воркер: одновременные задачи сохранения истории пишутся пачками
+history_writer: BatchWriter[SaveHistoryCommand, str] = BatchWriter(
+    write_history_batch,
+    max_size=settings.history_writer.max_batch,
+    max_delay=settings.history_writer.max_delay_ms / 1000,
+)
+
+
+@broker.on_event(TaskiqEvents.WORKER_SHUTDOWN)
+async def flush_history_writer(_: TaskiqState) -> None:
+    await history_writer.flush()
+
+
+# Результат (id записи истории) никому не нужен: не сохраняется в result backend
+HISTORY_TASK_LABELS = {DELIVERY_LABEL: FIRE_AND_FORGET}
+
+
+@broker.task(retry_on_error=True, max_retries=10, **HISTORY_TASK_LABELS)
+async def save_account_history(event: AccountCreatedEvent | BalanceUpdatedEvent) -> str:
+    """
+    Сохранение истории счёта в составе пачки
+
+    Задача завершается (и сообщение подтверждается) только после commit пачки
+    """
+
     logger.info(f"Сохраняем историю счёта #{AccountId(event.account_id).short} ...")
+    return await history_writer.submit(to_save_history_command(event))
+
+
+@broker.task(retry_on_error=True, max_retries=10, **HISTORY_TASK_LABELS)
+async def save_accounts_history(
+    events: list[AccountCreatedEvent | BalanceUpdatedEvent],
+) -> list[str]:
+    logger.info("Сохраняем историю %s счетов ...", len(events))
 
-    history_id: str = await history_service.save_account_history(
-        command=SaveHistoryCommand(
-            balance=event.new_balance,
-            account_id=event.account_id,
-            user_id=event.user_id,
-            delta=event.delta if isinstance(event, BalanceUpdatedEvent) else 0,
-            is_monthly_closing=(
-                event.is_monthly_closing
-                if isinstance(event, BalanceUpdatedEvent)
-                else False
-            ),
+    return list(
+        await asyncio.gather(
+            *(history_writer.submit(to_save_history_command(e)) for e in events)
         )
     )
-    return history_id
@@ -0,0 +1,69 @@
+import logging
+from datetime import datetime, timezone
+from typing import Annotated
+
+from dateutil.relativedelta import relativedelta
+from taskiq import TaskiqDepends
+
+from core.settings import settings
+from domain.histories.commands import CompactHistoryCommand
+from domain.histories.service import HistoryService, get_history_service
+from domain.histories.values import CompactionTier, HistoryPeriod
+from infra import broker
+from infra.models import HistoryModel
+from infra.repositories.partitions import (
+    SQLAlchemyPartitionRepository,
+    get_partition_repository,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@broker.task(schedule=[{"cron": settings.db.partitions.cron}])
+async def manage_history_partitions(
+    partition_repo: Annotated[
+        SQLAlchemyPartitionRepository, TaskiqDepends(get_partition_repository)
+    ],
+) -> dict[str, list[str]]:
+    """
+    Обслуживание месячных секций истории счетов
+
+    - Заранее создаёт секции на `premake_months` месяцев вперёд
+    - Если задан `retention_months`, отсоединяет более старые секции
+    """
+
+    config = settings.db.partitions
+    now = datetime.now(timezone.utc)
+    table = HistoryModel.__tablename__
+
+    created = await partition_repo.create_partitions(
+        table=table, since=now, months=config.premake_months
+    )
+    detached = []
+    if config.retention_months is not None:
+        detached = await partition_repo.detach_partitions(
+            table=table, before=now - relativedelta(months=config.retention_months)
+        )
+
+    logger.info("Секции истории счетов: создано %s, отсоединено %s", created, detached)
+    return {"created": created, "detached": detached}
+
+
+@broker.task(schedule=[{"cron": settings.compaction.cron}])
+async def compact_history(
+    history_service: Annotated[HistoryService, TaskiqDepends(get_history_service)],
+) -> int:
+    """Прореживание старой истории счетов по уровням из настроек"""
+
+    config = settings.compaction
+    return await history_service.compact_history(
+        command=CompactHistoryCommand(
+            tiers=[
+                CompactionTier(
+                    older_than=tier.older_than, period=HistoryPeriod(tier.period)
+                )
+                for tier in config.tiers
+            ],
+            batch_size=config.batch_size,
+        )
+    )
@@ -0,0 +1,155 @@
+"""
+Отслеживание результатов задач брокера
+
+Один трекер на процесс вместо фоновой задачи asyncio на каждое событие: задачи
+ставятся в ограниченный реестр, один цикл опрашивает их готовность пачками
+и пишет итог в лог и счётчики. При остановке приложения трекер дожидается
+оставшихся задач (drain)
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from taskiq import AsyncTaskiqTask
+
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TaskTrackerStats:
+    """Счётчики трекера (общие на процесс)"""
+
+    tracked: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    timed_out: int = 0
+    dropped: int = 0
+
+    def reset(self) -> None:
+        self.tracked = self.succeeded = self.failed = 0
+        self.timed_out = self.dropped = 0
+
+
+class TaskTracker:
+
+    def __init__(
+        self,
+        capacity: int = settings.broker.tracker.capacity,
+        batch_size: int = settings.broker.tracker.batch_size,
+        poll_interval: float = settings.broker.tracker.poll_interval,
+        timeout: float = settings.broker.tracker.timeout,
+        track_results: bool = settings.broker.tracker.track_results,
+    ):
+        self._capacity = capacity
+        self._batch_size = batch_size
+        self._poll_interval = poll_interval
+        self._timeout = timeout
+        self._track_results = track_results
+        # id задачи -> (задача, срок ожидания); порядок - очередь опроса
+        self._pending: dict[str, tuple[AsyncTaskiqTask, float]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.stats = TaskTrackerStats()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def track(self, task: AsyncTaskiqTask) -> bool:
+        """Ставит задачу на отслеживание без ожидания (False - не отслеживается)"""
+
+        if not self._track_results:
+            return False
+
+        if len(self._pending) >= self._capacity:
+            self.stats.dropped += 1
+            logger.warning("Задача #%s не отслеживается: трекер заполнен", task.task_id)
+            return False
+
+        self._pending[task.task_id] = (task, time.monotonic() + self._timeout)
+        self.stats.tracked += 1
+        return True
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def drain(
+        self, timeout: float = settings.broker.tracker.drain_timeout
+    ) -> None:
+        """Останавливает опрос и дожидается отслеживаемых задач (не дольше timeout)"""
+
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        deadline = time.monotonic() + timeout
+        while self._pending and time.monotonic() < deadline:
+            await self.poll_once()
+            if self._pending:
+                await asyncio.sleep(
+                    min(self._poll_interval, max(deadline - time.monotonic(), 0))
+                )
+
+        if self._pending:
+            logger.warning(
+                "Трекер остановлен, не дождались %s задач", len(self._pending)
+            )
+            self._pending.clear()
+
+    async def poll_once(self) -> int:
+        """Опрашивает пачку самых давних задач, возвращает число завершённых"""
+
+        batch = list(self._pending.items())[: self._batch_size]
+        ready = await asyncio.gather(
+            *(task.is_ready() for _, (task, _) in batch), return_exceptions=True
+        )
+
+        now, done = time.monotonic(), 0
+        for (task_id, (task, deadline)), is_ready in zip(batch, ready):
+            del self._pending[task_id]
+            if is_ready is True:
+                await self._finish(task)
+                done += 1
+            elif now >= deadline:
+                self.stats.timed_out += 1
+                logger.warning(
+                    "Задача #%s не завершилась за %s секунд", task_id, self._timeout
+                )
+            else:
+                # Не готова - в конец очереди опроса
+                self._pending[task_id] = (task, deadline)
+        return done
+
+    async def _finish(self, task: AsyncTaskiqTask) -> None:
+        try:
+            result = await task.get_result()
+        except Exception as exc:
+            self.stats.failed += 1
+            logger.error(
+                "Ошибка получения результата задачи #%s: %s", task.task_id, exc
+            )
+            return
+
+        if result.is_err:
+            self.stats.failed += 1
+            logger.error("Ошибка в задаче #%s: %s", task.task_id, result.error)
+        else:
+            self.stats.succeeded += 1
+            logger.info("Задача #%s выполнена: %s", task.task_id, result.return_value)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if self._pending:
+                    await self.poll_once()
+            except Exception as exc:
+                logger.warning("Опрос задач не удался: %s", exc)
+            await asyncio.sleep(self._poll_interval)
+
+
+task_tracker = TaskTracker()
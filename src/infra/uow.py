@@ -1,32 +1,73 @@
-from contextlib import asynccontextmanager
-from typing import Optional
+import logging
+from typing import Annotated, Awaitable, Callable, Self
 
+from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from infra.database import db_helper
+from core.uow import UnitOfWorkProtocol
+from infra.database import SessionDep
 
+logger = logging.getLogger(__name__)
 
-class UnitOfWork:
+# Флаг в session.info: сессия внутри единицы работы
+UNIT_OF_WORK = "unit_of_work"
+# Действия после фиксации единицы работы (сброс кэшей)
+AFTER_COMMIT = "after_commit"
 
-    def __init__(self, session_factory: type[AsyncSession]):
-        self._session_factory = session_factory
-        self._session: Optional[AsyncSession] = None
+AfterCommit = Callable[[], Awaitable[None]]
 
-    @asynccontextmanager
-    async def start(self):
-        self._session = self._session_factory()
-        try:
-            yield self
 
-        except Exception as e:
-            await self._session.rollback()
-            raise e
+class SQLAlchemyUnitOfWork:
+    """
+    Единица работы поверх сессии запроса
+
+    Внутри неё репозитории не фиксируют транзакцию сами (commit_or_flush),
+    фиксирует её commit
+    """
 
-        finally:
-            await self._session.close()
+    def __init__(self, session: AsyncSession):
+        self._session = session
+
+    async def __aenter__(self) -> Self:
+        self._session.info[UNIT_OF_WORK] = True
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self._session.info.pop(UNIT_OF_WORK, None)
+        self._session.info.pop(AFTER_COMMIT, None)
+        if self._session.in_transaction():
+            await self._session.rollback()
 
     async def commit(self) -> None:
         await self._session.commit()
+        # Транзакция уже зафиксирована: ошибка действия не должна её «отменять»
+        for callback in self._session.info.pop(AFTER_COMMIT, []):
+            try:
+                await callback()
+            except Exception as exc:
+                logger.error("Ошибка действия после фиксации транзакции: %s", exc)
+
+
+async def commit_or_flush(session: AsyncSession) -> None:
+    """Фиксирует транзакцию, а внутри единицы работы - только отправляет изменения в БД"""
+
+    if session.info.get(UNIT_OF_WORK):
+        await session.flush()
+    else:
+        await session.commit()
+
+
+async def after_commit(session: AsyncSession, callback: AfterCommit) -> None:
+    """Выполняет callback после фиксации единицы работы, а вне её - сразу"""
+
+    if session.info.get(UNIT_OF_WORK):
+        session.info.setdefault(AFTER_COMMIT, []).append(callback)
+    else:
+        await callback()
+
+
+def get_unit_of_work(session: SessionDep) -> UnitOfWorkProtocol:
+    return SQLAlchemyUnitOfWork(session)
 
 
-uow = UnitOfWork(session_factory=db_helper.session_factory)
+UnitOfWorkDep = Annotated[UnitOfWorkProtocol, Depends(get_unit_of_work)]
@@ -8,6 +8,7 @@ from fastapi.responses import ORJSONResponse
 from redis.asyncio import Redis
 
 from api import router as main_router
+from api.middlewares import RequestScopeMiddleware
 from api.schemas import (
     BaseExceptionSchema,
     ValidationExceptionSchema,
@@ -17,7 +18,11 @@ from core.exceptions import AppException
 from core.logger import setup_logger
 from core.settings import settings
 from infra import admin, broker, db_helper
+from infra.cache.accounts import AccountCacheInvalidator, local_account_cache
 from infra.cache.redis import get_redis_client
+from infra.publishers.accounts import AccountTaskiqPublisher
+from infra.publishers.outbox import OutboxRelay
+from infra.tracker import task_tracker
 
 logger = logging.getLogger(__name__)
 setup_logger()
@@ -25,12 +30,29 @@ setup_logger()
 
 @asynccontextmanager
 async def lifespan(_: FastAPI, redis: Redis = get_redis_client()):
+    # Ретранслятор outbox отправляет события счетов в брокер из процесса API.
+    # В режиме in_process события в outbox не пишутся - ретранслятор не нужен
+    relay = OutboxRelay(
+        db_helper.session_factory, AccountTaskiqPublisher().publish_many
+    )
+    with_relay = settings.history_writer.mode == "broker"
     if not broker.is_worker_process:
         await broker.startup()
+        task_tracker.start()
+        if with_relay:
+            relay.start()
+
+    invalidator = AccountCacheInvalidator(redis, local_account_cache)
+    invalidator.start()
 
     yield
 
+    await invalidator.stop()
+    await relay.stop()
+
     if not broker.is_worker_process:
+        # Сначала дожидаемся результатов уже отправленных задач
+        await task_tracker.drain()
         await broker.shutdown()
 
     await db_helper.dispose()
@@ -50,6 +72,7 @@ app = FastAPI(
     },
 )
 
+app.add_middleware(RequestScopeMiddleware)
 app.include_router(main_router)
 admin.mount_to(app)
 
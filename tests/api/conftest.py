@@ -3,6 +3,9 @@ from typing import AsyncGenerator
 import pytest
 from httpx import AsyncClient, ASGITransport
 
+from infra import db_helper
+from infra.cache.accounts import local_account_cache
+from infra.cache.redis import get_redis_client
 from infra.repositories.accounts import get_account_repository
 from infra.repositories.goals import get_goals_repository
 from infra.repositories.users import get_user_repository
@@ -10,8 +13,13 @@ from main import app
 
 
 @pytest.fixture(autouse=True)
-def override_app(test_account_repo, test_user_repo, test_goal_repo):
+def override_app(
+    test_session, test_account_repo, test_user_repo, test_goal_repo, test_redis
+):
     overrides = {
+        # Изменение и его события в outbox пишутся одной сессией
+        db_helper.session_getter: lambda: test_session,
+        get_redis_client: lambda: test_redis,
         get_account_repository: lambda: test_account_repo,
         get_user_repository: lambda: test_user_repo,
         get_goals_repository: lambda: test_goal_repo,
@@ -24,6 +32,7 @@ def override_app(test_account_repo, test_user_repo, test_goal_repo):
 
     app.dependency_overrides.clear()
     app.dependency_overrides.update(original_overrides)
+    local_account_cache.clear()
 
 
 @pytest.fixture
@@ -165,3 +165,104 @@ class TestAccountApi:
         assert response.status_code == 400
         assert saved_account.balance != new_balance
         assert "невалидный" in response.json()["message"].lower()
+
+    async def test_update_accounts_balances_success(
+        self, client, saved_user, saved_account, test_account_repo
+    ):
+        account_id = saved_account.id.as_generic_type()
+
+        response = await client.put(
+            url=f"/api/v1/users/{saved_user.id.as_generic_type()}/accounts/balances",
+            json={
+                "balances": [{"accountId": account_id, "actualBalance": 123.45}],
+                "isMonthlyClosing": True,
+            },
+        )
+
+        assert response.status_code == 200
+        (result,) = response.json()["detail"]
+        assert result["accountId"] == account_id
+        assert result["balance"] == 123.45
+        assert result["updated"]
+
+        exists_account = await test_account_repo.get_by_id(
+            user_id=saved_account.user_id.as_generic_type(), account_id=account_id
+        )
+        assert exists_account.balance == Money(123.45)
+
+    async def test_update_accounts_balances_duplicates(
+        self, client, saved_user, saved_account
+    ):
+        account_id = saved_account.id.as_generic_type()
+
+        response = await client.put(
+            url=f"/api/v1/users/{saved_user.id.as_generic_type()}/accounts/balances",
+            json={
+                "balances": [
+                    {"accountId": account_id, "actualBalance": 1},
+                    {"accountId": account_id, "actualBalance": 2},
+                ]
+            },
+        )
+
+        assert response.status_code == 422
+
+    async def test_update_accounts_balances_not_found(
+        self, client, faker: Faker, saved_user, saved_account
+    ):
+        response = await client.put(
+            url=f"/api/v1/users/{saved_user.id.as_generic_type()}/accounts/balances",
+            json={
+                "balances": [
+                    {
+                        "accountId": saved_account.id.as_generic_type(),
+                        "actualBalance": 1,
+                    },
+                    {"accountId": faker.uuid4(), "actualBalance": 2},
+                ]
+            },
+        )
+
+        assert response.status_code == 404
+
+    async def test_queries_per_request(self, client, saved_user, saved_account):
+        """Пользователь и счёт загружаются из БД по одному разу за запрос"""
+
+        url = (
+            f"/api/v1/users/{saved_user.id.as_generic_type()}/accounts"
+            f"/{saved_account.id.as_generic_type()}"
+        )
+
+        response = await client.get(url)
+        assert response.status_code == 200
+        assert response.headers["X-DB-Queries"] == "2"
+
+        # Счёт уже в кэше - из БД только пользователь
+        response = await client.get(url)
+        assert response.headers["X-DB-Queries"] == "1"
+
+    @pytest.mark.parametrize("endpoint", ["balance", "balances", "delete"])
+    async def test_queries_per_write_request(
+        self, client, saved_user, saved_account, endpoint
+    ):
+        """
+        Изменение счёта: пользователь, счёт (или прежние балансы), запись
+        и ещё один запрос (событие в outbox или счётчик счетов пользователя)
+        """
+
+        account_id = saved_account.id.as_generic_type()
+        url = f"/api/v1/users/{saved_user.id.as_generic_type()}/accounts"
+        method, url, body = {
+            "balance": ("PUT", f"{url}/{account_id}/balance", {"actualBalance": 500}),
+            "balances": (
+                "PUT",
+                f"{url}/balances",
+                {"balances": [{"accountId": account_id, "actualBalance": 500}]},
+            ),
+            "delete": ("DELETE", f"{url}/{account_id}", None),
+        }[endpoint]
+
+        response = await client.request(method, url, json=body)
+
+        assert response.status_code == 200
+        assert response.headers["X-DB-Queries"] == "4"
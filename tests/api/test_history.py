@@ -1,3 +1,20 @@
+import csv
+import io
+from datetime import datetime, timezone, timedelta
+
+import orjson
+import pytest
+from sqlalchemy import event
+
+from core.settings import settings
+from domain.accounts.entity import Account
+from domain.accounts.values import AccountCurrency, AccountType
+from domain.histories.commands import SaveHistoryCommand
+from domain.histories.entities import History
+from domain.histories.service import HistoryService
+from domain.users.entity import User
+from domain.values import Money, Title
+
 # @pytest.mark.asyncio
 # @pytest.mark.api
 # class TestHistoryApi:
@@ -39,3 +56,452 @@
 #         assert response.status_code == 200
 #         print(response.json())
 #         print(self.history)
+
+
+@pytest.mark.asyncio
+@pytest.mark.history
+@pytest.mark.api
+class TestHistoryExportApi:
+
+    @pytest.fixture
+    async def saved_histories(self, saved_account, test_history_repo) -> list[History]:
+        now = datetime.now(timezone.utc)
+        histories = [
+            History(
+                account_id=saved_account.id,
+                balance=Money(100 + i),
+                delta=1,
+                is_monthly_closing=i == 2,
+                created_at=now - timedelta(days=1000 - i),
+            )
+            for i in range(5)
+        ]
+        for history in histories:
+            await test_history_repo.save(history)
+        return histories
+
+    def url(self, account) -> str:
+        return (
+            f"/api/v1/users/{account.user_id.as_generic_type()}"
+            f"/accounts/{account.id.as_generic_type()}/history/export"
+        )
+
+    async def test_export_ndjson(self, client, saved_account, saved_histories):
+        response = await client.get(self.url(saved_account))
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+
+        rows = [orjson.loads(line) for line in response.text.splitlines()]
+        assert [row["id"] for row in rows] == [
+            history.id.as_generic_type() for history in saved_histories
+        ]
+        assert rows[2]["isMonthlyClosing"] is True
+        assert rows[0]["balance"] == 100
+
+    async def test_export_csv_since(self, client, saved_account, saved_histories):
+        response = await client.get(
+            self.url(saved_account),
+            params={
+                "format": "csv",
+                "since": saved_histories[2].created_at.isoformat(),
+            },
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert [row["id"] for row in rows] == [
+            history.id.as_generic_type() for history in saved_histories[3:]
+        ]
+        assert (
+            datetime.fromisoformat(rows[-1]["createdAt"])
+            == saved_histories[-1].created_at
+        )
+
+    async def test_export_resume_same_date(
+        self, client, saved_account, test_history_repo
+    ):
+        """Продолжение выгрузки не пропускает записи с той же датой"""
+
+        created_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for i in range(4):
+            await test_history_repo.save(
+                History(
+                    account_id=saved_account.id,
+                    balance=Money(100 + i),
+                    delta=1,
+                    is_monthly_closing=False,
+                    created_at=created_at + timedelta(days=i // 2),
+                )
+            )
+
+        response = await client.get(self.url(saved_account))
+        rows = [orjson.loads(line) for line in response.text.splitlines()]
+
+        response = await client.get(
+            self.url(saved_account),
+            params={"since": rows[0]["createdAt"], "afterId": rows[0]["id"]},
+        )
+
+        assert response.status_code == 200
+        resumed = [orjson.loads(line) for line in response.text.splitlines()]
+        assert [row["id"] for row in resumed] == [row["id"] for row in rows[1:]]
+
+    async def test_import_ndjson(self, client, saved_account, saved_histories):
+        """Выгрузка счёта загружается обратно в том же формате"""
+
+        exported = await client.get(self.url(saved_account))
+        response = await client.post(
+            self.url(saved_account).replace("/export", "/import"),
+            content=exported.content,
+        )
+
+        assert response.status_code == 201
+        assert response.json()["detail"] == {
+            "imported": len(saved_histories),
+            "balance": 104,
+        }
+
+
+@pytest.mark.asyncio
+@pytest.mark.history
+@pytest.mark.api
+class TestHistoryAnalyticsApi:
+
+    async def test_analytics(self, client, saved_account, test_history_repo):
+        now = datetime.now(timezone.utc)
+        for days, balance in ((3, 100), (2, 150), (1, 120)):
+            await test_history_repo.save(
+                History(
+                    account_id=saved_account.id,
+                    balance=Money(balance),
+                    delta=0,
+                    is_monthly_closing=False,
+                    created_at=now - timedelta(days=days),
+                )
+            )
+
+        response = await client.get(
+            f"/api/v1/users/{saved_account.user_id.as_generic_type()}"
+            f"/accounts/{saved_account.id.as_generic_type()}/history/analytics",
+            params={"interval": "1Month"},
+        )
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["metadata"]["period"] == "days"
+        assert body["detail"]["points"] == 3
+        assert body["detail"]["totalReturn"] == pytest.approx(0.2)
+        assert body["detail"]["maxDrawdown"] == pytest.approx(0.2)
+        assert body["detail"]["bestBucket"]["return"] == pytest.approx(0.5)
+
+
+@pytest.mark.asyncio
+@pytest.mark.history
+@pytest.mark.api
+class TestHistoryRecordsApi:
+
+    @pytest.fixture
+    async def saved_histories(self, saved_account, test_history_repo) -> list[History]:
+        created_at = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        histories = [
+            History(
+                account_id=saved_account.id,
+                balance=Money(100 + i),
+                delta=1,
+                is_monthly_closing=i % 3 == 0,
+                # Пары записей с одинаковой датой - курсор различает их по id
+                created_at=created_at + timedelta(days=i // 2),
+            )
+            for i in range(7)
+        ]
+        for history in histories:
+            await test_history_repo.save(history)
+        return sorted(
+            histories,
+            key=lambda h: (h.created_at, h.id.as_generic_type()),
+            reverse=True,
+        )
+
+    def url(self, account) -> str:
+        return (
+            f"/api/v1/users/{account.user_id.as_generic_type()}"
+            f"/accounts/{account.id.as_generic_type()}/history/records"
+        )
+
+    async def test_pages(self, client, saved_account, saved_histories):
+        ids, cursor = [], None
+        while True:
+            params = {"limit": 3} | ({"cursor": cursor} if cursor else {})
+            response = await client.get(self.url(saved_account), params=params)
+            assert response.status_code == 200
+
+            body = response.json()
+            ids += [row["id"] for row in body["detail"]]
+            if not (cursor := body["metadata"]["nextCursor"]):
+                break
+
+        assert ids == [h.id.as_generic_type() for h in saved_histories]
+
+    async def test_filters(self, client, saved_account, saved_histories):
+        response = await client.get(
+            self.url(saved_account),
+            params={
+                "isMonthlyClosing": True,
+                "dateFrom": datetime(2026, 1, 2, tzinfo=timezone.utc).isoformat(),
+            },
+        )
+
+        assert response.status_code == 200
+        assert [row["balance"] for row in response.json()["detail"]] == [106, 103]
+        assert response.json()["metadata"]["nextCursor"] is None
+
+    async def test_invalid_cursor(self, client, saved_account):
+        response = await client.get(self.url(saved_account), params={"cursor": "abc"})
+
+        assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+@pytest.mark.history
+@pytest.mark.api
+class TestAccountsHistoryApi:
+
+    @pytest.fixture
+    async def saved_accounts(
+        self, saved_user, test_user_repo, test_account_repo, test_history_repo
+    ) -> list[Account]:
+        other_user = User(name="user-456")
+        await test_user_repo.save(other_user)
+
+        now = datetime.now(timezone.utc)
+        accounts = []
+        for i, user in enumerate((saved_user, saved_user, saved_user, other_user)):
+            account = Account.create(
+                user_id=user.id,
+                name=Title(f"Account {i}"),
+                currency=AccountCurrency.RUB,
+                account_type=AccountType.CARD,
+                balance=Money(100),
+            )
+            await test_account_repo.save(account)
+            accounts.append(account)
+
+            for days in range(i + 1):
+                await test_history_repo.save(
+                    History(
+                        account_id=account.id,
+                        balance=Money(100 + days),
+                        delta=1,
+                        is_monthly_closing=False,
+                        created_at=now - timedelta(days=days),
+                    )
+                )
+        return accounts
+
+    def url(self, user) -> str:
+        return f"/api/v1/users/{user.id.as_generic_type()}/history"
+
+    async def test_all_accounts(self, client, saved_user, saved_accounts):
+        response = await client.get(self.url(saved_user), params={"interval": "1Week"})
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["metadata"]["period"] == "hours"
+        assert {row["accountId"]: len(row["history"]) for row in body["detail"]} == {
+            account.id.as_generic_type(): i + 1
+            for i, account in enumerate(saved_accounts[:3])
+        }
+
+    async def test_selected_accounts(
+        self, client, saved_user, saved_accounts, test_session
+    ):
+        """Выбранные счета одним запросом, чужой счёт отбрасывается"""
+
+        account_ids = [
+            saved_accounts[0].id.as_generic_type(),
+            saved_accounts[2].id.as_generic_type(),
+            saved_accounts[3].id.as_generic_type(),
+        ]
+
+        statements = []
+
+        def count_statement(conn, cursor, statement, *args):
+            if "accounts_history_" in statement:
+                statements.append(statement)
+
+        engine = test_session.bind.sync_engine
+        event.listen(engine, "before_cursor_execute", count_statement)
+        try:
+            response = await client.get(
+                self.url(saved_user),
+                params={"interval": "1Month", "account_ids": account_ids},
+            )
+        finally:
+            event.remove(engine, "before_cursor_execute", count_statement)
+
+        assert response.status_code == 200
+        assert len(statements) == 1
+        assert [row["accountId"] for row in response.json()["detail"]] == sorted(
+            account_ids[:2]
+        )
+
+
+@pytest.mark.asyncio
+@pytest.mark.history
+@pytest.mark.api
+class TestHistoryCacheApi:
+
+    def url(self, account, path: str = "") -> str:
+        return (
+            f"/api/v1/users/{account.user_id.as_generic_type()}"
+            f"/accounts/{account.id.as_generic_type()}/history{path}"
+        )
+
+    async def save(self, service, account, balance: int) -> None:
+        await service.save_account_history(
+            command=SaveHistoryCommand(
+                user_id=account.user_id.as_generic_type(),
+                account_id=account.id.as_generic_type(),
+                balance=balance,
+                delta=0,
+                is_monthly_closing=False,
+            )
+        )
+
+    async def test_hit_skips_history_queries(
+        self, client, saved_account, test_history_repo, test_history_cache, test_session
+    ):
+        service = HistoryService(test_history_repo, test_history_cache)
+        await self.save(service, saved_account, 100)
+
+        first = await client.get(self.url(saved_account), params={"interval": "1Day"})
+
+        statements = []
+
+        def count_statement(conn, cursor, statement, *args):
+            if "accounts_history" in statement:
+                statements.append(statement)
+
+        engine = test_session.bind.sync_engine
+        event.listen(engine, "before_cursor_execute", count_statement)
+        try:
+            second = await client.get(
+                self.url(saved_account), params={"interval": "1Day"}
+            )
+        finally:
+            event.remove(engine, "before_cursor_execute", count_statement)
+
+        assert first.status_code == second.status_code == 200
+        assert first.content == second.content
+        assert first.json()["metadata"]["period"] == "minutes"
+        assert statements == []
+
+    async def test_new_history_invalidates(
+        self, client, saved_account, test_history_repo, test_history_cache
+    ):
+        service = HistoryService(test_history_repo, test_history_cache)
+        await self.save(service, saved_account, 100)
+
+        profit = await client.get(
+            self.url(saved_account, "/profit"), params={"interval": "1Day"}
+        )
+        assert profit.json()["detail"]["lastBalance"] == 100
+
+        await self.save(service, saved_account, 150)
+
+        profit = await client.get(
+            self.url(saved_account, "/profit"), params={"interval": "1Day"}
+        )
+        assert profit.json()["detail"]["lastBalance"] == 150
+        assert profit.json()["detail"]["amountProfit"] == 50
+
+
+@pytest.mark.asyncio
+@pytest.mark.history
+@pytest.mark.api
+class TestInProcessHistoryApi:
+
+    async def test_history_visible_after_update(
+        self, client, saved_account, monkeypatch
+    ):
+        """История пишется в транзакции обновления баланса и видна сразу"""
+
+        monkeypatch.setattr(settings.history_writer, "mode", "in_process")
+        user_id = saved_account.user_id.as_generic_type()
+        account_id = saved_account.id.as_generic_type()
+
+        response = await client.put(
+            url=f"/api/v1/users/{user_id}/accounts/balances",
+            json={
+                "balances": [{"accountId": account_id, "actualBalance": 123.45}],
+                "isMonthlyClosing": True,
+            },
+        )
+        assert response.status_code == 200
+
+        response = await client.get(
+            f"/api/v1/users/{user_id}/accounts/{account_id}/history/records"
+        )
+        assert response.status_code == 200
+        (row,) = response.json()["detail"]
+        assert row["balance"] == 123.45
+        assert row["isMonthlyClosing"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.history
+@pytest.mark.api
+class TestHistoryQueriesApi:
+
+    @pytest.fixture(autouse=True)
+    async def saved_histories(self, saved_account, test_history_repo) -> None:
+        now = datetime.now(timezone.utc)
+        for days, balance in ((3, 100), (2, 150), (1, 120)):
+            await test_history_repo.save(
+                History(
+                    account_id=saved_account.id,
+                    balance=Money(balance),
+                    delta=0,
+                    is_monthly_closing=False,
+                    created_at=now - timedelta(days=days),
+                )
+            )
+
+    @pytest.mark.parametrize(
+        "path, params, queries",
+        [
+            ("", {"interval": "1Month"}, 3),
+            ("/records", {}, 3),
+            ("/profit", {"interval": "1Month"}, 3),
+            ("/analytics", {"interval": "1Month"}, 3),
+            # Записи выгрузки читаются уже после отправки заголовков
+            ("/export", {}, 2),
+        ],
+    )
+    async def test_queries_per_request(
+        self, client, saved_account, path, params, queries
+    ):
+        """Пользователь и счёт загружаются по одному разу, история - одним запросом"""
+
+        response = await client.get(
+            f"/api/v1/users/{saved_account.user_id.as_generic_type()}"
+            f"/accounts/{saved_account.id.as_generic_type()}/history{path}",
+            params=params,
+        )
+
+        assert response.status_code == 200
+        assert response.headers["X-DB-Queries"] == str(queries)
+
+    async def test_user_history_queries(self, client, saved_account):
+        """История счетов пользователя: пользователь и агрегаты всех счетов"""
+
+        response = await client.get(
+            f"/api/v1/users/{saved_account.user_id.as_generic_type()}/history",
+            params={"interval": "1Month"},
+        )
+
+        assert response.status_code == 200
+        assert response.headers["X-DB-Queries"] == "2"
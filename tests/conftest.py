@@ -22,7 +22,7 @@ async def setup_db():
         await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
 
-        yield
+    yield
 
 
 @pytest.fixture
@@ -4,6 +4,8 @@ __all__ = (
     "test_account_repo",
     "test_account_publisher",
     "test_account_service",
+    "test_cached_account_service",
+    "test_unit_of_work",
     "saved_account",
     # Цели
     "test_goal",
@@ -17,6 +19,10 @@ __all__ = (
     "test_history",
     "test_history_repo",
     "test_history_service",
+    # Кэш
+    "test_redis",
+    "test_history_cache",
+    "test_account_cache",
 )
 
 from .accounts import (
@@ -25,7 +31,10 @@ from .accounts import (
     test_account_repo,
     test_account_publisher,
     test_account_service,
+    test_cached_account_service,
+    test_unit_of_work,
 )
+from .cache import test_redis, test_history_cache, test_account_cache
 from .goals import test_goal, test_goal_repo, test_goal_service
 from .histories import test_history, test_history_repo, test_history_service
 from .users import test_user, saved_user, test_user_repo
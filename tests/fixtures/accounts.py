@@ -13,6 +13,7 @@ from domain.accounts.values import AccountCurrency, AccountType
 from domain.values import Money, Title
 from infra.publishers.accounts import AccountTaskiqPublisher
 from infra.repositories.accounts import SQLAlchemyAccountRepository
+from infra.uow import SQLAlchemyUnitOfWork
 
 
 @pytest.fixture
@@ -41,11 +42,33 @@ async def saved_account(test_account, saved_user, test_account_repo) -> Account:
 def test_account_publisher() -> AccountEventPublisherProtocol:
     publisher = AccountTaskiqPublisher()
     publisher.publish = AsyncMock(return_value=None)
+    publisher.publish_many = AsyncMock(return_value=None)
     return publisher
 
 
 @pytest.fixture
-def test_account_service(test_account_repo, test_account_publisher) -> AccountService:
+def test_unit_of_work(test_session) -> SQLAlchemyUnitOfWork:
+    return SQLAlchemyUnitOfWork(test_session)
+
+
+@pytest.fixture
+def test_account_service(
+    test_account_repo, test_account_publisher, test_unit_of_work
+) -> AccountService:
+    return AccountService(
+        account_repo=test_account_repo,
+        account_publisher=test_account_publisher,
+        unit_of_work=test_unit_of_work,
+    )
+
+
+@pytest.fixture
+def test_cached_account_service(
+    test_account_repo, test_account_publisher, test_unit_of_work, test_account_cache
+) -> AccountService:
     return AccountService(
-        account_repo=test_account_repo, account_publisher=test_account_publisher
+        account_repo=test_account_repo,
+        account_publisher=test_account_publisher,
+        unit_of_work=test_unit_of_work,
+        account_cache=test_account_cache,
     )
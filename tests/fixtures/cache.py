@@ -0,0 +1,27 @@
+import pytest
+from fakeredis import FakeAsyncRedis
+from redis.asyncio import Redis
+
+from domain.accounts.cache import AccountCacheProtocol
+from domain.histories.cache import HistoryCacheProtocol
+from infra.cache.accounts import RedisAccountCache
+from infra.cache.histories import RedisHistoryCache
+from infra.cache.stats import CacheStats
+
+
+@pytest.fixture
+async def test_redis() -> Redis:
+    redis = FakeAsyncRedis()
+    yield redis
+    await redis.flushall()
+    await redis.aclose()
+
+
+@pytest.fixture
+def test_history_cache(test_redis) -> HistoryCacheProtocol:
+    return RedisHistoryCache(test_redis)
+
+
+@pytest.fixture
+def test_account_cache(test_redis) -> AccountCacheProtocol:
+    return RedisAccountCache(test_redis, stats=CacheStats())
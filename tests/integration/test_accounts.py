@@ -1,12 +1,36 @@
+import asyncio
 from copy import copy
-from unittest.mock import AsyncMock
+from decimal import Decimal
+from unittest.mock import AsyncMock, patch
 
 import pytest
 from faker.proxy import Faker
+from sqlalchemy import select, update
 
-from domain.accounts.commands import CreateAccountCommand, UpdateAccountBalanceCommand
-from domain.accounts.exceptions import AccountAlreadyCreatedException
+from domain.accounts.commands import (
+    CreateAccountCommand,
+    UpdateAccountBalanceCommand,
+    UpdateAccountsBalancesCommand,
+    GetAccountCommand,
+)
+from domain.accounts.exceptions import (
+    AccountAlreadyCreatedException,
+    AccountNotFoundException,
+    AccountBalanceConflictException,
+    TooManyAccountsForUserException,
+)
+from domain.accounts.entity import Account
+from domain.accounts.values import AccountType, AccountCurrency
+from domain.users.entity import User
 from domain.values import Title, Money
+from domain.accounts.events import BalanceUpdatedEvent
+from domain.accounts.service import AccountService
+from infra import db_helper
+from infra.identity import request_scope
+from infra.models import AccountModel, OutboxModel, UserModel
+from infra.publishers.outbox import OutboxPublisher, OutboxRelay
+from infra.repositories.outbox import SQLAlchemyOutboxRepository
+from infra.repositories.accounts import BALANCE_UPDATE_ATTEMPTS
 
 
 @pytest.mark.asyncio
@@ -120,3 +144,641 @@ class TestAccountService:
         )
 
         assert exists_account.balance == test_account.balance
+
+    async def test_update_delta_from_database(
+        self,
+        saved_account,
+        test_account_repo,
+        test_account_cache,
+        test_account_publisher: AsyncMock,
+        test_cached_account_service,
+    ):
+        """Изменение баланса считается по значению из БД, а не по устаревшему кэшу"""
+
+        stale = copy(saved_account)
+        stale.balance = Money(1)
+        await test_account_cache.set(stale)
+
+        new_balance = saved_account.balance.as_generic_type() + 100
+        await test_cached_account_service.update_balance(
+            command=UpdateAccountBalanceCommand(
+                user_id=saved_account.user_id.as_generic_type(),
+                account_id=saved_account.id.as_generic_type(),
+                new_balance=float(new_balance),
+            )
+        )
+
+        event = test_account_publisher.publish.await_args.args[0]
+        assert event.delta == Decimal("100.00")
+        assert await test_account_cache.get(saved_account.id) is None
+
+    async def test_update_not_found(self, faker: Faker, test_account_service):
+        with pytest.raises(AccountNotFoundException):
+            await test_account_service.update_balance(
+                command=UpdateAccountBalanceCommand(
+                    user_id=faker.uuid4(),
+                    account_id=faker.uuid4(),
+                    new_balance=100,
+                )
+            )
+
+
+@pytest.mark.asyncio
+@pytest.mark.accounts
+@pytest.mark.integration
+class TestAccountCreation:
+
+    @staticmethod
+    async def accounts_count(session, user_id: str) -> int:
+        return await session.scalar(
+            select(UserModel.accounts_count).filter_by(id=user_id)
+        )
+
+    async def test_accounts_limit(
+        self, saved_user, test_account_repo, test_account_service
+    ):
+        """Счёт сверх лимита не создаётся, счётчик пользователя не меняется"""
+
+        user_id = saved_user.id.as_generic_type()
+        for i in range(User.MAX_ACCOUNTS):
+            await test_account_service.create_account(
+                command=CreateAccountCommand(
+                    user_id=user_id,
+                    name=f"Account {i}",
+                    balance=0,
+                    account_type=AccountType.CARD,
+                    currency=AccountCurrency.RUB,
+                )
+            )
+
+        with pytest.raises(TooManyAccountsForUserException):
+            await test_account_service.create_account(
+                command=CreateAccountCommand(
+                    user_id=user_id,
+                    name="Account extra",
+                    balance=0,
+                    account_type=AccountType.CARD,
+                    currency=AccountCurrency.RUB,
+                )
+            )
+
+        session = test_account_repo._session
+        assert len(await test_account_repo.get_by_user_id(user_id)) == User.MAX_ACCOUNTS
+        assert await self.accounts_count(session, user_id) == User.MAX_ACCOUNTS
+
+    async def test_name_taken_keeps_count(
+        self, saved_account, test_account_repo, test_account_service
+    ):
+        user_id = saved_account.user_id.as_generic_type()
+
+        with pytest.raises(AccountAlreadyCreatedException):
+            await test_account_service.create_account(
+                command=CreateAccountCommand(
+                    user_id=user_id,
+                    name=saved_account.name.as_generic_type(),
+                    balance=0,
+                    account_type=AccountType.CARD,
+                    currency=AccountCurrency.RUB,
+                )
+            )
+
+        assert await self.accounts_count(test_account_repo._session, user_id) == 1
+
+    async def test_delete_releases_slot(
+        self, saved_account, test_account_repo, test_account_service
+    ):
+        user_id = saved_account.user_id.as_generic_type()
+
+        await test_account_service.delete_account(
+            command=GetAccountCommand(
+                account_id=saved_account.id.as_generic_type(), user_id=user_id
+            )
+        )
+
+        assert await self.accounts_count(test_account_repo._session, user_id) == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.accounts
+@pytest.mark.integration
+class TestAccountBalanceUpdate:
+
+    async def test_returns_old_balance(self, saved_account, test_account_repo):
+        account, old_balance = await test_account_repo.update_balance(
+            user_id=saved_account.user_id.as_generic_type(),
+            account_id=saved_account.id.as_generic_type(),
+            new_balance=Decimal("500.00"),
+        )
+
+        assert old_balance == saved_account.balance.as_generic_type()
+        assert account.balance == Money(500)
+
+        version = await test_account_repo._session.scalar(
+            select(AccountModel.version).filter_by(
+                id=saved_account.id.as_generic_type()
+            )
+        )
+        assert version == 2
+
+    async def test_retry_on_version_conflict(self, saved_account, test_account_repo):
+        """Строку изменили между чтением и UPDATE - попытка повторяется"""
+
+        user_id = saved_account.user_id.as_generic_type()
+        account_id = saved_account.id.as_generic_type()
+        session = test_account_repo._session
+        execute = session.execute
+        writes = []
+
+        async def concurrent_write_after_read(statement, *args, **kwargs):
+            result = await execute(statement, *args, **kwargs)
+            if statement.is_select and not writes:
+                writes.append(
+                    await execute(
+                        update(AccountModel)
+                        .filter_by(id=account_id)
+                        .values(balance=7, version=AccountModel.version + 1)
+                    )
+                )
+                await session.commit()
+            return result
+
+        with patch.object(session, "execute", side_effect=concurrent_write_after_read):
+            _, old_balance = await test_account_repo.update_balance(
+                user_id, account_id, Decimal(10)
+            )
+
+        assert old_balance == Decimal("7.00")
+
+    async def test_conflict_after_attempts(self, saved_account, test_account_repo):
+        with (
+            patch.object(
+                test_account_repo, "_update_balance_guarded", return_value=None
+            ) as guarded,
+            pytest.raises(AccountBalanceConflictException),
+        ):
+            await test_account_repo.update_balance(
+                saved_account.user_id.as_generic_type(),
+                saved_account.id.as_generic_type(),
+                Decimal(10),
+            )
+
+        assert guarded.await_count == BALANCE_UPDATE_ATTEMPTS
+
+
+@pytest.mark.asyncio
+@pytest.mark.accounts
+@pytest.mark.integration
+class TestAccountBatchBalanceUpdate:
+
+    @pytest.fixture
+    async def saved_accounts(self, saved_user, test_account_repo) -> list[Account]:
+        accounts = [
+            Account.create(
+                user_id=saved_user.id,
+                name=Title(f"Account {i}"),
+                currency=AccountCurrency.RUB,
+                account_type=AccountType.CARD,
+                balance=Money(100 * (i + 1)),
+            )
+            for i in range(3)
+        ]
+        for account in accounts:
+            await test_account_repo.save(account)
+        return accounts
+
+    async def test_update_balances(
+        self, saved_accounts, test_account_repo, test_account_service
+    ):
+        """Изменённые счета публикуются одним вызовом, неизменённые - без события"""
+
+        user_id = saved_accounts[0].user_id.as_generic_type()
+        first, second, third = (a.id.as_generic_type() for a in saved_accounts)
+
+        changes = await test_account_service.update_balances(
+            command=UpdateAccountsBalancesCommand(
+                user_id=user_id,
+                balances={first: 150, second: 200, third: 50.5},
+                is_monthly_closing=True,
+            )
+        )
+
+        assert [change.account_id for change in changes] == [first, second, third]
+        assert [change.old_balance for change in changes] == [100, 200, 300]
+        assert [change.is_changed for change in changes] == [True, False, True]
+
+        accounts = {
+            a.id.as_generic_type(): a
+            for a in await test_account_repo.get_by_user_id(user_id)
+        }
+        assert accounts[first].balance == Money(150)
+        assert accounts[third].balance == Money(50.5)
+
+        test_account_service._publisher.publish_many.assert_awaited_once()
+        (events,) = test_account_service._publisher.publish_many.await_args.args
+        assert [(e.account_id, e.delta) for e in events] == [
+            (first, Decimal(50)),
+            (third, Decimal("-249.50")),
+        ]
+        assert all(e.is_monthly_closing for e in events)
+
+    async def test_missing_account_changes_nothing(
+        self, faker: Faker, saved_accounts, test_account_repo, test_account_service
+    ):
+        """Хотя бы одного счёта нет - не меняется ни один"""
+
+        user_id = saved_accounts[0].user_id.as_generic_type()
+
+        with pytest.raises(AccountNotFoundException):
+            await test_account_service.update_balances(
+                command=UpdateAccountsBalancesCommand(
+                    user_id=user_id,
+                    balances={
+                        saved_accounts[0].id.as_generic_type(): 999,
+                        faker.uuid4(): 1,
+                    },
+                )
+            )
+
+        balances = [a.balance for a in await test_account_repo.get_by_user_id(user_id)]
+        assert sorted(balances, key=lambda m: m.as_generic_type()) == [
+            Money(100),
+            Money(200),
+            Money(300),
+        ]
+        test_account_service._publisher.publish_many.assert_not_awaited()
+
+    async def test_retry_on_version_conflict(self, saved_accounts, test_account_repo):
+        """Один из счетов изменили параллельно - пакет повторяется целиком"""
+
+        user_id = saved_accounts[0].user_id.as_generic_type()
+        account_id = saved_accounts[1].id.as_generic_type()
+        session = test_account_repo._session
+        execute = session.execute
+        writes = []
+
+        async def concurrent_write_after_read(statement, *args, **kwargs):
+            result = await execute(statement, *args, **kwargs)
+            if statement.is_select and not writes:
+                writes.append(
+                    await execute(
+                        update(AccountModel)
+                        .filter_by(id=account_id)
+                        .values(balance=7, version=AccountModel.version + 1)
+                    )
+                )
+                await session.commit()
+            return result
+
+        with patch.object(session, "execute", side_effect=concurrent_write_after_read):
+            results = await test_account_repo.update_balances(
+                user_id,
+                {a.id.as_generic_type(): Decimal(10) for a in saved_accounts},
+            )
+
+        assert [old for _, old in results] == [
+            Decimal("100.00"),
+            Decimal("7.00"),
+            Decimal("300.00"),
+        ]
+        assert all(account.balance == Money(10) for account, _ in results)
+
+
+@pytest.mark.asyncio
+@pytest.mark.accounts
+@pytest.mark.integration
+class TestAccountOutbox:
+
+    @pytest.fixture
+    def outbox_service(
+        self, test_session, test_account_repo, test_unit_of_work
+    ) -> AccountService:
+        return AccountService(
+            account_repo=test_account_repo,
+            account_publisher=OutboxPublisher(SQLAlchemyOutboxRepository(test_session)),
+            unit_of_work=test_unit_of_work,
+        )
+
+    @staticmethod
+    async def outbox_rows(session) -> list[OutboxModel]:
+        return list((await session.scalars(select(OutboxModel))).all())
+
+    async def test_event_written_with_balance(
+        self, saved_account, outbox_service, test_session
+    ):
+        await outbox_service.update_balance(
+            command=UpdateAccountBalanceCommand(
+                user_id=saved_account.user_id.as_generic_type(),
+                account_id=saved_account.id.as_generic_type(),
+                new_balance=500,
+            )
+        )
+
+        (row,) = await self.outbox_rows(test_session)
+        assert row.event_type == BalanceUpdatedEvent.__name__
+        assert row.payload["account_id"] == saved_account.id.as_generic_type()
+        assert row.payload["new_balance"] == "500.00"
+
+    async def test_publish_error_rolls_back_balance(
+        self, saved_account, outbox_service, test_session, test_account_repo
+    ):
+        """Событие не записалось - баланс тоже не меняется"""
+
+        with (
+            patch.object(
+                SQLAlchemyOutboxRepository, "add", side_effect=RuntimeError("outbox")
+            ),
+            pytest.raises(RuntimeError),
+        ):
+            await outbox_service.update_balance(
+                command=UpdateAccountBalanceCommand(
+                    user_id=saved_account.user_id.as_generic_type(),
+                    account_id=saved_account.id.as_generic_type(),
+                    new_balance=500,
+                )
+            )
+
+        account = await test_account_repo.get_by_id(
+            saved_account.user_id.as_generic_type(), saved_account.id.as_generic_type()
+        )
+        assert account.balance == saved_account.balance
+        assert not await self.outbox_rows(test_session)
+
+    async def test_relay_delivers_and_deletes(
+        self, saved_account, outbox_service, test_session
+    ):
+        for balance in (10, 20, 30):
+            await outbox_service.update_balance(
+                command=UpdateAccountBalanceCommand(
+                    user_id=saved_account.user_id.as_generic_type(),
+                    account_id=saved_account.id.as_generic_type(),
+                    new_balance=balance,
+                )
+            )
+
+        handler = AsyncMock()
+        relay = OutboxRelay(db_helper.session_factory, handler, batch_size=2)
+
+        assert await relay.relay_once() == 2
+        assert await relay.relay_once() == 1
+        assert await relay.relay_once() == 0
+
+        delivered = [
+            event.new_balance
+            for call in handler.await_args_list
+            for event in call.args[0]
+        ]
+        assert delivered == [Decimal("10.00"), Decimal("20.00"), Decimal("30.00")]
+        assert not await self.outbox_rows(test_session)
+
+    async def test_relay_keeps_failed_events(
+        self, saved_account, outbox_service, test_session
+    ):
+        """Ошибка обработчика - событие остаётся и отправляется повторно до max_attempts"""
+
+        await outbox_service.update_balance(
+            command=UpdateAccountBalanceCommand(
+                user_id=saved_account.user_id.as_generic_type(),
+                account_id=saved_account.id.as_generic_type(),
+                new_balance=500,
+            )
+        )
+
+        handler = AsyncMock(side_effect=RuntimeError("broker down"))
+        relay = OutboxRelay(db_helper.session_factory, handler, max_attempts=2)
+
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await relay.relay_once()
+        assert await relay.relay_once() == 0
+        assert handler.await_count == 2
+
+        (row,) = await self.outbox_rows(test_session)
+        assert row.attempts == 2
+        assert row.last_error == "broker down"
+
+
+@pytest.mark.asyncio
+@pytest.mark.accounts
+@pytest.mark.integration
+class TestRequestIdentityMap:
+
+    async def test_loaded_once_per_request(
+        self, saved_account, test_account_repo, test_user_repo
+    ):
+        user_id = saved_account.user_id.as_generic_type()
+        account_id = saved_account.id.as_generic_type()
+
+        with request_scope() as scope:
+            first = await test_account_repo.get_by_id(user_id, account_id)
+            second = await test_account_repo.get_by_id(user_id, account_id)
+            await test_user_repo.get_by_id(saved_account.user_id)
+            await test_user_repo.get_by_id(saved_account.user_id)
+
+        assert first is second
+        assert scope.queries == 2
+
+    async def test_other_user_not_served(
+        self, faker: Faker, saved_account, test_account_repo
+    ):
+        user_id = saved_account.user_id.as_generic_type()
+        account_id = saved_account.id.as_generic_type()
+
+        with request_scope() as scope:
+            await test_account_repo.get_by_user_id(user_id)
+            assert await test_account_repo.get_by_id(user_id, account_id)
+            assert not await test_account_repo.get_by_id(faker.uuid4(), account_id)
+
+        assert scope.queries == 1
+
+    async def test_writes_update_map(self, saved_account, test_account_repo):
+        """Изменённый счёт берётся из карты, удалённый - снова из БД"""
+
+        user_id = saved_account.user_id.as_generic_type()
+        account_id = saved_account.id.as_generic_type()
+
+        with request_scope() as scope:
+            await test_account_repo.update_balance(user_id, account_id, Decimal(42))
+            queries = scope.queries
+            account = await test_account_repo.get_by_id(user_id, account_id)
+            assert account.balance == Money(42)
+            assert scope.queries == queries
+
+            await test_account_repo.delete(user_id, account_id)
+            assert not await test_account_repo.get_by_id(user_id, account_id)
+
+    async def test_no_map_outside_request(self, saved_account, test_account_repo):
+        user_id = saved_account.user_id.as_generic_type()
+        account_id = saved_account.id.as_generic_type()
+
+        first = await test_account_repo.get_by_id(user_id, account_id)
+        second = await test_account_repo.get_by_id(user_id, account_id)
+
+        assert first is not second
+
+
+@pytest.mark.asyncio
+@pytest.mark.accounts
+@pytest.mark.integration
+class TestAccountServiceCache:
+
+    async def test_find_read_through(
+        self,
+        saved_account,
+        test_account_repo,
+        test_account_cache,
+        test_cached_account_service,
+    ):
+        """Повторный запрос счёта отдаётся из кэша без обращения к БД"""
+
+        command = GetAccountCommand(
+            account_id=saved_account.id.as_generic_type(),
+            user_id=saved_account.user_id.as_generic_type(),
+        )
+        await test_cached_account_service.find_account_by_id(command=command)
+
+        with patch.object(
+            test_account_repo, "get_by_id", wraps=test_account_repo.get_by_id
+        ) as get_by_id:
+            account = await test_cached_account_service.find_account_by_id(
+                command=command
+            )
+
+        get_by_id.assert_not_awaited()
+        assert account.id == saved_account.id
+        assert account.user_id == saved_account.user_id
+        assert account.balance == saved_account.balance
+        assert account.type == saved_account.type
+        assert (test_account_cache.stats.hits, test_account_cache.stats.misses) == (
+            1,
+            1,
+        )
+
+    async def test_find_cached_for_other_user(
+        self, faker: Faker, saved_account, test_cached_account_service
+    ):
+        """Счёт из кэша не отдаётся чужому пользователю"""
+
+        await test_cached_account_service.find_account_by_id(
+            command=GetAccountCommand(
+                account_id=saved_account.id.as_generic_type(),
+                user_id=saved_account.user_id.as_generic_type(),
+            )
+        )
+
+        with pytest.raises(AccountNotFoundException):
+            await test_cached_account_service.find_account_by_id(
+                command=GetAccountCommand(
+                    account_id=saved_account.id.as_generic_type(),
+                    user_id=faker.uuid4(),
+                )
+            )
+
+    async def test_find_user_accounts_read_through(
+        self, saved_account, test_account_repo, test_cached_account_service
+    ):
+        user_id = saved_account.user_id.as_generic_type()
+        await test_cached_account_service.find_accounts_by_user_id(user_id)
+
+        with patch.object(
+            test_account_repo, "get_by_user_id", wraps=test_account_repo.get_by_user_id
+        ) as get_by_user_id:
+            accounts = await test_cached_account_service.find_accounts_by_user_id(
+                user_id
+            )
+
+        get_by_user_id.assert_not_awaited()
+        assert [account.id for account in accounts] == [saved_account.id]
+
+    async def test_create_not_cached(
+        self, test_account, test_account_cache, test_cached_account_service
+    ):
+        """Созданный счёт попадает в кэш только при чтении"""
+
+        account = await test_cached_account_service.create_account(
+            command=CreateAccountCommand(
+                user_id=test_account.user_id.as_generic_type(),
+                name=test_account.name.as_generic_type(),
+                balance=float(test_account.balance.as_generic_type()),
+                account_type=test_account.type,
+                currency=test_account.currency,
+            )
+        )
+
+        assert await test_account_cache.get(account.id) is None
+
+    async def test_update_invalidates(
+        self,
+        saved_account,
+        test_account_repo,
+        test_account_cache,
+        test_cached_account_service,
+    ):
+        """После обновления баланса кэш счёта и список счетов сброшены"""
+
+        user_id = saved_account.user_id.as_generic_type()
+        command = GetAccountCommand(
+            account_id=saved_account.id.as_generic_type(), user_id=user_id
+        )
+        await test_cached_account_service.find_account_by_id(command=command)
+        await test_cached_account_service.find_accounts_by_user_id(user_id)
+
+        new_balance = Money(saved_account.balance.as_generic_type() + 100)
+        await test_cached_account_service.update_balance(
+            command=UpdateAccountBalanceCommand(
+                user_id=user_id,
+                account_id=saved_account.id.as_generic_type(),
+                new_balance=float(new_balance.as_generic_type()),
+            )
+        )
+
+        assert await test_account_cache.get(saved_account.id) is None
+        assert await test_account_cache.get_user_accounts(saved_account.user_id) is None
+
+        account = await test_cached_account_service.find_account_by_id(command=command)
+        assert account.balance == new_balance
+        assert (await test_account_cache.get(saved_account.id)).balance == new_balance
+
+    async def test_delete_invalidates(
+        self, saved_account, test_account_cache, test_cached_account_service
+    ):
+        command = GetAccountCommand(
+            account_id=saved_account.id.as_generic_type(),
+            user_id=saved_account.user_id.as_generic_type(),
+        )
+        await test_cached_account_service.find_account_by_id(command=command)
+
+        await test_cached_account_service.delete_account(command=command)
+
+        assert await test_account_cache.get(saved_account.id) is None
+        with pytest.raises(AccountNotFoundException):
+            await test_cached_account_service.find_account_by_id(command=command)
+
+    async def test_concurrent_misses_single_query(
+        self, saved_account, test_account_repo, test_cached_account_service
+    ):
+        """Одновременные промахи по одному счёту дают один запрос в БД"""
+
+        get_by_id = test_account_repo.get_by_id
+
+        async def slow_get_by_id(**kwargs):
+            await asyncio.sleep(0.05)
+            return await get_by_id(**kwargs)
+
+        command = GetAccountCommand(
+            account_id=saved_account.id.as_generic_type(),
+            user_id=saved_account.user_id.as_generic_type(),
+        )
+        with patch.object(
+            test_account_repo, "get_by_id", side_effect=slow_get_by_id
+        ) as mocked:
+            accounts = await asyncio.gather(
+                *(
+                    test_cached_account_service.find_account_by_id(command=command)
+                    for _ in range(20)
+                )
+            )
+
+        assert mocked.await_count == 1
+        assert {account.id for account in accounts} == {saved_account.id}
+        # Каждый запрос получает свою копию сущности
+        assert len({id(account) for account in accounts}) == 20
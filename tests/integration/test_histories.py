@@ -1,9 +1,43 @@
-from unittest.mock import AsyncMock
+import asyncio
+from datetime import datetime, timezone, timedelta
+from decimal import Decimal
+from unittest.mock import AsyncMock, patch
 
 import pytest
+from sqlalchemy import select, event
+from sqlalchemy.dialects import postgresql
 
 from domain.accounts.commands import UpdateAccountBalanceCommand
-from domain.histories.commands import SaveHistoryCommand
+from domain.accounts.service import AccountService
+from domain.accounts.events import BalanceUpdatedEvent
+from domain.accounts.entity import Account
+from domain.accounts.values import AccountType, AccountCurrency
+from domain.histories.commands import (
+    SaveHistoryCommand,
+    GetAccountHistoryCommand,
+    ImportAccountHistoryCommand,
+    CompactHistoryCommand,
+)
+from domain.histories.entities import History
+from domain.histories.exceptions import (
+    HistoryNotExistsException,
+    InvalidHistoryImportException,
+)
+from domain.histories.values import (
+    HistoryPeriod,
+    HistoryInterval,
+    HistoryExportFormat,
+    CompactionTier,
+    HistoryCursor,
+)
+from domain.histories.service import HistoryService
+from domain.values import Money, Title
+from infra.models import ROLLUP_MODELS, HistoryModel
+from infra import broker
+from infra.batching import BatchWriter
+from infra.publishers.histories import InProcessHistoryPublisher
+from infra.repositories.histories import SQLAlchemyHistoryRepository
+from infra.tasks import accounts as account_tasks
 
 
 @pytest.mark.asyncio
@@ -57,3 +91,839 @@ class TestHistoryService:
         # assert len(exists_acc.events) > 1
 
         test_account_publisher.publish.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+@pytest.mark.history
+@pytest.mark.integration
+class TestHistoryBatchWriter:
+
+    async def test_tasks_written_in_one_batch(
+        self, saved_account, test_redis, test_session
+    ):
+        """Одновременные задачи сохранения истории пишутся одной вставкой"""
+
+        write = AsyncMock(side_effect=account_tasks.write_history_batch)
+        events = [
+            BalanceUpdatedEvent(
+                user_id=saved_account.user_id.as_generic_type(),
+                account_id=saved_account.id.as_generic_type(),
+                new_balance=Decimal(100 + i),
+                delta=Decimal(1),
+                is_monthly_closing=False,
+            )
+            for i in range(5)
+        ]
+
+        with (
+            patch.object(
+                account_tasks,
+                "history_writer",
+                BatchWriter(write, max_size=len(events), max_delay=1),
+            ),
+            patch.object(account_tasks, "get_redis_client", return_value=test_redis),
+        ):
+            tasks = [
+                await account_tasks.save_account_history.kiq(event) for event in events
+            ]
+            await broker.wait_all()
+
+        # Задачи «выполнить и забыть»: результат в result backend не пишется
+        assert not any([await task.is_ready() for task in tasks])
+
+        (commands,) = write.await_args.args
+        assert len(commands) == len(events)
+
+        rows = (
+            await test_session.scalars(
+                select(HistoryModel).filter_by(
+                    account_id=saved_account.id.as_generic_type()
+                )
+            )
+        ).all()
+        assert len(rows) == len(events)
+
+
+@pytest.mark.asyncio
+@pytest.mark.history
+@pytest.mark.integration
+class TestHistoryRollups:
+
+    @pytest.fixture
+    async def saved_histories(self, saved_account, test_history_repo) -> list[History]:
+        now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+        histories = [
+            History(
+                account_id=saved_account.id,
+                balance=Money(balance),
+                delta=delta,
+                is_monthly_closing=is_closing,
+                created_at=now - offset,
+            )
+            for balance, delta, is_closing, offset in (
+                (100, 0, False, timedelta(minutes=5, seconds=30)),
+                (150, 50, True, timedelta(minutes=5, seconds=10)),
+                (120, -30, False, timedelta(minutes=2)),
+                (200, 80, False, timedelta(seconds=1)),
+            )
+        ]
+        # Сохраняем не по порядку, агрегат должен брать баланс последней записи
+        for history in reversed(histories):
+            await test_history_repo.save(history)
+        return histories
+
+    async def test_rollups_updated_on_save(
+        self, saved_account, saved_histories, test_session
+    ):
+        """Агрегаты обновляются при сохранении каждой записи"""
+
+        rows = (
+            await test_session.scalars(
+                select(ROLLUP_MODELS[HistoryPeriod.MINUTES])
+                .filter_by(account_id=saved_account.id.as_generic_type())
+                .order_by("bucket")
+            )
+        ).all()
+
+        assert [row.balance for row in rows] == [150, 120, 200]
+        assert [row.delta for row in rows] == [50, -30, 80]
+        assert [row.is_monthly_closing for row in rows] == [True, False, False]
+
+        (year,) = (
+            await test_session.scalars(
+                select(ROLLUP_MODELS[HistoryPeriod.YEARS]).filter_by(
+                    account_id=saved_account.id.as_generic_type()
+                )
+            )
+        ).all()
+        assert year.balance == 200
+        assert year.delta == 100
+        assert year.is_monthly_closing
+
+    async def test_save_many_rollups(
+        self, saved_account, saved_histories, test_history_repo, test_session
+    ):
+        """
+        Пакет записей одного периода сворачивается в одну строку агрегата,
+        более ранние записи не перезаписывают баланс
+        """
+
+        now = saved_histories[-1].created_at
+        ids = await test_history_repo.save_many(
+            [
+                History(
+                    account_id=saved_account.id,
+                    balance=Money(balance),
+                    delta=delta,
+                    is_monthly_closing=False,
+                    created_at=now + timedelta(seconds=offset),
+                )
+                for balance, delta, offset in ((210, 10, -10), (190, -20, -20))
+            ]
+        )
+        assert len(ids) == 2
+
+        rows = (
+            await test_session.scalars(
+                select(ROLLUP_MODELS[HistoryPeriod.MINUTES])
+                .filter_by(account_id=saved_account.id.as_generic_type())
+                .order_by("bucket")
+            )
+        ).all()
+        assert rows[-1].balance == 200
+        assert rows[-1].delta == 70
+
+    async def test_account_history_from_rollups(
+        self, saved_account, saved_histories, test_history_service
+    ):
+        """График строится по агрегатам периода"""
+
+        history = await test_history_service.get_account_history(
+            command=GetAccountHistoryCommand(
+                user_id=saved_account.user_id.as_generic_type(),
+                account_id=saved_account.id.as_generic_type(),
+                interval=HistoryInterval.DAY,
+            )
+        )
+
+        assert [row.balance for row in history] == [Money(150), Money(120), Money(200)]
+        assert history[-1].created_at == saved_histories[-1].created_at
+        assert test_history_service.metadata["period"] == HistoryPeriod.MINUTES
+
+    async def test_rebuild_rollups(
+        self, saved_account, saved_histories, test_history_repo
+    ):
+        """Пересчёт агрегатов совпадает с инкрементальным обновлением"""
+
+        account_id = saved_account.id.as_generic_type()
+        start_date = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+        before = {
+            period: await test_history_repo.get_history_from_rollups(
+                account_id=account_id, period=period, start_date=start_date
+            )
+            for period in HistoryPeriod
+        }
+
+        assert await test_history_repo.rebuild_rollups(account_id) == 4
+
+        for period in HistoryPeriod:
+            after = await test_history_repo.get_history_from_rollups(
+                account_id=account_id, period=period, start_date=start_date
+            )
+            assert [
+                (row.balance, row.delta, row.is_monthly_closing, row.created_at)
+                for row in after
+            ] == [
+                (row.balance, row.delta, row.is_monthly_closing, row.created_at)
+                for row in before[period]
+            ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.history
+@pytest.mark.integration
+class TestHistoryLinkedToPeriod:
+
+    @pytest.fixture
+    async def other_account(self, saved_user, test_account_repo) -> Account:
+        account = Account.create(
+            user_id=saved_user.id,
+            name=Title("Другой счет"),
+            balance=Money(0),
+            account_type=AccountType.CASH,
+            currency=AccountCurrency.RUB,
+        )
+        await test_account_repo.save(account)
+        return account
+
+    async def test_last_row_per_bucket(
+        self, saved_account, other_account, test_history_repo
+    ):
+        """Последняя запись периода, записи других счетов с той же датой не попадают"""
+
+        day = datetime.now(timezone.utc).replace(
+            hour=12, minute=0, second=0, microsecond=0
+        ) - timedelta(days=3)
+
+        for account, balance, created_at in (
+            (saved_account, 100, day),
+            (saved_account, 110, day + timedelta(hours=1)),
+            (other_account, 999, day + timedelta(hours=1)),
+            (other_account, 998, day + timedelta(hours=2)),
+            (saved_account, 120, day + timedelta(days=1)),
+        ):
+            await test_history_repo.save(
+                History(
+                    account_id=account.id,
+                    balance=Money(balance),
+                    is_monthly_closing=False,
+                    created_at=created_at,
+                )
+            )
+
+        history = await test_history_repo.get_history_linked_to_period(
+            account_id=saved_account.id.as_generic_type(),
+            period=HistoryPeriod.DAYS,
+            start_date=day - timedelta(days=1),
+        )
+        assert [row.balance for row in history] == [Money(110), Money(120)]
+        assert all(row.account_id == saved_account.id for row in history)
+
+        (last,) = await test_history_repo.get_history_linked_to_period(
+            account_id=saved_account.id.as_generic_type(),
+            period=HistoryPeriod.DAYS,
+            start_date=day - timedelta(days=1),
+            limit=1,
+            asc=False,
+        )
+        assert last.balance == Money(120)
+
+    async def test_query_uses_account_index(self, test_history_repo, test_session):
+        """План запроса читает диапазон индекса (account_id, created_at) счёта"""
+
+        query = test_history_repo._linked_to_period_query(
+            account_id="acc-123",
+            period=HistoryPeriod.DAYS,
+            start_date=datetime(2026, 1, 1, tzinfo=timezone.utc),
+        )
+        compiled = query.compile(test_session.bind)
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+
+        async with test_session.bind.connect() as conn:
+            res = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)
+            plan = " ".join(row[-1] for row in res.all())
+
+        assert (
+            "SEARCH accounts_history USING INDEX ix_accounts_history_acc_id_created_at"
+            in plan
+        )
+        assert "SCAN accounts_history" not in plan
+
+    async def test_history_page_uses_keyset_index(
+        self, test_history_repo, test_session
+    ):
+        """Страница по курсору читается из индекса без сортировки и OFFSET"""
+
+        captured = []
+
+        def capture(conn, cursor, statement, parameters, *args):
+            captured.append((statement, parameters))
+
+        engine = test_session.bind.sync_engine
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            await test_history_repo.get_history_page(
+                account_id="acc-123",
+                limit=20,
+                cursor=HistoryCursor(
+                    created_at=datetime(2026, 1, 1, tzinfo=timezone.utc), id="h-1"
+                ),
+            )
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+
+        statement, parameters = captured[-1]
+        # SQLite всегда выводит OFFSET, он должен быть нулевым
+        assert parameters[-1] == 0
+
+        async with test_session.bind.connect() as conn:
+            res = await conn.exec_driver_sql(
+                f"EXPLAIN QUERY PLAN {statement}", parameters
+            )
+            plan = " ".join(row[-1] for row in res.all())
+
+        assert "USING INDEX ix_accounts_history_acc_id_created_at_id" in plan
+        assert "TEMP B-TREE" not in plan
+
+    async def test_accounts_history_uses_bucket_index(
+        self, test_history_repo, test_session
+    ):
+        """Несколько счетов - один запрос с поиском по индексу (account_id, bucket)"""
+
+        captured = []
+
+        def capture(conn, cursor, statement, parameters, *args):
+            captured.append((statement, parameters))
+
+        engine = test_session.bind.sync_engine
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            await test_history_repo.get_accounts_history_from_rollups(
+                user_id="user-123",
+                period=HistoryPeriod.DAYS,
+                start_date=datetime(2026, 1, 1, tzinfo=timezone.utc),
+                account_ids=["acc-1", "acc-2", "acc-3"],
+            )
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+
+        assert len(captured) == 1
+        statement, parameters = captured[0]
+        async with test_session.bind.connect() as conn:
+            res = await conn.exec_driver_sql(
+                f"EXPLAIN QUERY PLAN {statement}", parameters
+            )
+            plan = " ".join(row[-1] for row in res.all())
+
+        assert "SEARCH accounts_history_days USING INDEX" in plan
+        assert "(account_id=? AND bucket>?)" in plan
+
+    async def test_postgres_query_uses_distinct_on(self, test_history_repo):
+        """Для Postgres используется DISTINCT ON по началу периода"""
+
+        with patch.object(SQLAlchemyHistoryRepository, "_dialect", "postgresql"):
+            query = test_history_repo._linked_to_period_query(
+                account_id="acc-123",
+                period=HistoryPeriod.WEEKS,
+                start_date=datetime(2026, 1, 1, tzinfo=timezone.utc),
+            )
+
+        sql = str(query.compile(dialect=postgresql.dialect()))
+        assert "DISTINCT ON (date_trunc('weeks', accounts_history.created_at))" in sql
+        assert "row_number" not in sql
+
+
+@pytest.mark.asyncio
+@pytest.mark.history
+@pytest.mark.integration
+class TestHistoryProfit:
+
+    async def test_profit_in_one_query(
+        self, saved_account, test_history_repo, test_history_service, test_session
+    ):
+        """Доход и сводка за интервал считаются одним запросом"""
+
+        now = datetime.now(timezone.utc)
+        for balance, delta, offset in (
+            (200, 0, timedelta(days=20)),
+            (100, -100, timedelta(days=10)),
+            (400, 300, timedelta(days=5)),
+            (300, -100, timedelta(days=1)),
+        ):
+            await test_history_repo.save(
+                History(
+                    account_id=saved_account.id,
+                    balance=Money(balance),
+                    delta=delta,
+                    is_monthly_closing=False,
+                    created_at=now - offset,
+                )
+            )
+
+        statements = []
+
+        def count_statement(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = test_session.bind.sync_engine
+        event.listen(engine, "before_cursor_execute", count_statement)
+        try:
+            profit = await test_history_service.get_history_profit(
+                command=GetAccountHistoryCommand(
+                    user_id=saved_account.user_id.as_generic_type(),
+                    account_id=saved_account.id.as_generic_type(),
+                    interval=HistoryInterval.MONTH1,
+                )
+            )
+        finally:
+            event.remove(engine, "before_cursor_execute", count_statement)
+
+        assert len(statements) == 1
+        assert profit["first_balance"] == Money(200).as_generic_type()
+        assert profit["last_balance"] == Money(300).as_generic_type()
+        assert profit["amount_profit"] == Money(100).as_generic_type()
+        assert profit["percent_profit"] == Decimal("0.5")
+        assert profit["min_balance"] == Money(100).as_generic_type()
+        assert profit["max_balance"] == Money(400).as_generic_type()
+        assert profit["incomes"] == Decimal("300")
+        assert profit["expenses"] == Decimal("-200")
+
+    async def test_profit_without_history(self, saved_account, test_history_service):
+        with pytest.raises(HistoryNotExistsException):
+            await test_history_service.get_history_profit(
+                command=GetAccountHistoryCommand(
+                    user_id=saved_account.user_id.as_generic_type(),
+                    account_id=saved_account.id.as_generic_type(),
+                    interval=HistoryInterval.WEEK1,
+                )
+            )
+
+
+@pytest.mark.asyncio
+@pytest.mark.history
+@pytest.mark.integration
+class TestHistoryImport:
+
+    def command(self, account, data: bytes) -> ImportAccountHistoryCommand:
+        return ImportAccountHistoryCommand(
+            user_id=account.user_id.as_generic_type(),
+            account_id=account.id.as_generic_type(),
+            format=HistoryExportFormat.CSV,
+            data=data,
+        )
+
+    async def test_import_csv(
+        self,
+        saved_account,
+        test_history_repo,
+        test_history_service,
+        test_account_repo,
+        test_session,
+    ):
+        """Записи сортируются по дате, дельты и баланс счёта пересчитываются"""
+
+        data = (
+            b"balance,isMonthlyClosing,createdAt\n"
+            b"150.5,false,2024-01-03T10:00:00+00:00\n"
+            b"100,true,2024-01-01T10:00:00+00:00\n"
+            b"120,false,2024-01-02T10:00:00\n"
+        )
+        result = await test_history_service.import_history(
+            command=self.command(saved_account, data)
+        )
+
+        assert result == {"imported": 3, "balance": Money(150.5).as_generic_type()}
+
+        histories = await test_history_repo.get_history_from_rollups(
+            account_id=saved_account.id.as_generic_type(),
+            period=HistoryPeriod.DAYS,
+            start_date=datetime(2024, 1, 1, tzinfo=timezone.utc),
+            limit=10,
+            asc=True,
+        )
+        assert [h.balance for h in histories] == [Money(100), Money(120), Money(150.5)]
+        assert [h.delta for h in histories] == [0, 20, 30.5]
+        assert histories[0].is_monthly_closing
+
+        test_session.expire_all()
+        account = await test_account_repo.get_by_id(
+            user_id=saved_account.user_id.as_generic_type(),
+            account_id=saved_account.id.as_generic_type(),
+        )
+        assert account.balance == Money(150.5)
+
+    async def test_import_between_saved(
+        self, saved_account, test_history_repo, test_history_service, test_session
+    ):
+        """Дельты считаются от сохранённых записей, следующая запись пересчитывается"""
+
+        for day, balance, delta in ((1, 100, 0), (4, 200, 100)):
+            await test_history_repo.save(
+                History(
+                    account_id=saved_account.id,
+                    balance=Money(balance),
+                    delta=delta,
+                    is_monthly_closing=False,
+                    created_at=datetime(2024, 1, day, 10, tzinfo=timezone.utc),
+                )
+            )
+
+        data = (
+            b"balance,createdAt\n"
+            b"150,2024-01-03T10:00:00+00:00\n"
+            b"120,2024-01-02T10:00:00+00:00\n"
+        )
+        await test_history_service.import_history(
+            command=self.command(saved_account, data)
+        )
+
+        test_session.expire_all()
+        rows = (
+            await test_session.execute(
+                select(HistoryModel.balance, HistoryModel.delta)
+                .filter_by(account_id=saved_account.id.as_generic_type())
+                .order_by(HistoryModel.created_at)
+            )
+        ).all()
+        assert [tuple(row) for row in rows] == [
+            (100, 0),
+            (120, 20),
+            (150, 30),
+            (200, 50),
+        ]
+
+    async def test_import_invalid_row(
+        self, saved_account, test_history_service, test_session
+    ):
+        """При ошибке в записи ничего не сохраняется"""
+
+        data = (
+            b"balance,createdAt\n"
+            b"100,2024-01-01T10:00:00+00:00\n"
+            b"-5,2024-01-02T10:00:00+00:00\n"
+        )
+        with pytest.raises(InvalidHistoryImportException) as exc:
+            await test_history_service.import_history(
+                command=self.command(saved_account, data)
+            )
+
+        assert "2" in exc.value.message
+        assert not await test_session.scalar(
+            select(HistoryModel).filter_by(
+                account_id=saved_account.id.as_generic_type()
+            )
+        )
+
+
+@pytest.mark.asyncio
+@pytest.mark.history
+@pytest.mark.integration
+class TestHistoryCompaction:
+
+    NOW = datetime(2026, 10, 18, 12, tzinfo=timezone.utc)
+    TIERS = [
+        CompactionTier(older_than=timedelta(days=7), period=HistoryPeriod.HOURS),
+        CompactionTier(older_than=timedelta(days=90), period=HistoryPeriod.DAYS),
+    ]
+
+    @pytest.fixture
+    async def saved_histories(self, saved_account, test_history_repo) -> None:
+        old_day = datetime(2026, 3, 1, tzinfo=timezone.utc)
+        old_hour = datetime(2026, 9, 18, 10, tzinfo=timezone.utc)
+        fresh_hour = datetime(2026, 10, 17, 10, tzinfo=timezone.utc)
+
+        for created_at, balance, delta, is_closing in (
+            # Старше 90 дней - по дню, закрытие месяца сохраняется
+            (old_day + timedelta(hours=10, minutes=5), 100, 0, False),
+            (old_day + timedelta(hours=10, minutes=30), 110, 10, False),
+            (old_day + timedelta(hours=15), 120, 10, True),
+            (old_day + timedelta(hours=16), 90, -30, False),
+            # Старше 7 дней - по часу
+            (old_hour, 200, 110, False),
+            (old_hour + timedelta(minutes=20), 210, 10, False),
+            (old_hour + timedelta(minutes=40), 205, -5, False),
+            (old_hour + timedelta(hours=1, minutes=10), 300, 95, False),
+            # Свежие записи не трогаются
+            (fresh_hour, 310, 10, False),
+            (fresh_hour + timedelta(minutes=1), 320, 10, False),
+        ):
+            await test_history_repo.save(
+                History(
+                    account_id=saved_account.id,
+                    balance=Money(balance),
+                    delta=delta,
+                    is_monthly_closing=is_closing,
+                    created_at=created_at,
+                )
+            )
+
+    async def rows(self, session, account) -> list[tuple]:
+        session.expire_all()
+        result = await session.execute(
+            select(HistoryModel.balance, HistoryModel.delta)
+            .filter_by(account_id=account.id.as_generic_type())
+            .order_by(HistoryModel.created_at)
+        )
+        return [tuple(row) for row in result]
+
+    async def test_compact_by_tiers(
+        self, saved_account, saved_histories, test_history_service, test_session
+    ):
+        removed = await test_history_service.compact_history(
+            command=CompactHistoryCommand(tiers=self.TIERS, now=self.NOW)
+        )
+
+        assert removed == 4
+        assert await self.rows(test_session, saved_account) == [
+            (120, 20),
+            (90, -30),
+            (205, 115),
+            (300, 95),
+            (310, 10),
+            (320, 10),
+        ]
+
+    @pytest.mark.parametrize("page_size", [2, 3])
+    async def test_compact_by_pages(
+        self, saved_account, saved_histories, test_history_repo, test_session, page_size
+    ):
+        """Постраничное сворачивание даёт тот же результат, что и за один проход"""
+
+        removed = 0
+        for tier in self.TIERS:
+            removed += await test_history_repo.compact_history(
+                account_id=saved_account.id.as_generic_type(),
+                period=tier.period,
+                before=tier.boundary(self.NOW),
+                page_size=page_size,
+            )
+
+        assert removed == 4
+        assert await self.rows(test_session, saved_account) == [
+            (120, 20),
+            (90, -30),
+            (205, 115),
+            (300, 95),
+            (310, 10),
+            (320, 10),
+        ]
+
+    async def test_watermark_advanced_per_page(
+        self, saved_account, saved_histories, test_history_repo
+    ):
+        """Водяной знак сдвигается после каждой страницы: прерванный запуск продолжится"""
+
+        tier = self.TIERS[1]
+        untils = []
+        set_until = test_history_repo._set_compacted_until
+
+        async def record(account_id, period, until):
+            untils.append(until)
+            await set_until(account_id, period, until)
+
+        with patch.object(test_history_repo, "_set_compacted_until", record):
+            await test_history_repo.compact_history(
+                account_id=saved_account.id.as_generic_type(),
+                period=tier.period,
+                before=tier.boundary(self.NOW),
+                page_size=2,
+            )
+
+        assert len(untils) > 1
+        assert untils == sorted(untils)
+        assert untils[-1] == tier.boundary(self.NOW)
+
+    async def test_compaction_resumes_from_watermark(
+        self,
+        saved_account,
+        saved_histories,
+        test_history_repo,
+        test_history_service,
+        test_session,
+    ):
+        """Повторный запуск не сканирует и не меняет уже свёрнутые записи"""
+
+        command = CompactHistoryCommand(tiers=self.TIERS, now=self.NOW, batch_size=1)
+        await test_history_service.compact_history(command=command)
+        rows = await self.rows(test_session, saved_account)
+
+        statements = []
+
+        def count_statement(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = test_session.bind.sync_engine
+        event.listen(engine, "before_cursor_execute", count_statement)
+        try:
+            assert await test_history_service.compact_history(command=command) == 0
+        finally:
+            event.remove(engine, "before_cursor_execute", count_statement)
+
+        assert await self.rows(test_session, saved_account) == rows
+        assert not any("FROM accounts_history " in s for s in statements)
+
+
+@pytest.mark.asyncio
+@pytest.mark.history
+@pytest.mark.integration
+class TestHistoryCacheStampede:
+
+    async def test_concurrent_misses_single_build(
+        self, test_history_repo, test_history_cache
+    ):
+        """Одновременные промахи по ответу собирают его один раз"""
+
+        service = HistoryService(test_history_repo, test_history_cache)
+        build = AsyncMock(return_value=b"{}")
+
+        async def slow_build() -> bytes:
+            await asyncio.sleep(0.05)
+            return await build()
+
+        payloads = await asyncio.gather(
+            *(service.get_cached("account", "1m", slow_build) for _ in range(20))
+        )
+
+        assert payloads == [b"{}"] * 20
+        build.assert_awaited_once()
+
+        await service.get_cached("account", "1m", slow_build)
+        build.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+@pytest.mark.history
+@pytest.mark.integration
+class TestInProcessHistoryPublisher:
+
+    @pytest.fixture
+    def publisher(self, test_session, test_history_cache) -> InProcessHistoryPublisher:
+        return InProcessHistoryPublisher(test_session, test_history_cache)
+
+    @staticmethod
+    async def history_rows(session, account: Account) -> list[HistoryModel]:
+        query = select(HistoryModel).filter_by(account_id=account.id.as_generic_type())
+        return list((await session.scalars(query)).all())
+
+    async def test_written_with_balance_update(
+        self,
+        saved_account,
+        publisher,
+        test_account_repo,
+        test_unit_of_work,
+        test_history_cache,
+        test_session,
+    ):
+        account_id = saved_account.id.as_generic_type()
+        version = await test_history_cache.get_version(account_id)
+        service = AccountService(test_account_repo, publisher, test_unit_of_work)
+
+        await service.update_balance(
+            UpdateAccountBalanceCommand(
+                user_id=saved_account.user_id.as_generic_type(),
+                account_id=account_id,
+                new_balance=250.5,
+                is_monthly_closing=False,
+            )
+        )
+
+        (row,) = await self.history_rows(test_session, saved_account)
+        assert row.balance == 250.5
+        rollup = ROLLUP_MODELS[HistoryPeriod.MINUTES]
+        assert (
+            await test_session.scalar(
+                select(rollup.balance).filter_by(account_id=account_id)
+            )
+            == 250.5
+        )
+        # Кэш ответов сброшен после фиксации
+        assert await test_history_cache.get_version(account_id) > version
+
+    async def test_rolled_back_with_transaction(
+        self,
+        saved_account,
+        publisher,
+        test_unit_of_work,
+        test_history_cache,
+        test_session,
+    ):
+        account_id = saved_account.id.as_generic_type()
+        version = await test_history_cache.get_version(account_id)
+
+        async with test_unit_of_work:
+            await publisher.publish(
+                BalanceUpdatedEvent(
+                    user_id=saved_account.user_id.as_generic_type(),
+                    account_id=account_id,
+                    new_balance=Decimal(1),
+                    delta=Decimal(1),
+                    is_monthly_closing=False,
+                )
+            )
+            # Без commit: изменение счёта не зафиксировано
+
+        assert await self.history_rows(test_session, saved_account) == []
+        assert await test_history_cache.get_version(account_id) == version
+
+
+@pytest.mark.asyncio
+@pytest.mark.history
+@pytest.mark.integration
+class TestHistoryIdempotency:
+
+    @pytest.fixture
+    def event(self, saved_account) -> BalanceUpdatedEvent:
+        return BalanceUpdatedEvent(
+            user_id=saved_account.user_id.as_generic_type(),
+            account_id=saved_account.id.as_generic_type(),
+            new_balance=Decimal(500),
+            delta=Decimal(25),
+            is_monthly_closing=False,
+        )
+
+    @staticmethod
+    async def account_rows(session, account_id: str) -> list[HistoryModel]:
+        query = select(HistoryModel).filter_by(account_id=account_id)
+        return list((await session.scalars(query)).all())
+
+    async def test_replayed_event_written_once(self, event, test_redis, test_session):
+        """Повторы доставки одного события (в одной пачке и в разных) - одна запись"""
+
+        with patch.object(account_tasks, "get_redis_client", return_value=test_redis):
+            for _ in range(2):
+                for _ in range(3):
+                    await account_tasks.save_account_history.kiq(event)
+                await broker.wait_all()
+
+        (row,) = await self.account_rows(test_session, event.account_id)
+        assert row.event_id == event.event_id
+        assert row.created_at.replace(tzinfo=timezone.utc) == event.occurred_at
+
+        # Изменение учтено в агрегатах один раз
+        rollup = ROLLUP_MODELS[HistoryPeriod.DAYS]
+        assert await test_session.scalar(
+            select(rollup.delta).filter_by(account_id=event.account_id)
+        ) == float(event.delta)
+
+    async def test_replay_returns_existing_id(
+        self, event, test_history_repo, test_session
+    ):
+        command = account_tasks.to_save_history_command(event)
+        service = HistoryService(test_history_repo)
+
+        first = await service.save_accounts_history([command])
+        replayed = await service.save_accounts_history([command, command])
+
+        assert replayed == first * 2
+        assert len(await self.account_rows(test_session, event.account_id)) == 1
@@ -1,10 +1,15 @@
+import asyncio
+from dataclasses import replace
 from datetime import datetime
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 from faker import Faker
+from sqlalchemy.dialects import postgresql
 
 from domain.accounts.entity import Account
-from domain.accounts.values import AccountType, AccountCurrency
+from domain.accounts.values import AccountType, AccountCurrency, AccountId
 from domain.exceptions import (
     InvalidBalanceException,
     TooLargeTitleException,
@@ -12,6 +17,16 @@ from domain.exceptions import (
 )
 from domain.users.values import UserId
 from domain.values import Money, Title
+from infra.cache.accounts import (
+    InMemoryAccountCache,
+    RedisAccountCache,
+    TieredAccountCache,
+    AccountCacheInvalidator,
+    INVALIDATION_CHANNEL,
+)
+from infra.cache.stats import CacheStats
+from infra.repositories.accounts import SQLAlchemyAccountRepository
+from infra.repositories.dto.accounts import AccountOrmDTO
 
 
 @pytest.mark.unit
@@ -60,3 +75,180 @@ class TestAccountValueObjects:
     def test_title_invalid_letters(self, faker: Faker):
         with pytest.raises(InvalidLettersTitleException):
             Title(faker.phone_number())
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+@pytest.mark.accounts
+class TestAccountLocalCache:
+
+    async def test_returns_copy(self, test_account):
+        """Изменение полученного счёта не меняет запись в кэше"""
+
+        cache = InMemoryAccountCache()
+        await cache.set(test_account)
+
+        account = await cache.get(test_account.id)
+        account.update_balance(
+            Money(test_account.balance.as_generic_type() + 1), is_monthly_closing=False
+        )
+
+        assert (await cache.get(test_account.id)).balance == test_account.balance
+        assert (await cache.get(test_account.id)).events == []
+
+    async def test_lru_eviction(self, test_account):
+        cache = InMemoryAccountCache(capacity=2)
+        first, second, third = (
+            replace(test_account, id=AccountId.generate()) for _ in range(3)
+        )
+
+        await cache.set(first)
+        await cache.set(second)
+        await cache.get(first.id)
+        await cache.set(third)
+
+        assert len(cache) == 2
+        assert await cache.get(second.id) is None
+        assert await cache.get(first.id) is not None
+
+    async def test_ttl_expiry(self, test_account):
+        cache = InMemoryAccountCache(ttl=60)
+        await cache.set(test_account)
+
+        with patch("infra.cache.accounts.time.monotonic", return_value=1e12):
+            assert await cache.get(test_account.id) is None
+        assert len(cache) == 0
+
+    async def test_tiered_read_fills_local(self, test_account, test_redis):
+        local = InMemoryAccountCache()
+        remote = RedisAccountCache(test_redis, stats=CacheStats())
+        await remote.set(test_account)
+
+        cache = TieredAccountCache(local, remote, test_redis)
+        await cache.get(test_account.id)
+        account = await cache.get(test_account.id)
+
+        assert account.balance == test_account.balance
+        assert (remote.stats.hits, local.stats.hits) == (1, 1)
+
+    async def test_cross_worker_invalidation(self, test_account, test_redis):
+        """Запись в одном воркере вытесняет счёт из L1 другого воркера"""
+
+        local_a, local_b = InMemoryAccountCache(), InMemoryAccountCache()
+        worker_a = TieredAccountCache(
+            local_a, RedisAccountCache(test_redis), test_redis
+        )
+        worker_b = TieredAccountCache(
+            local_b, RedisAccountCache(test_redis), test_redis
+        )
+
+        invalidator = AccountCacheInvalidator(test_redis, local_b)
+        invalidator.start()
+        await asyncio.wait_for(invalidator.subscribed.wait(), timeout=1)
+
+        try:
+            await worker_b.set(test_account)
+            assert len(local_b) == 1
+
+            await worker_a.delete(test_account.id)
+            for _ in range(100):
+                if not len(local_b):
+                    break
+                await asyncio.sleep(0.01)
+
+            assert await worker_b.get(test_account.id) is None
+        finally:
+            await invalidator.stop()
+
+    async def test_invalid_invalidation_skipped(self, test_account, test_redis):
+        """Битое сообщение в канале пропускается, подписка продолжает работать"""
+
+        local = InMemoryAccountCache()
+        worker = TieredAccountCache(
+            InMemoryAccountCache(), RedisAccountCache(test_redis), test_redis
+        )
+        invalidator = AccountCacheInvalidator(test_redis, local)
+        invalidator.start()
+        await asyncio.wait_for(invalidator.subscribed.wait(), timeout=1)
+
+        try:
+            await local.set(test_account)
+            for payload in (b"not json", b"[]", b'{"origin": "other"}', b'{"key": []}'):
+                await test_redis.publish(INVALIDATION_CHANNEL, payload)
+            await worker.delete(test_account.id)
+            for _ in range(100):
+                if not len(local):
+                    break
+                await asyncio.sleep(0.01)
+
+            assert not len(local)
+        finally:
+            await invalidator.stop()
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+@pytest.mark.accounts
+class TestAccountBalanceStatement:
+
+    async def test_postgres_single_statement(self, test_account):
+        """В Postgres обновление баланса - один UPDATE ... FROM ... RETURNING"""
+
+        row = AccountOrmDTO.from_entity_to_orm(test_account)
+        session = MagicMock()
+        session.bind.dialect.name = "postgresql"
+        session.info = {}
+        session.execute = AsyncMock(
+            return_value=MagicMock(one_or_none=lambda: (row, 10.0))
+        )
+        session.commit = AsyncMock()
+
+        account, old_balance = await SQLAlchemyAccountRepository(
+            session
+        ).update_balance(
+            user_id=test_account.user_id.as_generic_type(),
+            account_id=test_account.id.as_generic_type(),
+            new_balance=Decimal("20.00"),
+        )
+
+        assert old_balance == Decimal("10.0")
+        assert account.id == test_account.id
+        session.execute.assert_awaited_once()
+
+        sql = str(
+            session.execute.await_args.args[0].compile(dialect=postgresql.dialect())
+        )
+        assert "FROM (SELECT" in sql
+        assert "accounts.version = previous.version" in sql
+        assert sql.endswith("previous.balance AS balance_1")
+
+    async def test_postgres_create_single_statement(self, test_account):
+        """В Postgres создание счёта с проверкой лимита - один INSERT ... SELECT"""
+
+        sql = str(
+            SQLAlchemyAccountRepository.create_statement(
+                test_account, max_accounts=10
+            ).compile(dialect=postgresql.dialect())
+        )
+
+        assert sql.startswith("WITH slot AS \n(UPDATE users SET accounts_count")
+        assert "users.accounts_count < %(accounts_count_2)s RETURNING users.id" in sql
+        assert "INSERT INTO accounts" in sql
+        assert sql.endswith("FROM slot RETURNING accounts.id")
+
+    async def test_postgres_batch_single_statement(self, test_account):
+        """Пакетное обновление балансов - один UPDATE ... FROM (VALUES ...)"""
+
+        sql = str(
+            SQLAlchemyAccountRepository.update_balances_statement(
+                test_account.user_id.as_generic_type(),
+                {"first": Decimal(1), "second": Decimal(2)},
+            ).compile(dialect=postgresql.dialect())
+        )
+
+        assert (
+            'FROM (VALUES (%(param_1)s, %(param_2)s), (%(param_3)s, %(param_4)s)) AS "new"'
+            in sql
+        )
+        assert "accounts.version = previous.version" in sql
+        assert sql.endswith("previous.balance AS balance_1")
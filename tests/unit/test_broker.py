@@ -0,0 +1,279 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from unittest.mock import AsyncMock
+
+import msgpack
+import pytest
+from taskiq import InMemoryBroker, SmartRetryMiddleware, TaskiqResult
+from taskiq.message import TaskiqMessage
+from taskiq_aio_pika import AioPikaBroker
+
+from core.settings import settings
+from domain.accounts.events import BalanceUpdatedEvent
+from infra.broker import setup_broker
+from infra.delivery import (
+    FIRE_AND_FORGET,
+    FireAndForgetMiddleware,
+    InMemoryDeadLetterQueue,
+    TaskErrorStats,
+)
+from infra.serializers import (
+    MsgpackFormatter,
+    MsgpackSerializer,
+    SERIALIZERS,
+    UnsupportedSchemaError,
+    with_serialization,
+)
+from infra.tracker import TaskTracker
+
+
+class FakeTask:
+    def __init__(self, task_id: str, ready: bool = True, error: bool = False):
+        self.task_id = task_id
+        self.is_ready = AsyncMock(return_value=ready)
+        self.get_result = AsyncMock(
+            return_value=TaskiqResult(
+                is_err=error,
+                return_value=None if error else task_id,
+                execution_time=0.1,
+                error=ValueError("boom") if error else None,
+            )
+        )
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+@pytest.mark.accounts
+class TestTaskTracker:
+
+    async def test_results_counted(self):
+        tracker = TaskTracker(timeout=0)
+        for task in (
+            FakeTask("ok"),
+            FakeTask("err", error=True),
+            FakeTask("slow", ready=False),
+        ):
+            tracker.track(task)
+
+        assert await tracker.poll_once() == 2
+        assert tracker.pending == 0
+        assert (
+            tracker.stats.succeeded,
+            tracker.stats.failed,
+            tracker.stats.timed_out,
+        ) == (1, 1, 1)
+
+    async def test_capacity(self):
+        tracker = TaskTracker(capacity=2)
+
+        assert [tracker.track(FakeTask(str(i))) for i in range(3)] == [
+            True,
+            True,
+            False,
+        ]
+        assert tracker.stats.dropped == 1
+        assert tracker.pending == 2
+
+    async def test_batch_rotation(self):
+        """За проход опрашивается одна пачка, неготовые уходят в конец очереди"""
+
+        tracker = TaskTracker(batch_size=2)
+        tasks = [FakeTask(str(i), ready=False) for i in range(5)]
+        for task in tasks:
+            tracker.track(task)
+
+        await tracker.poll_once()
+        await tracker.poll_once()
+
+        assert [task.is_ready.await_count for task in tasks] == [1, 1, 1, 1, 0]
+        assert tracker.pending == 5
+
+    async def test_no_polling_without_results(self):
+        tracker = TaskTracker(track_results=False)
+        task = FakeTask("ok")
+
+        assert not tracker.track(task)
+        assert tracker.pending == 0
+        task.is_ready.assert_not_awaited()
+
+    async def test_drain_waits_for_tasks(self):
+        broker = InMemoryBroker()
+
+        @broker.task
+        async def slow_task() -> int:
+            await asyncio.sleep(0.05)
+            return 1
+
+        await broker.startup()
+        tracker = TaskTracker(poll_interval=0.01)
+        tracker.start()
+        tracker.track(await slow_task.kiq())
+
+        await tracker.drain(timeout=1)
+        await broker.shutdown()
+
+        assert tracker.stats.succeeded == 1
+        assert tracker.pending == 0
+
+
+@pytest.mark.unit
+@pytest.mark.accounts
+class TestMsgpackSerializer:
+
+    @staticmethod
+    def balance_event() -> BalanceUpdatedEvent:
+        return BalanceUpdatedEvent(
+            user_id="user",
+            account_id="account",
+            new_balance=Decimal("12345678.90"),
+            delta=Decimal("-0.01"),
+            is_monthly_closing=True,
+        )
+
+    def test_extension_types_round_trip(self):
+        serializer = MsgpackSerializer()
+        value = {
+            "decimal": Decimal("0.1000000000000000000000001"),
+            "utc": datetime(2026, 1, 31, 23, 59, 59, 999999, tzinfo=timezone.utc),
+            "msk": datetime(2026, 1, 1, 3, tzinfo=timezone(timedelta(hours=3))),
+            "naive": datetime(2026, 1, 1, 12, 30),
+        }
+
+        loaded = serializer.loadb(serializer.dumpb(value))
+
+        assert loaded == value
+        assert loaded["msk"].utcoffset() == timedelta(hours=3)
+        assert loaded["naive"].tzinfo is None
+
+    def test_unknown_schema_version(self):
+        with pytest.raises(UnsupportedSchemaError):
+            MsgpackSerializer().loadb(msgpack.packb([2, {}]))
+
+    def test_message_smaller_than_json(self):
+        message = TaskiqMessage(
+            task_id="task",
+            task_name="infra.tasks.accounts:save_account_history",
+            labels={},
+            args=[self.balance_event()],
+            kwargs={},
+        )
+        json_serializer, json_formatter = SERIALIZERS["json"](InMemoryBroker())
+        json_message = json_formatter.dumps(message).message
+        packed = MsgpackFormatter().dumps(message).message
+
+        assert len(packed) < len(json_message)
+        # Сообщения, отправленные в JSON до переключения формата, читаются
+        assert (
+            MsgpackFormatter().loads(json_message).args
+            == json_serializer.loadb(json_message)["args"]
+        )
+
+    @pytest.mark.asyncio
+    async def test_event_delivered_to_task(self):
+        broker = with_serialization(InMemoryBroker(), "msgpack")
+        received = []
+
+        @broker.task
+        async def on_balance_updated(event: BalanceUpdatedEvent) -> None:
+            received.append(event)
+
+        await broker.startup()
+        event = self.balance_event()
+        await on_balance_updated.kiq(event)
+        await broker.wait_all()
+        await broker.shutdown()
+
+        assert received == [event]
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+@pytest.mark.accounts
+class TestFireAndForgetDelivery:
+
+    @pytest.fixture
+    def dead_letters(self) -> InMemoryDeadLetterQueue:
+        return InMemoryDeadLetterQueue()
+
+    @pytest.fixture
+    def stats(self) -> TaskErrorStats:
+        return TaskErrorStats()
+
+    @pytest.fixture
+    async def broker(self, dead_letters, stats):
+        broker = InMemoryBroker().with_middlewares(
+            SmartRetryMiddleware(default_retry_count=3, default_delay=0),
+            FireAndForgetMiddleware(dead_letters, stats),
+        )
+        await broker.startup()
+        yield broker
+        await broker.shutdown()
+
+    @staticmethod
+    async def wait_retries(broker: InMemoryBroker) -> None:
+        # Повтор ставится новой задачей брокера уже после ожидания текущих
+        for _ in range(5):
+            await broker.wait_all()
+
+    async def test_result_not_stored(self, broker, dead_letters):
+        @broker.task(delivery=FIRE_AND_FORGET)
+        async def write() -> str:
+            return "history-id"
+
+        @broker.task
+        async def read() -> str:
+            return "value"
+
+        forgotten, awaited = await write.kiq(), await read.kiq()
+        await broker.wait_all()
+
+        assert not await forgotten.is_ready()
+        assert (await awaited.get_result()).return_value == "value"
+        assert dead_letters.messages == []
+
+    async def test_failure_dead_lettered(self, broker, dead_letters, stats):
+        @broker.task(delivery=FIRE_AND_FORGET)
+        async def fail() -> None:
+            raise ValueError("boom")
+
+        task = await fail.kiq()
+        await broker.wait_all()
+
+        assert not await task.is_ready()
+        ((message, error),) = dead_letters.messages
+        assert message.task_id == task.task_id
+        assert "boom" in error
+        assert stats.errors[message.task_name] == 1
+        assert stats.dead_lettered == 1
+
+    async def test_dead_lettered_after_retries(self, broker, dead_letters, stats):
+        @broker.task(delivery=FIRE_AND_FORGET, retry_on_error=True, max_retries=3)
+        async def fail() -> None:
+            raise ValueError("boom")
+
+        await fail.kiq()
+        await self.wait_retries(broker)
+
+        assert len(dead_letters.messages) == 1
+        assert stats.errors[fail.task_name] == 3
+        assert stats.dead_lettered == 1
+
+
+@pytest.mark.unit
+@pytest.mark.accounts
+class TestBrokerSetup:
+
+    def test_in_process_history_uses_memory_broker(self, monkeypatch):
+        """Запись истории в процессе API не требует RabbitMQ"""
+
+        monkeypatch.setattr(settings.app, "env", "PROD")
+        monkeypatch.setattr(settings.history_writer, "mode", "in_process")
+
+        assert isinstance(setup_broker(), InMemoryBroker)
+
+    def test_broker_history_uses_rabbit(self, monkeypatch):
+        monkeypatch.setattr(settings.app, "env", "PROD")
+        monkeypatch.setattr(settings.history_writer, "mode", "broker")
+
+        assert isinstance(setup_broker(), AioPikaBroker)
@@ -0,0 +1,87 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from infra.cache.accounts import RedisAccountCache
+from infra.cache.stampede import CacheEntry, SingleFlight
+from infra.cache.stats import CacheStats
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+@pytest.mark.accounts
+class TestCacheStampede:
+
+    async def test_single_flight_shares_error(self):
+        flight, calls = SingleFlight(), 0
+
+        async def load():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            raise ValueError
+
+        results = await asyncio.gather(
+            *(flight.do("key", load) for _ in range(5)), return_exceptions=True
+        )
+
+        assert calls == 1
+        assert all(isinstance(result, ValueError) for result in results)
+        assert len(flight) == 0
+
+    async def test_lease_across_workers(self, test_account, test_redis):
+        """Промахи в разных воркерах загружают счёт один раз"""
+
+        calls = 0
+
+        async def load():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.1)
+            return test_account
+
+        workers = [
+            RedisAccountCache(test_redis, stats=CacheStats(), flight=SingleFlight())
+            for _ in range(3)
+        ]
+        accounts = await asyncio.gather(
+            *(
+                worker.get_or_load(test_account.id, test_account.user_id, load)
+                for worker in workers
+                for _ in range(5)
+            )
+        )
+
+        assert calls == 1
+        assert {account.id for account in accounts} == {test_account.id}
+
+    async def test_early_refresh_serves_stale(self, test_account, test_redis):
+        """Раннее обновление делает один запрос, остальные получают прежнее значение"""
+
+        cache = RedisAccountCache(test_redis, stats=CacheStats())
+        await cache.set(test_account)
+        await test_redis.set(
+            f"lock:{cache.account_key(test_account.id)}:"
+            f"{test_account.user_id.as_generic_type()}",
+            "other",
+        )
+        load = AsyncMock()
+
+        with patch.object(CacheEntry, "should_refresh", return_value=True):
+            account = await cache.get_or_load(
+                test_account.id, test_account.user_id, load
+            )
+
+        load.assert_not_awaited()
+        assert account.balance == test_account.balance
+
+    async def test_xfetch_probability(self):
+        entry = CacheEntry(value=b"", delta=1.0, expires_at=1000.0)
+
+        assert not entry.should_refresh(now=900.0)
+        assert entry.should_refresh(now=1000.0)
+        with patch("infra.cache.stampede.random.random", return_value=0.99):
+            # -ln(0.01) ~ 4.6 длительности вычисления до истечения
+            assert entry.should_refresh(now=996.0)
+            assert not entry.should_refresh(now=995.0)
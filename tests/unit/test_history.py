@@ -1,12 +1,23 @@
+import asyncio
 from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+
+import numpy as np
 
 import pytest
 from black import timezone
 from faker.proxy import Faker
 
 from domain.accounts.values import AccountId
+from domain.histories.analytics import (
+    HistorySeries,
+    compute_analytics,
+    rolling_volatility,
+)
 from domain.histories.entities import History
 from domain.values import Money
+from infra.batching import BatchWriter
+from infra.repositories.partitions import MonthPartition, SQLAlchemyPartitionRepository
 
 
 @pytest.mark.unit
@@ -25,3 +36,202 @@ class TestHistoryDomain:
 
         assert history.created_at <= datetime.now(timezone.utc)
         assert history.balance == balance
+
+
+@pytest.mark.unit
+@pytest.mark.history
+class TestHistoryPartitions:
+
+    @pytest.fixture
+    def pg_session(self) -> MagicMock:
+        session = MagicMock()
+        session.bind.dialect.name = "postgresql"
+        session.execute = AsyncMock()
+        session.commit = AsyncMock()
+        session.scalars = AsyncMock(
+            return_value=["accounts_history_p2025_11", "accounts_history_p2025_12"]
+        )
+        # Строк нового месяца в секции по умолчанию нет
+        session.scalar = AsyncMock(return_value=False)
+        return session
+
+    def test_month_partition(self):
+        partition = MonthPartition.containing(
+            "accounts_history", datetime(2025, 12, 31, 23, 30, tzinfo=timezone.utc)
+        )
+
+        assert partition.name == "accounts_history_p2025_12"
+        assert partition.next.name == "accounts_history_p2026_01"
+        assert partition.create_ddl() == (
+            "CREATE TABLE IF NOT EXISTS accounts_history_p2025_12 "
+            "PARTITION OF accounts_history "
+            "FOR VALUES FROM ('2025-12-01T00:00:00+00:00') TO ('2026-01-01T00:00:00+00:00')"
+        )
+
+    async def test_create_missing_partitions(self, pg_session):
+        created = await SQLAlchemyPartitionRepository(pg_session).create_partitions(
+            "accounts_history",
+            since=datetime(2025, 11, 15, tzinfo=timezone.utc),
+            months=3,
+        )
+
+        assert created == ["accounts_history_p2026_01", "accounts_history_p2026_02"]
+        assert pg_session.execute.await_count == 2
+        pg_session.commit.assert_awaited_once()
+
+    async def test_move_rows_from_default(self, pg_session):
+        """Строки месяца из секции по умолчанию переносятся в новую секцию"""
+
+        pg_session.scalar.return_value = True
+        created = await SQLAlchemyPartitionRepository(pg_session).create_partitions(
+            "accounts_history",
+            since=datetime(2025, 12, 15, tzinfo=timezone.utc),
+            months=1,
+        )
+
+        assert created == ["accounts_history_p2026_01"]
+        statements = [str(call.args[0]) for call in pg_session.execute.await_args_list]
+        assert statements == [
+            "CREATE TABLE accounts_history_p2026_01 "
+            "(LIKE accounts_history INCLUDING DEFAULTS INCLUDING CONSTRAINTS)",
+            "WITH moved AS (DELETE FROM accounts_history_default "
+            "WHERE created_at >= :start AND created_at < :end RETURNING *) "
+            "INSERT INTO accounts_history_p2026_01 SELECT * FROM moved",
+            "ALTER TABLE accounts_history ATTACH PARTITION accounts_history_p2026_01 "
+            "FOR VALUES FROM ('2026-01-01T00:00:00+00:00') TO ('2026-02-01T00:00:00+00:00')",
+        ]
+        pg_session.commit.assert_awaited_once()
+
+    async def test_detach_old_partitions(self, pg_session):
+        detached = await SQLAlchemyPartitionRepository(pg_session).detach_partitions(
+            "accounts_history", before=datetime(2025, 12, 10, tzinfo=timezone.utc)
+        )
+
+        assert detached == ["accounts_history_p2025_11"]
+        statement = pg_session.execute.await_args.args[0]
+        assert str(statement) == (
+            "ALTER TABLE accounts_history DETACH PARTITION accounts_history_p2025_11"
+        )
+
+    async def test_noop_without_postgres(self, test_session):
+        repo = SQLAlchemyPartitionRepository(test_session)
+
+        assert await repo.get_partitions("accounts_history") == []
+        assert (
+            await repo.create_partitions(
+                "accounts_history", since=datetime.now(timezone.utc), months=3
+            )
+            == []
+        )
+
+
+@pytest.mark.unit
+@pytest.mark.history
+class TestHistoryAnalytics:
+
+    @pytest.fixture
+    def series(self) -> HistorySeries:
+        day = 24 * 60 * 60
+        return HistorySeries(
+            timestamps=np.arange(5, dtype=np.float64) * 365.25 * day,
+            balances=np.array([100.0, 120.0, 90.0, 180.0, 200.0]),
+            deltas=np.array([0.0, 20.0, -30.0, 90.0, 20.0]),
+        )
+
+    def test_analytics(self, series):
+        analytics = compute_analytics(series, window=2)
+
+        assert analytics["points"] == 5
+        assert analytics["total_return"] == pytest.approx(1.0)
+        assert analytics["max_drawdown"] == pytest.approx(0.25)
+        assert analytics["cagr"] == pytest.approx(2 ** (1 / 4) - 1)
+        assert analytics["best_bucket"]["return"] == pytest.approx(1.0)
+        assert analytics["best_bucket"]["date"].timestamp() == series.timestamps[3]
+        assert analytics["worst_bucket"]["return"] == pytest.approx(-0.25)
+        # 100 / (100 + 20 + 90 + 20)
+        assert analytics["deposit_adjusted_return"] == pytest.approx(100 / 230)
+        assert len(analytics["rolling_volatility"]) == 3
+
+    def test_rolling_volatility_matches_std(self):
+        returns = np.random.default_rng(0).normal(size=1000)
+
+        expected = [returns[i : i + 30].std(ddof=1) for i in range(len(returns) - 29)]
+        assert np.allclose(rolling_volatility(returns, 30), expected)
+
+    def test_single_point(self):
+        analytics = compute_analytics(
+            HistorySeries(
+                timestamps=np.array([0.0]),
+                balances=np.array([100.0]),
+                deltas=np.array([0.0]),
+            ),
+            window=7,
+        )
+
+        assert analytics["total_return"] == 0
+        assert analytics["cagr"] is None
+        assert analytics["best_bucket"] is None
+        assert analytics["rolling_volatility"] == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+@pytest.mark.history
+class TestBatchWriter:
+
+    async def test_flush_by_size(self):
+        write = AsyncMock(side_effect=lambda items: [item * 10 for item in items])
+        writer = BatchWriter(write, max_size=3, max_delay=60)
+
+        results = await asyncio.gather(*(writer.submit(i) for i in range(3)))
+
+        assert results == [0, 10, 20]
+        write.assert_awaited_once_with([0, 1, 2])
+
+    async def test_flush_by_delay(self):
+        write = AsyncMock(side_effect=lambda items: items)
+        writer = BatchWriter(write, max_size=100, max_delay=0.01)
+
+        assert await asyncio.gather(writer.submit(1), writer.submit(2)) == [1, 2]
+        write.assert_awaited_once_with([1, 2])
+
+    async def test_error_shared_by_batch(self):
+        write = AsyncMock(side_effect=RuntimeError("db down"))
+        writer = BatchWriter(write, max_size=2, max_delay=60)
+
+        results = await asyncio.gather(
+            writer.submit(1), writer.submit(2), return_exceptions=True
+        )
+
+        assert [str(result) for result in results] == ["db down", "db down"]
+        # Пачка и обе половины
+        assert write.await_count == 3
+
+    async def test_failed_item_isolated(self):
+        """Ошибку получает только «плохая» запись, остальные записываются"""
+
+        async def write(items):
+            if 3 in items:
+                raise ValueError("history_balance_gt_0")
+            return [item * 10 for item in items]
+
+        writer = BatchWriter(write, max_size=5, max_delay=60)
+
+        results = await asyncio.gather(
+            *(writer.submit(i) for i in range(5)), return_exceptions=True
+        )
+
+        assert results[:3] + results[4:] == [0, 10, 20, 40]
+        assert isinstance(results[3], ValueError)
+
+    async def test_missing_results_fail(self):
+        write = AsyncMock(return_value=[1])
+        writer = BatchWriter(write, max_size=2, max_delay=60)
+
+        results = await asyncio.wait_for(
+            asyncio.gather(writer.submit(1), writer.submit(2), return_exceptions=True),
+            timeout=1,
+        )
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+        write.assert_awaited_once()